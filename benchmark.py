@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Benchmark Script for Face Pay
+Measures latency and accuracy of the performance-sensitive components
+"""
+
+import sys
+import os
+import time
+import argparse
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from face_gallery import FaceGallery
+from face_index import BruteForceIndex, IVFIndex
+
+def synthetic_gallery(size: int, dim: int = 128, seed: int = 0):
+    """Build a gallery of random unit-scale identities plus noisy probe queries"""
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0, 0.09, size=(size, dim)).astype(np.float32)
+    gallery = FaceGallery(dim)
+    gallery.set([f"user{i}" for i in range(size)], encodings)
+    return gallery, rng
+
+def benchmark_index(args):
+    """Report recall@1 and latency of the IVF index against brute force"""
+    print("=" * 60)
+    print(f"Search Index Benchmark ({args.size} faces, {args.queries} queries)")
+    print("=" * 60)
+
+    gallery, rng = synthetic_gallery(args.size)
+    truth_rows = rng.choice(args.size, args.queries, replace=False)
+    queries = gallery.matrix[truth_rows] + rng.normal(0, 0.03, size=(args.queries, gallery.dim)).astype(np.float32)
+
+    brute = BruteForceIndex()
+    start = time.perf_counter()
+    exact, _ = brute.search(gallery, queries, k=1)
+    brute_ms = (time.perf_counter() - start) * 1000 / args.queries
+    print(f"{'method':<24} {'recall@1':>10} {'ms/query':>10}")
+    print("-" * 46)
+    print(f"{'brute force':<24} {1.0:>10.3f} {brute_ms:>10.3f}")
+
+    index = IVFIndex(nlist=args.nlist)
+    start = time.perf_counter()
+    index.train(gallery)
+    print(f"(IVF training with {len(index.centroids)} cells took {time.perf_counter() - start:.1f}s)")
+
+    for nprobe in args.nprobe:
+        index.nprobe = nprobe
+        start = time.perf_counter()
+        found, _ = index.search(gallery, queries, k=1)
+        ivf_ms = (time.perf_counter() - start) * 1000 / args.queries
+        recall = float(np.mean(found[:, 0] == exact[:, 0]))
+        print(f"{f'IVF nprobe={nprobe}':<24} {recall:>10.3f} {ivf_ms:>10.3f}")
+
+def load_labelled_images(directory: str):
+    """Read <directory>/<person>/<image> files as {person: [BGR images]}"""
+    import cv2
+    people = {}
+    for person in sorted(os.listdir(directory)):
+        person_dir = os.path.join(directory, person)
+        if not os.path.isdir(person_dir):
+            continue
+        images = [cv2.imread(os.path.join(person_dir, f)) for f in sorted(os.listdir(person_dir))]
+        images = [img for img in images if img is not None]
+        if images:
+            people[person] = images
+    return people
+
+def benchmark_detection(args):
+    """Report per-frame latency and recognition accuracy at each detection scale"""
+    import tempfile
+    import face_recognition
+    from face_recognition_module import FaceRecognitionModule
+
+    people = load_labelled_images(args.images)
+    if not people:
+        print(f"❌ No labelled images found in {args.images} (expected <dir>/<person>/<image>)")
+        return
+
+    print("=" * 60)
+    print(f"Detection Scale Benchmark ({len(people)} people)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        face_module = FaceRecognitionModule(os.path.join(tmp, "faces.bin"),
+                                            legacy_faces_file=None,
+                                            index_file=os.path.join(tmp, "faces_index.npz"),
+                                            journal_file=os.path.join(tmp, "faces.journal"),
+                                            detection_upsample=args.upsample)
+
+        # Enrol the first image of every person at full resolution
+        probes = []
+        enrolled = {}
+        for person, images in people.items():
+            rgb = face_module._to_rgb(images[0])
+            encodings = face_recognition.face_encodings(rgb, face_recognition.face_locations(rgb))
+            if encodings:
+                enrolled[person] = encodings[:1]
+                probes.extend((person, img) for img in images[1:])
+        face_module.enroll_many(enrolled)
+        print(f"Enrolled {len(face_module.gallery)} people, {len(probes)} probe images")
+        if not probes:
+            return
+
+        print(f"{'scale':>6} {'ms/frame':>10} {'detected':>10} {'accuracy':>10}")
+        print("-" * 40)
+        for scale in args.scales:
+            face_module.detection_scale = scale
+            detected = correct = 0
+            start = time.perf_counter()
+            for person, img in probes:
+                rgb = face_module._to_rgb(img)
+                locations = face_module.detect_faces(rgb)
+                encodings = face_recognition.face_encodings(rgb, locations)
+                if not encodings:
+                    continue
+                detected += 1
+                indices, distances = face_module.match(encodings[:1])
+                if distances[0] <= face_module.tolerance and face_module.gallery.names[indices[0]] == person:
+                    correct += 1
+            ms = (time.perf_counter() - start) * 1000 / len(probes)
+            print(f"{scale:>6.2f} {ms:>10.1f} {detected / len(probes):>10.3f} {correct / len(probes):>10.3f}")
+
+def benchmark_quality(args):
+    """Report the quality gate's cost next to the encoding it saves, and what it rejects"""
+    from collections import Counter
+    import face_recognition
+    from face_quality import FaceQualityGate
+
+    people = load_labelled_images(args.images)
+    # Without a deployment config, measure the default thresholds
+    gate = FaceQualityGate.load(args.config) or FaceQualityGate()
+    gate_ms, encode_ms = [], []
+    outcomes = Counter()
+    for images in people.values():
+        for image in images:
+            if image is None:
+                continue
+            rgb = np.ascontiguousarray(image[:, :, ::-1])
+            for location in face_recognition.face_locations(rgb):
+                top, right, bottom, left = location
+                start = time.perf_counter()
+                reason = gate.check(rgb, (left, top, right - left, bottom - top), rgb=True)
+                if reason is None and gate.uses_landmarks:
+                    reason = gate.check_pose(face_recognition.face_landmarks(rgb, [location], model="small")[0])
+                gate_ms.append((time.perf_counter() - start) * 1000)
+                outcomes[reason or "accepted"] += 1
+                start = time.perf_counter()
+                face_recognition.face_encodings(rgb, [location])
+                encode_ms.append((time.perf_counter() - start) * 1000)
+
+    total = sum(outcomes.values())
+    print("=" * 60)
+    print(f"Face Quality Gate Benchmark ({total} faces, settings from {args.config})")
+    print("=" * 60)
+    if not total:
+        print(f"❌ No faces found in {args.images} (expected <dir>/<person>/<image>)")
+        return
+    print(f"gate:   {np.median(gate_ms):.2f} ms/face (median)")
+    print(f"encode: {np.median(encode_ms):.2f} ms/face (median)")
+    print("-" * 60)
+    for outcome, count in outcomes.most_common():
+        print(f"{outcome:<28} {count:>8} {count / total:>8.1%}")
+
+def benchmark_templates(args):
+    """Compare exhaustive multi-sample matching with the centroid prefilter"""
+    import tempfile
+    from face_recognition_module import FaceRecognitionModule
+
+    rng = np.random.default_rng(0)
+    dim = 128
+    centers = rng.normal(0, 0.1, size=(args.users, dim)).astype(np.float32)
+    # Each sample is a distinct appearance (pose, glasses, lighting); a probe resembles one of them
+    samples = centers[:, None, :] + rng.normal(0, args.spread, size=(args.users, args.samples, dim)).astype(np.float32)
+    truth = rng.integers(0, args.users, args.queries)
+    looks = samples[truth, rng.integers(0, args.samples, args.queries)]
+    queries = looks + rng.normal(0, args.spread / 3, size=(args.queries, dim)).astype(np.float32)
+
+    print("=" * 60)
+    print(f"Template Benchmark ({args.users:,} users x {args.samples} samples, {args.queries} queries)")
+    print("=" * 60)
+    print(f"{'method':<28} {'ms/query':>10} {'accuracy':>10} {'distance':>10}")
+    print("-" * 60)
+
+    def report(label, match, owner=lambda row: row):
+        start = time.perf_counter()
+        results = [match(q) for q in queries]
+        ms = (time.perf_counter() - start) * 1000 / args.queries
+        found = np.array([owner(indices[0]) for indices, _ in results])
+        distance = np.mean([distances[0] for _, distances in results])
+        print(f"{label:<28} {ms:>10.3f} {np.mean(found == truth):>10.3f} {distance:>10.3f}")
+
+    every_sample = FaceGallery(dim)
+    every_sample.set([f"s{i}" for i in range(args.users * args.samples)], samples.reshape(-1, dim))
+    report("all samples (exhaustive)", every_sample.match, lambda row: row // args.samples)
+
+    centroids_only = FaceGallery(dim)
+    centroids_only.set([f"u{i}" for i in range(args.users)], samples.mean(axis=1))
+    report("centroids only", centroids_only.match)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        face_module = FaceRecognitionModule(os.path.join(tmp, "faces.bin"), legacy_faces_file=None,
+                                            index_file=os.path.join(tmp, "faces_index.npz"),
+                                            journal_file=os.path.join(tmp, "faces.journal"))
+        face_module.enroll_many({f"u{i}": samples[i] for i in range(args.users)})
+        for candidates in args.candidates:
+            face_module.candidates = candidates
+            report(f"centroid top-{candidates} + samples", face_module.match)
+        face_module.close()
+
+def _issue_ids(generator, count: int):
+    return [generator.next_id() for _ in range(count)]
+
+def benchmark_ids(args):
+    """Stress-test transaction ID uniqueness across threads and processes"""
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    from transaction_ids import TransactionIdGenerator
+
+    print("=" * 60)
+    print(f"Transaction ID Stress Test ({args.threads} threads, {args.processes} processes, "
+          f"{args.count} IDs each)")
+    print("=" * 60)
+
+    generator = TransactionIdGenerator("BENCH")
+    start = time.perf_counter()
+    _issue_ids(generator, args.count)
+    elapsed = time.perf_counter() - start
+    print(f"single thread: {args.count / elapsed:,.0f} IDs/s")
+
+    all_ids = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        for ids in pool.map(_issue_ids, [generator] * args.threads, [args.count] * args.threads):
+            all_ids.extend(ids)
+    elapsed = time.perf_counter() - start
+    print(f"{args.threads} threads, shared generator: {len(all_ids) / elapsed:,.0f} IDs/s")
+
+    # Forked workers inherit the generator, spawned ones start fresh like a restarted terminal
+    import multiprocessing
+    for method in ("fork", "spawn"):
+        if method not in multiprocessing.get_all_start_methods():
+            continue
+        context = multiprocessing.get_context(method)
+        with ProcessPoolExecutor(args.processes, mp_context=context) as pool:
+            for ids in pool.map(_issue_ids, [generator] * args.processes, [args.count] * args.processes):
+                all_ids.extend(ids)
+    all_ids.extend(_issue_ids(TransactionIdGenerator("BENCH"), args.count))
+
+    unique = len(set(all_ids))
+    print(f"issued {len(all_ids):,} IDs, {unique:,} unique")
+    if unique != len(all_ids):
+        print(f"❌ {len(all_ids) - unique} duplicate IDs")
+        sys.exit(1)
+    print("✅ No duplicates")
+
+def benchmark_pin(args):
+    """Report PIN verify latency per KDF cost setting against the checkout budget"""
+    import pin_hashing
+
+    settings = [(pin_hashing.KDF_SCRYPT, {"n": 2 ** log_n, "r": 8, "p": 1}) for log_n in args.scrypt_log_n]
+    settings += [(pin_hashing.KDF_PBKDF2, {"iterations": iterations}) for iterations in args.pbkdf2_iterations]
+
+    print("=" * 60)
+    print(f"PIN Hashing Benchmark ({args.runs} verifies per setting, budget {args.budget_ms:.0f} ms)")
+    print("=" * 60)
+    print(f"{'setting':<36} {'median ms':>10} {'max ms':>10}")
+    print("-" * 60)
+    for kdf, params in settings:
+        stored = pin_hashing.hash_pin("123456", kdf, params)
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            pin_hashing.verify_pin("123456", stored)
+            timings.append((time.perf_counter() - start) * 1000)
+        median = float(np.median(timings))
+        label = f"{kdf} " + ",".join(f"{k}={v}" for k, v in params.items())
+        verdict = "✅" if median <= args.budget_ms else "❌"
+        print(f"{label:<36} {median:>10.1f} {max(timings):>10.1f} {verdict}")
+
+def benchmark_ratelimit(args):
+    """Report limiter check latency, memory and save time over a large keyspace"""
+    import tempfile
+    import tracemalloc
+    from rate_limiter import AttemptLimiter
+
+    print("=" * 60)
+    print(f"PIN Attempt Limiter Benchmark ({args.users:,} users, {args.failing:.0%} with failures)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = AttemptLimiter(state_file=os.path.join(tmp, "attempts.json"), persist_interval=3600)
+        rng = np.random.default_rng(0)
+        keys = [f"user{i}" for i in range(args.users)]
+        failing = rng.choice(args.users, int(args.users * args.failing), replace=False)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        for i in failing:
+            limiter.record_failure(keys[i])
+        elapsed = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"record_failure: {elapsed * 1e6 / max(len(failing), 1):.2f} µs/call, "
+              f"{len(limiter):,} tracked keys, {memory / 2 ** 20:.1f} MiB")
+
+        probes = [keys[i] for i in rng.integers(0, args.users, args.checks)]
+        start = time.perf_counter()
+        for key in probes:
+            limiter.allowed(key)
+        elapsed = time.perf_counter() - start
+        print(f"allowed:        {elapsed * 1e6 / args.checks:.2f} µs/call")
+
+        start = time.perf_counter()
+        limiter.save()
+        print(f"save:           {(time.perf_counter() - start) * 1000:.0f} ms "
+              f"({os.path.getsize(limiter.state_file) / 2 ** 20:.1f} MiB, background thread)")
+        limiter.close()
+
+STARTUP_SCRIPT = """
+import json, os, sys, tempfile, time
+start = time.perf_counter()
+import gui, pin_verification, {module}
+import lazy_imports
+lazy_imports.record_timing("import app modules", time.perf_counter() - start)
+with tempfile.TemporaryDirectory() as tmp:
+    face_module = {module}.{cls}(faces_file=os.path.join(tmp, "faces.bin"),
+                                 journal_file=os.path.join(tmp, "faces.journal"),
+                                 legacy_faces_file=os.path.join(tmp, "faces.pkl"))
+    face_module.warm_up()
+    start = time.perf_counter()
+    face_module.warm_up()
+    lazy_imports.record_timing("second inference", time.perf_counter() - start)
+    face_module.close()
+json.dump(lazy_imports.timings(), sys.stdout)
+"""
+
+def benchmark_startup(args):
+    """Report cold import and first-inference times, each run in a fresh interpreter"""
+    import json
+    import subprocess
+
+    module, cls = {"face": ("face_recognition_module", "FaceRecognitionModule"),
+                   "simple": ("simple_face_detection", "SimpleFaceDetection")}[args.module]
+    script = STARTUP_SCRIPT.format(module=module, cls=cls)
+    repo = os.path.dirname(os.path.abspath(__file__))
+
+    print("=" * 60)
+    print(f"Startup Benchmark ({args.module} module, {args.runs} cold starts)")
+    print("=" * 60)
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", script], cwd=repo, check=True,
+                                capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'step':<36} {'median ms':>10} {'max ms':>10}")
+    print("-" * 60)
+    for label in runs[0]:
+        values = [run[label] * 1000 for run in runs if label in run]
+        print(f"{label:<36} {float(np.median(values)):>10.0f} {max(values):>10.0f}")
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description="Face Pay benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="IVF index recall/latency vs brute force")
+    index_parser.add_argument("--size", type=int, default=100000)
+    index_parser.add_argument("--queries", type=int, default=200)
+    index_parser.add_argument("--nlist", type=int, default=256)
+    index_parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    index_parser.set_defaults(func=benchmark_index)
+
+    detection_parser = subparsers.add_parser("detection", help="latency/accuracy per detection scale")
+    detection_parser.add_argument("images", help="directory laid out as <person>/<image>")
+    detection_parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.35, 0.25])
+    detection_parser.add_argument("--upsample", type=int, default=1)
+    detection_parser.set_defaults(func=benchmark_detection)
+
+    quality_parser = subparsers.add_parser("quality", help="face quality gate cost and rejection reasons")
+    quality_parser.add_argument("images", help="directory laid out as <person>/<image>")
+    quality_parser.add_argument("--config", default="data/face_quality.json")
+    quality_parser.set_defaults(func=benchmark_quality)
+
+    templates_parser = subparsers.add_parser("templates", help="multi-sample matching cost and accuracy")
+    templates_parser.add_argument("--users", type=int, default=20000)
+    templates_parser.add_argument("--samples", type=int, default=5)
+    templates_parser.add_argument("--queries", type=int, default=200)
+    templates_parser.add_argument("--spread", type=float, default=0.1,
+                                  help="per-appearance deviation from the identity center")
+    templates_parser.add_argument("--candidates", type=int, nargs="+", default=[1, 5, 20])
+    templates_parser.set_defaults(func=benchmark_templates)
+
+    ids_parser = subparsers.add_parser("ids", help="transaction ID rate and uniqueness stress test")
+    ids_parser.add_argument("--count", type=int, default=200000)
+    ids_parser.add_argument("--threads", type=int, default=8)
+    ids_parser.add_argument("--processes", type=int, default=4)
+    ids_parser.set_defaults(func=benchmark_ids)
+
+    pin_parser = subparsers.add_parser("pin", help="PIN verify latency per KDF cost setting")
+    pin_parser.add_argument("--runs", type=int, default=10)
+    pin_parser.add_argument("--budget-ms", type=float, default=50.0)
+    pin_parser.add_argument("--scrypt-log-n", type=int, nargs="+", default=[12, 13, 14, 15, 16])
+    pin_parser.add_argument("--pbkdf2-iterations", type=int, nargs="+", default=[50000, 100000, 200000, 400000])
+    pin_parser.set_defaults(func=benchmark_pin)
+
+    ratelimit_parser = subparsers.add_parser("ratelimit", help="PIN attempt limiter latency at scale")
+    ratelimit_parser.add_argument("--users", type=int, default=1000000)
+    ratelimit_parser.add_argument("--failing", type=float, default=0.1,
+                                  help="fraction of users with recent failed attempts")
+    ratelimit_parser.add_argument("--checks", type=int, default=1000000)
+    ratelimit_parser.set_defaults(func=benchmark_ratelimit)
+
+    startup_parser = subparsers.add_parser("startup", help="cold import and first-inference times")
+    startup_parser.add_argument("--module", choices=["face", "simple"], default="face")
+    startup_parser.add_argument("--runs", type=int, default=3)
+    startup_parser.set_defaults(func=benchmark_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
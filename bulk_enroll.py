@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Bulk Enrolment for Face Pay
+Enrols users offline from photos: faces are detected and encoded (and PINs
+hashed) across a process pool, then written to the gallery and PIN store
+in one bulk commit each
+
+Sources:
+    photos/            one sub-directory per user: photos/<name>/<image>
+    customers.csv      columns name, images, pin; images are ';'-separated
+                       paths relative to the CSV, pin is optional and a
+                       name may appear on several rows
+
+Usage:
+    python bulk_enroll.py photos/
+    python bulk_enroll.py customers.csv --simple --workers 8 --failures failed.csv
+"""
+
+import sys
+import os
+import csv
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from face_quality import FaceQualityGate
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Per-worker state, set up once by _init_worker
+_worker_simple = False
+_worker_upsample = 1
+_worker_cascade = None
+_worker_gate = None
+
+def _init_worker(simple: bool, upsample: int, gate):
+    """Load the detector (and for dlib the encoder models) once per worker process"""
+    global _worker_simple, _worker_upsample, _worker_cascade, _worker_gate
+    _worker_simple = simple
+    _worker_upsample = upsample
+    _worker_gate = gate
+    if simple:
+        import cv2
+        _worker_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    else:
+        import face_recognition  # noqa: F401  (model loading happens at import)
+
+def _encode_image(path: str) -> Tuple[Optional[np.ndarray], Optional[str]]:
+    """Worker task: (encoding or features, None) for a single-face image, else (None, reason)"""
+    try:
+        if _worker_simple:
+            import cv2
+            from simple_face_detection import SimpleFaceDetection
+            image = cv2.imread(path)
+            if image is None:
+                return None, "unreadable image"
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            faces = _worker_cascade.detectMultiScale(gray, 1.1, 3, minSize=(30, 30))
+            if len(faces) != 1:
+                return None, "no face found" if len(faces) == 0 else f"{len(faces)} faces found"
+            x, y, w, h = faces[0]
+            if _worker_gate is not None:
+                reason = _worker_gate.check(gray, faces[0])
+                if reason is not None:
+                    return None, f"low quality: {reason}"
+            return SimpleFaceDetection.extract_face_features(image[y:y+h, x:x+w]), None
+
+        import face_recognition
+        image = face_recognition.load_image_file(path)
+        locations = face_recognition.face_locations(image, number_of_times_to_upsample=_worker_upsample)
+        if len(locations) != 1:
+            return None, "no face found" if not locations else f"{len(locations)} faces found"
+        if _worker_gate is not None:
+            top, right, bottom, left = locations[0]
+            reason = _worker_gate.check(image, (left, top, right - left, bottom - top), rgb=True)
+            if reason is None and _worker_gate.uses_landmarks:
+                reason = _worker_gate.check_pose(face_recognition.face_landmarks(image, locations, model="small")[0])
+            if reason is not None:
+                return None, f"low quality: {reason}"
+        return face_recognition.face_encodings(image, locations)[0], None
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+def _hash_pin(args) -> str:
+    """Worker task: hash one PIN with the store's KDF settings"""
+    import pin_hashing
+    pin, kdf, params = args
+    return pin_hashing.hash_pin(pin, kdf, params)
+
+def load_directory(directory: str) -> Dict[str, dict]:
+    """Users from a <name>/<image> folder layout (no PINs)"""
+    users = {}
+    for name in sorted(os.listdir(directory)):
+        person_dir = os.path.join(directory, name)
+        if not os.path.isdir(person_dir):
+            continue
+        images = [os.path.join(person_dir, f) for f in sorted(os.listdir(person_dir))
+                  if f.lower().endswith(IMAGE_EXTENSIONS)]
+        if images:
+            users[name] = {"images": images, "pin": None}
+    return users
+
+def load_manifest(manifest: str) -> Dict[str, dict]:
+    """Users from a name,images,pin CSV manifest"""
+    base = os.path.dirname(os.path.abspath(manifest))
+    users = {}
+    with open(manifest, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            name = (row.get("name") or "").strip()
+            if not name:
+                continue
+            user = users.setdefault(name, {"images": [], "pin": None})
+            user["images"] += [os.path.join(base, path.strip())
+                               for path in (row.get("images") or "").split(";") if path.strip()]
+            pin = (row.get("pin") or "").strip()
+            if pin:
+                user["pin"] = pin
+    return users
+
+def encode_users(users: Dict[str, dict], executor: ProcessPoolExecutor,
+                 chunksize: int) -> Tuple[Dict[str, List[np.ndarray]], List[Tuple[str, str, str]]]:
+    """Encode every image in the pool; returns (name -> encodings, failures as (name, path, reason))"""
+    tasks = [(name, path) for name, user in users.items() for path in user["images"]]
+    encodings: Dict[str, List[np.ndarray]] = {}
+    failures = []
+    start = time.perf_counter()
+    results = executor.map(_encode_image, [path for _, path in tasks], chunksize=chunksize)
+    for done, ((name, path), (encoding, reason)) in enumerate(zip(tasks, results), 1):
+        if encoding is None:
+            failures.append((name, path, reason))
+        else:
+            encodings.setdefault(name, []).append(encoding)
+        if done % 500 == 0 or done == len(tasks):
+            elapsed = time.perf_counter() - start
+            print(f"   {done:,}/{len(tasks):,} images ({done / elapsed:.1f} images/s)")
+    return encodings, failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-enrol Face Pay users from photos")
+    parser.add_argument("source", help="directory of <name>/<image> folders, or a name,images,pin CSV")
+    parser.add_argument("--simple", action="store_true",
+                        help="enrol into SimpleFaceDetection (OpenCV only) instead of FaceRecognitionModule")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunksize", type=int, default=8, help="images handed to a worker at a time")
+    parser.add_argument("--upsample", type=int, default=1, help="detector upsampling (dlib only)")
+    parser.add_argument("--failures", help="write per-image failures to this CSV")
+    parser.add_argument("--no-quality", action="store_true",
+                        help="skip the face quality gate (on when data/face_quality.json exists)")
+    parser.add_argument("--dry-run", action="store_true", help="encode and report without writing anything")
+    args = parser.parse_args()
+
+    users = load_directory(args.source) if os.path.isdir(args.source) else load_manifest(args.source)
+    image_count = sum(len(user["images"]) for user in users.values())
+    print("=" * 60)
+    print(f"Face Pay - Bulk Enrolment: {len(users):,} users, {image_count:,} images, {args.workers} workers")
+    print("=" * 60)
+    if not users:
+        print("❌ No users found")
+        sys.exit(1)
+
+    from pin_verification import PINVerification
+    pin_module = PINVerification()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.simple, args.upsample,
+                                       None if args.no_quality else FaceQualityGate.load())) as executor:
+        print("🔍 Detecting and encoding faces...")
+        encodings, failures = encode_users(users, executor, args.chunksize)
+
+        # PINs are hashed with the slow KDF too, so they go through the pool as well
+        pins = {}
+        for name in encodings:
+            pin = users[name]["pin"]
+            if pin is None:
+                continue
+            if pin.isdigit() and 4 <= len(pin) <= 6:
+                pins[name] = pin
+            else:
+                failures.append((name, "", "invalid PIN (must be 4-6 digits)"))
+        if pins:
+            print(f"🔐 Hashing {len(pins):,} PINs...")
+        params = [(pin, pin_module.kdf, pin_module.kdf_params) for pin in pins.values()]
+        hashes = dict(zip(pins, executor.map(_hash_pin, params, chunksize=args.chunksize)))
+    elapsed = time.perf_counter() - start
+
+    missing = [name for name in users if name not in encodings]
+    print("-" * 60)
+    print(f"Encoded {image_count - sum(1 for _, path, _ in failures if path):,}/{image_count:,} images "
+          f"in {elapsed:.1f}s ({image_count / max(elapsed, 1e-9):.1f} images/s)")
+    print(f"Users with a usable face: {len(encodings):,}/{len(users):,}")
+    for name, path, reason in failures[:20]:
+        print(f"   ❌ {name}: {path or 'PIN'}: {reason}")
+    if len(failures) > 20:
+        print(f"   ... and {len(failures) - 20:,} more failures")
+    if args.failures:
+        with open(args.failures, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "image", "reason"])
+            writer.writerows(failures)
+        print(f"📝 Wrote {len(failures):,} failures to {args.failures}")
+
+    if args.dry_run:
+        print("ℹ️  Dry run: nothing written")
+        pin_module.close()
+        return
+
+    if args.simple:
+        from simple_face_detection import SimpleFaceDetection
+        face_module = SimpleFaceDetection()
+    else:
+        from face_recognition_module import FaceRecognitionModule
+        face_module = FaceRecognitionModule()
+    try:
+        face_module.enroll_many(encodings)
+        if hashes:
+            pin_module.import_pins(hashes)
+    finally:
+        face_module.close()
+        pin_module.close()
+    if missing:
+        print(f"⚠️  {len(missing):,} users were not enrolled (no usable face)")
+
+if __name__ == "__main__":
+    main()
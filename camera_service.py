@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Camera Service for Face Pay
+Keeps the camera open for the lifetime of the application and captures frames
+on a dedicated thread into a ring buffer of preallocated arrays
+"""
+
+import os
+import threading
+import time
+import numpy as np
+from typing import Optional, Tuple, Union
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+class ImageFolderCapture:
+    """VideoCapture-compatible source that plays a directory of images"""
+
+    def __init__(self, directory: str):
+        self.paths = [os.path.join(directory, f) for f in sorted(os.listdir(directory))
+                      if f.lower().endswith(IMAGE_EXTENSIONS)]
+        self.position = 0
+
+    def isOpened(self) -> bool:
+        return bool(self.paths)
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        if self.position >= len(self.paths):
+            return False, None
+        frame = cv2.imread(self.paths[self.position])
+        self.position += 1
+        if frame is None:
+            return False, None
+        if image is not None and image.shape == frame.shape:
+            image[...] = frame
+            return True, image
+        return True, frame
+
+    def rewind(self):
+        self.position = 0
+
+    def release(self):
+        self.paths = []
+
+class CameraReader:
+    """Per-consumer handle with the VideoCapture read()/isOpened()/release() interface"""
+
+    def __init__(self, service: "CameraService"):
+        self.service = service
+        self.last_sequence = 0
+
+    def isOpened(self) -> bool:
+        return self.service.is_running
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """Return the newest frame not yet seen by this reader"""
+        ok, frame, sequence = self.service.wait_for_frame(self.last_sequence)
+        if ok:
+            self.last_sequence = sequence
+        return ok, frame
+
+    def release(self):
+        """Readers do not own the camera; the service stays open"""
+
+class CameraService:
+    def __init__(self, source: Union[int, str] = 0, buffer_size: int = 4,
+                 fps: Optional[float] = None, loop: bool = True):
+        """Initialize the capture service
+
+        source: camera index, video file path, or directory of images
+        buffer_size: number of preallocated frame slots in the ring buffer
+        fps: playback rate for file and directory sources (None = as fast as possible)
+        loop: restart file and directory sources when they run out
+        """
+        self.source = source
+        self.buffer_size = max(2, buffer_size)
+        self.fps = fps
+        self.loop = loop
+        self.capture = None
+        self.is_running = False
+        self.frames_captured = 0
+        self._slots = [None] * self.buffer_size
+        self._sequence = 0
+        self._latest_slot = -1
+        self._condition = threading.Condition()
+        self._thread = None
+
+    @property
+    def is_live(self) -> bool:
+        return isinstance(self.source, int)
+
+    def _open_source(self):
+        if isinstance(self.source, str) and os.path.isdir(self.source):
+            return ImageFolderCapture(self.source)
+        return cv2.VideoCapture(self.source)
+
+    def start(self) -> bool:
+        """Open the source and start the capture thread"""
+        if self.is_running:
+            return True
+        self.capture = self._open_source()
+        if not self.capture.isOpened():
+            print(f"❌ Could not open camera source: {self.source}")
+            self.capture = None
+            return False
+
+        self.is_running = True
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+        print(f"📷 Camera service started on source: {self.source}")
+        return True
+
+    def stop(self):
+        """Stop the capture thread and release the source"""
+        with self._condition:
+            self.is_running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+    def _rewind(self) -> bool:
+        if self.is_live or not self.loop:
+            return False
+        if isinstance(self.capture, ImageFolderCapture):
+            self.capture.rewind()
+        else:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return True
+
+    def _capture_loop(self):
+        interval = 1.0 / self.fps if self.fps else 0.0
+        next_frame_time = time.perf_counter()
+        while self.is_running:
+            slot = (self._latest_slot + 1) % self.buffer_size
+            ret, frame = self.capture.read(self._slots[slot]) if self._slots[slot] is not None else self.capture.read()
+            if not ret:
+                if self._rewind():
+                    continue
+                print("❌ Camera service stopped: no more frames")
+                break
+
+            with self._condition:
+                # read() fills the preallocated slot in place unless the frame size changed
+                self._slots[slot] = frame
+                self._latest_slot = slot
+                self._sequence += 1
+                self.frames_captured += 1
+                self._condition.notify_all()
+
+            if interval:
+                next_frame_time += interval
+                delay = next_frame_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_frame_time = time.perf_counter()
+
+        with self._condition:
+            self.is_running = False
+            self._condition.notify_all()
+
+    def latest_frame(self) -> Tuple[bool, Optional[np.ndarray], int]:
+        """Return (ok, copy of the newest frame, its sequence number) without waiting"""
+        with self._condition:
+            if self._latest_slot < 0:
+                return False, None, 0
+            return True, self._slots[self._latest_slot].copy(), self._sequence
+
+    def wait_for_frame(self, after_sequence: int = 0, timeout: float = 2.0) -> Tuple[bool, Optional[np.ndarray], int]:
+        """Block until a frame newer than `after_sequence` exists and return a copy of it"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._sequence > after_sequence or not self.is_running, timeout):
+                return False, None, after_sequence
+            if self._sequence <= after_sequence:
+                return False, None, after_sequence
+            return True, self._slots[self._latest_slot].copy(), self._sequence
+
+    def reader(self) -> CameraReader:
+        """Return a VideoCapture-like handle that consumes the newest frames"""
+        return CameraReader(self)
+
+def parse_source(value: Optional[str]) -> Union[int, str]:
+    """Turn a command-line source into a camera index, video path or image directory"""
+    if value is None or value == "":
+        return 0
+    return int(value) if value.isdigit() else value
@@ -125,8 +125,8 @@ def show_system_status():
     
     # Check data files
     import os
-    faces_file = "data/faces.pkl"
-    pin_file = "data/pin_data.json"
+    faces_file = "data/faces.bin"
+    pin_file = "data/pins.sqlite3"
     
     print(f"\nData files:")
     print(f"Faces file exists: {os.path.exists(faces_file)}")
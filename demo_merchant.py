@@ -11,6 +11,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from simple_face_detection import SimpleFaceDetection
 from pin_verification import PINVerification
 from transaction_manager import TransactionManager
+from transaction_ids import default_terminal_id
 
 def demo_merchant_flow():
     """Demo the complete merchant payment flow"""
@@ -51,6 +52,7 @@ def demo_merchant_flow():
             view_system_stats(face_module, pin_module, transaction_manager)
         elif choice == "5":
             print("👋 Demo completed!")
+            transaction_manager.close()
             break
         else:
             print("❌ Invalid choice. Please try again.")
@@ -121,7 +123,7 @@ def run_payment_flow(face_module, pin_module, transaction_manager):
         return
     
     # Verify PIN
-    if pin_module.verify_pin(username, pin):
+    if pin_module.verify_pin(username, pin, terminal_id=default_terminal_id()):
         print("✅ PIN verified successfully!")
         transaction_manager.verify_pin(True)
         
@@ -221,6 +223,9 @@ def view_system_stats(face_module, pin_module, transaction_manager):
     if stats['total'] > 0:
         success_rate = (stats['successful'] / stats['total']) * 100
         print(f"   - Success rate: {success_rate:.1f}%")
+    
+    today = transaction_manager.get_daily_stats()
+    print(f"   - Today: {today['successful']} payments, ₹{today['total_amount']}")
 
 if __name__ == "__main__":
     demo_merchant_flow() 
\ No newline at end of file
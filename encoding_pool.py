@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Encoding Pool for Face Pay
+Fans face encoding out to a persistent process pool, passing face crops
+through shared memory instead of pickling whole frames
+"""
+
+import os
+import sys
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Tuple
+
+# Fraction of the box size kept around each crop so the landmark model sees the whole face
+CROP_MARGIN = 0.25
+
+# Per-worker state: the shared-memory block currently attached
+_worker_shm = None
+
+def _init_worker():
+    """Load the dlib models and run one dummy encode, once per worker process
+
+    Runs before the worker takes its first task, so no worker pays the
+    first-call overhead on a real frame.
+    """
+    import face_recognition
+    face_recognition.face_encodings(np.zeros((160, 160, 3), dtype=np.uint8), [(20, 140, 140, 20)])
+
+def _started() -> int:
+    """Worker task that does nothing; submitting it makes the executor start a worker"""
+    return os.getpid()
+
+def _attach(name: str):
+    global _worker_shm
+    if _worker_shm is None or _worker_shm.name != name:
+        if _worker_shm is not None:
+            _worker_shm.close()
+        if sys.version_info >= (3, 13):
+            _worker_shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # Registers the block again with the resource tracker the parent
+            # shares with its workers (see EncodingPool.start); the tracker
+            # keeps a set, so the parent's unlink still clears it
+            _worker_shm = shared_memory.SharedMemory(name=name)
+    return _worker_shm
+
+def _encode_crop(name: str, offset: int, shape: Tuple[int, int, int], location: Tuple[int, int, int, int]):
+    """Worker task: encode one face crop read from the shared block"""
+    import face_recognition
+    shm = _attach(name)
+    crop = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+    return face_recognition.face_encodings(crop, [location])[0]
+
+class EncodingPool:
+    def __init__(self, workers: int = 2, min_faces: int = 2):
+        """Initialize the pool
+
+        workers: number of encoder processes
+        min_faces: frames with fewer faces are encoded in-process, since the
+            hand-off costs more than it saves for a single face
+        """
+        self.workers = workers
+        self.min_faces = min_faces
+        self.executor = None
+        self._shm = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker processes (idempotent)"""
+        if self.executor is None:
+            if sys.version_info < (3, 13):
+                # Before 3.13 attaching to a block registers it with the
+                # attaching process's resource tracker. A forked worker that
+                # started its own tracker would unlink the parent's block when
+                # it exits, so start the parent's first for workers to inherit.
+                resource_tracker.ensure_running()
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+
+    def warm_up(self):
+        """Start every worker and wait until each has run its warm-up encode
+
+        The executor only adds a process when no idle one can take a task,
+        and workers are busy in their initializer until warm, so one task
+        per worker submitted at once starts them all.
+        """
+        with self._lock:
+            self.start()
+            for future in [self.executor.submit(_started) for _ in range(self.workers)]:
+                future.result()
+
+    def close(self):
+        """Shut down the workers and free the shared block"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def _reserve(self, size: int):
+        if self._shm is not None and self._shm.size >= size:
+            return
+        size = max(size, 1 << 20)
+        if self._shm is not None:
+            # Grow geometrically; workers re-attach when the block name changes
+            size = max(size, 2 * self._shm.size)
+            self._shm.close()
+            self._shm.unlink()
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+
+    def encode(self, rgb_frame: np.ndarray, face_locations: List[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+        """Encode every face location of a frame, returning encodings in input order"""
+        import face_recognition
+        if len(face_locations) < self.min_faces:
+            return face_recognition.face_encodings(rgb_frame, face_locations)
+
+        height, width = rgb_frame.shape[:2]
+        crops = []
+        for (top, right, bottom, left) in face_locations:
+            margin_y = int((bottom - top) * CROP_MARGIN)
+            margin_x = int((right - left) * CROP_MARGIN)
+            y0, y1 = max(0, top - margin_y), min(height, bottom + margin_y)
+            x0, x1 = max(0, left - margin_x), min(width, right + margin_x)
+            crops.append(((y0, y1, x0, x1), (top - y0, right - x0, bottom - y0, left - x0)))
+
+        with self._lock:
+            self.start()
+            self._reserve(sum((y1 - y0) * (x1 - x0) * 3 for (y0, y1, x0, x1), _ in crops))
+            futures = []
+            offset = 0
+            for (y0, y1, x0, x1), location in crops:
+                shape = (y1 - y0, x1 - x0, 3)
+                view = np.ndarray(shape, dtype=np.uint8, buffer=self._shm.buf, offset=offset)
+                view[...] = rgb_frame[y0:y1, x0:x1]
+                futures.append(self.executor.submit(_encode_crop, self._shm.name, offset, shape, location))
+                offset += view.nbytes
+            # Results are gathered while the lock is held so the block is not overwritten mid-read
+            results = [future.result() for future in futures]
+
+        return results
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Face Gallery for Face Pay
+Keeps registered face encodings in one contiguous matrix for batched matching,
+and per-user sample blocks that can be re-enrolled without rebuilding them
+"""
+
+import numpy as np
+from typing import List, Optional, Tuple
+
+class FaceGallery:
+    def __init__(self, dim: int = 128):
+        """Initialize an empty gallery of `dim`-dimensional encodings"""
+        self.dim = dim
+        self.names = []
+        self._buffer = np.empty((0, dim), dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        # name -> row, built on the first lookup
+        self._rows = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """(N x dim) float32 view of the registered encodings"""
+        return self._buffer[:len(self.names)]
+
+    @property
+    def sq_norms(self) -> np.ndarray:
+        """Precomputed squared L2 norm of every gallery row"""
+        return self._sq_norms[:len(self.names)]
+
+    def set(self, names: List[str], encodings):
+        """Replace the whole gallery with the given names and encodings"""
+        matrix = np.asarray(encodings, dtype=np.float32).reshape(len(names), self.dim)
+        self.names = list(names)
+        self._buffer = np.ascontiguousarray(matrix)
+        self._sq_norms = np.einsum('ij,ij->i', self._buffer, self._buffer)
+        self._rows = None
+
+    def attach(self, names: List[str], matrix: np.ndarray, sq_norms: np.ndarray):
+        """Use existing (e.g. memory-mapped) arrays as the gallery without copying them"""
+        self.names = list(names)
+        self._buffer = matrix
+        self._sq_norms = sq_norms
+        self._rows = None
+
+    def detach(self):
+        """Copy memory-mapped arrays into RAM so the backing file can be replaced"""
+        if isinstance(self._buffer, np.memmap):
+            self._buffer = np.array(self._buffer)
+        if isinstance(self._sq_norms, np.memmap):
+            self._sq_norms = np.array(self._sq_norms)
+
+    def index_of(self, name: str) -> Optional[int]:
+        """Return the row index for a name, or None if not registered"""
+        if self._rows is None:
+            self._rows = {known: row for row, known in enumerate(self.names)}
+        return self._rows.get(name)
+
+    def add(self, name: str, encoding) -> bool:
+        """Add or update the encoding for a name. Returns True if the name was new"""
+        encoding = np.asarray(encoding, dtype=np.float32).reshape(self.dim)
+        idx = self.index_of(name)
+        is_new = idx is None
+        if is_new:
+            idx = len(self.names)
+            self._reserve(idx + 1)
+            self.names.append(name)
+            self._rows[name] = idx
+        self._buffer[idx] = encoding
+        self._sq_norms[idx] = float(encoding @ encoding)
+        return is_new
+
+    def remove(self, name: str) -> bool:
+        """Remove a name from the gallery. Returns False if it was not registered"""
+        idx = self.index_of(name)
+        if idx is None:
+            return False
+        last = len(self.names) - 1
+        # Shift the tail up one row so the remaining order is preserved
+        self._buffer[idx:last] = self._buffer[idx + 1:last + 1]
+        self._sq_norms[idx:last] = self._sq_norms[idx + 1:last + 1]
+        del self.names[idx]
+        self._rows = None
+        return True
+
+    def keep(self, mask):
+        """Keep only the rows where mask is True (one pass for many removals)"""
+        mask = np.asarray(mask, dtype=bool)
+        self._buffer = np.ascontiguousarray(self.matrix[mask])
+        self._sq_norms = np.ascontiguousarray(self.sq_norms[mask])
+        self.names = [name for name, keep in zip(self.names, mask) if keep]
+        self._rows = None
+
+    def _reserve(self, size: int):
+        """Grow the backing arrays geometrically so appends are amortized O(1)"""
+        capacity = self._buffer.shape[0]
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2, 16)
+        buffer = np.empty((new_capacity, self.dim), dtype=np.float32)
+        sq_norms = np.empty(new_capacity, dtype=np.float32)
+        n = len(self.names)
+        buffer[:n] = self._buffer[:n]
+        sq_norms[:n] = self._sq_norms[:n]
+        self._buffer = buffer
+        self._sq_norms = sq_norms
+
+    def distances(self, encodings) -> np.ndarray:
+        """Return the (M x N) Euclidean distance matrix between queries and gallery"""
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+        # ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q.g, computed as one matrix product
+        d2 = q_sq[:, None] + self.sq_norms[None, :] - 2.0 * (queries @ self.matrix.T)
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2)
+
+    def match(self, encodings) -> Tuple[np.ndarray, np.ndarray]:
+        """Match every query encoding against the whole gallery in one pass
+
+        Returns (indices, distances): the nearest gallery row for each query and
+        its Euclidean distance. Indices are -1 and distances inf when the gallery
+        is empty.
+        """
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        m = queries.shape[0]
+        if m == 0 or not self.names:
+            return np.full(m, -1, dtype=np.intp), np.full(m, np.inf, dtype=np.float32)
+
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+        d2 = self.sq_norms[None, :] - 2.0 * (queries @ self.matrix.T)
+        indices = np.argmin(d2, axis=1)
+        best = d2[np.arange(m), indices] + q_sq
+        distances = np.sqrt(np.maximum(best, 0.0))
+        return indices, distances
+
+class SampleBlocks:
+    """Per-user blocks of sample rows that can be replaced in place
+
+    Every user owns one contiguous block of rows. Rows live in a base array
+    (typically memory-mapped from the face store) followed by a RAM tail that
+    grows geometrically, so adding users never copies the base. A user
+    re-enrolled with no more samples than before is overwritten in place;
+    otherwise the new block is appended and the old one becomes dead rows,
+    which are compacted away once they outnumber the live ones.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._base = np.empty((0, dim), dtype=np.float32)
+        self._tail = np.empty((0, dim), dtype=np.float32)
+        self._tail_size = 0
+        self._starts = np.empty(0, dtype=np.intp)
+        self._counts = np.empty(0, dtype=np.intp)
+        self._users = 0
+        self._dead = 0
+        # Derived from the blocks; reset by _changed()
+        self._layout = None
+        self._one_per_user = None
+
+    def __len__(self) -> int:
+        return self._users
+
+    @property
+    def starts(self) -> np.ndarray:
+        """Row number of the first sample of every user"""
+        return self._starts[:self._users]
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Number of samples of every user"""
+        return self._counts[:self._users]
+
+    @property
+    def rows(self) -> int:
+        """Number of live sample rows"""
+        return len(self._base) + self._tail_size - self._dead
+
+    @property
+    def one_per_user(self) -> bool:
+        """Whether every user has exactly one sample and there are no dead rows (cached)"""
+        if self._one_per_user is None:
+            self._one_per_user = self._dead == 0 and bool((self.counts == 1).all())
+        return self._one_per_user
+
+    def attach(self, matrix: np.ndarray, user_starts):
+        """Use a matrix grouped by user (e.g. memory-mapped) without copying it
+
+        user_starts: (users + 1) row offsets; user u owns rows
+            user_starts[u]:user_starts[u + 1]
+        """
+        user_starts = np.asarray(user_starts, dtype=np.intp)
+        self._base = matrix
+        self._tail = np.empty((0, self.dim), dtype=np.float32)
+        self._tail_size = 0
+        self._starts = user_starts[:-1].copy()
+        self._counts = np.diff(user_starts)
+        self._users = len(self._counts)
+        self._dead = len(matrix) - int(self._counts.sum())
+        self._changed()
+
+    def detach(self):
+        """Copy a memory-mapped base into RAM so the backing file can be replaced"""
+        if isinstance(self._base, np.memmap):
+            self._base = np.array(self._base)
+
+    def set(self, user: int, rows):
+        """Replace the samples of a user (user == len(self) adds a new one)"""
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, self.dim)
+        if user < self._users and len(rows) <= self._counts[user]:
+            start = int(self._starts[user])
+            self._dead += int(self._counts[user]) - len(rows)
+        else:
+            if user < self._users:
+                self._dead += int(self._counts[user])
+            else:
+                self._reserve_users(user + 1)
+                self._users = user + 1
+            start = len(self._base) + self._tail_size
+            self._reserve_tail(self._tail_size + len(rows))
+            self._tail_size += len(rows)
+        base = len(self._base)
+        if start < base:
+            self._base[start:start + len(rows)] = rows
+        else:
+            self._tail[start - base:start - base + len(rows)] = rows
+        self._starts[user], self._counts[user] = start, len(rows)
+        self._changed()
+        self._maybe_compact()
+
+    def remove(self, user: int):
+        """Drop a user; later users move up one place"""
+        self._dead += int(self._counts[user])
+        last = self._users - 1
+        self._starts[user:last] = self._starts[user + 1:last + 1]
+        self._counts[user:last] = self._counts[user + 1:last + 1]
+        self._users = last
+        self._changed()
+        self._maybe_compact()
+
+    def keep(self, mask):
+        """Keep only the users where mask is True (one pass for many removals)"""
+        mask = np.asarray(mask, dtype=bool)
+        self._dead += int(self.counts[~mask].sum())
+        self._starts = self.starts[mask]
+        self._counts = self.counts[mask]
+        self._users = len(self._counts)
+        self._changed()
+        self._maybe_compact()
+
+    def rows_of(self, users) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row numbers, owning user of each row) for the samples of `users`"""
+        users = np.asarray(users, dtype=np.intp)
+        counts = self._counts[users]
+        offsets = np.cumsum(counts) - counts
+        rows = np.repeat(self._starts[users] - offsets, counts) + np.arange(int(counts.sum()))
+        return rows, np.repeat(users, counts)
+
+    def take(self, rows) -> np.ndarray:
+        """Gather sample rows by row number"""
+        rows = np.asarray(rows, dtype=np.intp)
+        base = len(self._base)
+        if not len(rows) or rows.max() < base:
+            return np.asarray(self._base[rows], dtype=np.float32)
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        in_base = rows < base
+        out[in_base] = self._base[rows[in_base]]
+        out[~in_base] = self._tail[rows[~in_base] - base]
+        return out
+
+    def segments(self) -> List[np.ndarray]:
+        """The stored row arrays in row-number order, dead rows included
+
+        Lets a caller score every stored row with one product per segment
+        instead of gathering the live rows first.
+        """
+        return [self._base, self._tail[:self._tail_size]]
+
+    def layout(self) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """Return (row index, user_starts) that put the live rows in user order
+
+        The index is None when the stored rows already are in user order
+        with no dead rows. Cached until the next change.
+        """
+        if self._layout is None:
+            starts = np.zeros(self._users + 1, dtype=np.intp)
+            np.cumsum(self.counts, out=starts[1:])
+            if self._dead == 0 and np.array_equal(self.starts, starts[:-1]):
+                index = None
+            else:
+                index = self.rows_of(np.arange(self._users))[0]
+            self._layout = (index, starts)
+        return self._layout
+
+    def grouped(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return a copy of the live rows in user order, and their user_starts"""
+        index, starts = self.layout()
+        if index is None:
+            index = np.arange(self.rows)
+        return self.take(index), starts
+
+    def compact(self):
+        """Rewrite the live rows in user order, dropping dead rows"""
+        matrix, starts = self.grouped()
+        self.attach(matrix, starts)
+
+    def _changed(self):
+        self._layout = None
+        self._one_per_user = None
+
+    def _maybe_compact(self):
+        # Dead rows are only rewritten once they outnumber the live ones, so
+        # the copy is amortized over at least as many replacements
+        if self._dead > max(self.rows, 64):
+            self.compact()
+
+    def _reserve_users(self, size: int):
+        capacity = self._starts.shape[0]
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2, 16)
+        starts = np.empty(new_capacity, dtype=np.intp)
+        counts = np.empty(new_capacity, dtype=np.intp)
+        starts[:self._users] = self.starts
+        counts[:self._users] = self.counts
+        self._starts, self._counts = starts, counts
+
+    def _reserve_tail(self, size: int):
+        capacity = self._tail.shape[0]
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2, 16)
+        tail = np.empty((new_capacity, self.dim), dtype=np.float32)
+        tail[:self._tail_size] = self._tail[:self._tail_size]
+        self._tail = tail
+
+def user_reduce(ufunc, values: np.ndarray, user_starts, empty: float = 0.0, axis: int = 0) -> np.ndarray:
+    """ufunc.reduceat over each user's rows along `axis` (rows grouped by user)
+
+    user_starts: (users + 1) row offsets. Users without rows get `empty`;
+    reduceat alone would hand them the next user's first row instead.
+    """
+    user_starts = np.asarray(user_starts, dtype=np.intp)
+    counts = np.diff(user_starts)
+    shape = list(values.shape)
+    shape[axis] = len(counts)
+    nonempty = counts > 0
+    if not nonempty.any():
+        return np.full(shape, empty, dtype=values.dtype)
+    rows = [slice(None)] * values.ndim
+    rows[axis] = slice(0, int(user_starts[-1]))
+    reduced = ufunc.reduceat(values[tuple(rows)], user_starts[:-1][nonempty], axis=axis)
+    if nonempty.all():
+        return reduced
+    out = np.full(shape, empty, dtype=reduced.dtype)
+    users = [slice(None)] * values.ndim
+    users[axis] = nonempty
+    out[tuple(users)] = reduced
+    return out
+
+def user_means(samples: np.ndarray, user_starts) -> np.ndarray:
+    """Mean sample of every user (zeros for a user without samples)"""
+    counts = np.maximum(np.diff(np.asarray(user_starts, dtype=np.intp)), 1)
+    return (user_reduce(np.add, samples, user_starts) / counts[:, None]).astype(np.float32)
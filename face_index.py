@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Face Index for Face Pay
+Approximate nearest-neighbour search over large face galleries
+"""
+
+import os
+import numpy as np
+from typing import Optional, Tuple
+
+class BruteForceIndex:
+    """Exact search over the whole gallery matrix (the reference path)"""
+
+    def search(self, gallery, queries, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indices, distances), both (M x k), of the k nearest gallery rows"""
+        d = gallery.distances(queries)
+        k = min(k, d.shape[1])
+        top = np.argpartition(d, k - 1, axis=1)[:, :k]
+        return _sort_candidates(top, np.take_along_axis(d, top, axis=1))
+
+    def add(self, gallery, row: int):
+        """Nothing to maintain for brute force"""
+
+    def rebuild(self, gallery):
+        """Nothing to maintain for brute force"""
+
+class IVFIndex:
+    """Inverted-file index: k-means coarse cells, exact re-ranking of candidates
+
+    Each gallery row is assigned to its nearest of `nlist` centroids. A query
+    only visits the `nprobe` closest cells, and the candidates gathered from
+    them are re-ranked with exact distances against the gallery matrix.
+    """
+
+    def __init__(self, nlist: int = 256, nprobe: int = 8, iterations: int = 20, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self._lists = []
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, gallery):
+        """Run k-means over the gallery and assign every row to a cell"""
+        data = gallery.matrix
+        n = data.shape[0]
+        if n == 0:
+            raise ValueError("Cannot train an index on an empty gallery")
+        nlist = min(self.nlist, n)
+        rng = np.random.default_rng(self.seed)
+        centroids = data[rng.choice(n, nlist, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            assignments = self._nearest_centroids(data, centroids, 1)[:, 0]
+            counts = np.bincount(assignments, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, data)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            # Re-seed empty cells from random rows so no centroid is wasted
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = data[rng.choice(n, len(empty), replace=False)]
+
+        self.centroids = centroids.astype(np.float32)
+        self.rebuild(gallery)
+
+    def rebuild(self, gallery):
+        """Re-assign every gallery row to the trained cells"""
+        if not self.is_trained:
+            return
+        data = gallery.matrix
+        if data.shape[0]:
+            self.assignments = self._nearest_centroids(data, self.centroids, 1)[:, 0].astype(np.int32)
+        else:
+            self.assignments = np.empty(0, dtype=np.int32)
+        self._build_lists()
+
+    def add(self, gallery, row: int):
+        """Assign one new or updated gallery row to its nearest cell"""
+        if not self.is_trained:
+            return
+        cell = int(self._nearest_centroids(gallery.matrix[row:row + 1], self.centroids, 1)[0, 0])
+        if row < len(self.assignments):
+            old = int(self.assignments[row])
+            if old == cell:
+                return
+            self._lists[old] = self._lists[old][self._lists[old] != row]
+            self.assignments[row] = cell
+        else:
+            self.assignments = np.append(self.assignments, np.int32(cell))
+        self._lists[cell] = np.append(self._lists[cell], np.intp(row))
+
+    def search(self, gallery, queries, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indices, distances), both (M x k), of the approximate k nearest rows"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, gallery.dim)
+        m = queries.shape[0]
+        indices = np.full((m, k), -1, dtype=np.intp)
+        distances = np.full((m, k), np.inf, dtype=np.float32)
+        if m == 0 or len(gallery) == 0:
+            return indices, distances
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = self._nearest_centroids(queries, self.centroids, nprobe)
+        matrix = gallery.matrix
+        sq_norms = gallery.sq_norms
+
+        for i in range(m):
+            candidates = np.concatenate([self._lists[c] for c in probes[i]])
+            if len(candidates) == 0:
+                continue
+            # Exact re-ranking of the candidates against the gallery rows
+            q = queries[i]
+            d2 = sq_norms[candidates] - 2.0 * (matrix[candidates] @ q) + q @ q
+            kk = min(k, len(candidates))
+            top = np.argpartition(d2, kk - 1)[:kk]
+            top = top[np.argsort(d2[top])]
+            indices[i, :kk] = candidates[top]
+            distances[i, :kk] = np.sqrt(np.maximum(d2[top], 0.0))
+        return indices, distances
+
+    def save(self, path: str):
+        """Persist the trained index next to the face gallery"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(
+            path,
+            centroids=self.centroids,
+            assignments=self.assignments,
+            params=np.array([self.nlist, self.nprobe, self.iterations, self.seed]),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        """Load an index written by save()"""
+        with np.load(path) as data:
+            nlist, nprobe, iterations, seed = (int(v) for v in data['params'])
+            index = cls(nlist=nlist, nprobe=nprobe, iterations=iterations, seed=seed)
+            index.centroids = data['centroids'].astype(np.float32)
+            index.assignments = data['assignments'].astype(np.int32)
+        index._build_lists()
+        return index
+
+    def _build_lists(self):
+        order = np.argsort(self.assignments, kind='stable')
+        bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.centroids))]
+
+    @staticmethod
+    def _nearest_centroids(data: np.ndarray, centroids: np.ndarray, count: int) -> np.ndarray:
+        c_sq = np.einsum('ij,ij->i', centroids, centroids)
+        d2 = c_sq[None, :] - 2.0 * (data @ centroids.T)
+        if count >= d2.shape[1]:
+            return np.argsort(d2, axis=1)
+        top = np.argpartition(d2, count - 1, axis=1)[:, :count]
+        order = np.argsort(np.take_along_axis(d2, top, axis=1), axis=1)
+        return np.take_along_axis(top, order, axis=1)
+
+def _sort_candidates(indices: np.ndarray, distances: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(distances, axis=1)
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(distances, order, axis=1)
+
+def load_index(path: str) -> Optional[IVFIndex]:
+    """Load a persisted index, or return None if there is none"""
+    if not os.path.exists(path):
+        return None
+    return IVFIndex.load(path)
+
+def main():
+    """Build the search index offline for the registered gallery"""
+    import argparse
+    from face_recognition_module import FaceRecognitionModule
+
+    parser = argparse.ArgumentParser(description="Build the Face Pay search index")
+    parser.add_argument("--faces-file", default="data/faces.bin")
+    parser.add_argument("--index-file", default="data/faces_index.npz")
+    parser.add_argument("--nlist", type=int, default=256, help="number of k-means cells")
+    parser.add_argument("--nprobe", type=int, default=8, help="cells visited per query")
+    args = parser.parse_args()
+
+    face_module = FaceRecognitionModule(args.faces_file, index_file=args.index_file)
+    if not len(face_module.gallery):
+        print("❌ No registered faces to index")
+        return
+    face_module.build_index(nlist=args.nlist, nprobe=args.nprobe)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Face Journal for Face Pay
+Append-only enrolment log replayed on top of the last face store snapshot
+
+Layout (little-endian):
+    header   16 bytes: magic, version, dim
+    records  op uint8, name length uint16, rows uint32, crc32 uint32,
+             then the UTF-8 name and rows x dim float32
+"""
+
+import os
+import struct
+import threading
+import zlib
+import numpy as np
+from typing import Iterator, Optional, Tuple
+
+MAGIC = b"FPAYJRNL"
+VERSION = 1
+FILE_HEADER = struct.Struct("<8sII")
+RECORD_HEADER = struct.Struct("<BHII")
+
+OP_ADD = 1
+OP_UPDATE = 2
+OP_DELETE = 3
+
+class FaceJournal:
+    def __init__(self, path: str, dim: int, fsync: bool = True):
+        """Open (or create) the journal for `dim`-dimensional embeddings"""
+        self.path = path
+        self.dim = dim
+        self.fsync = fsync
+        self.records = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _open(self):
+        if self._file is not None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < FILE_HEADER.size:
+            with open(self.path, 'wb') as f:
+                f.write(FILE_HEADER.pack(MAGIC, VERSION, self.dim))
+        self._file = open(self.path, 'ab')
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @staticmethod
+    def _encode(op: int, name: str, rows: Optional[np.ndarray], dim: int) -> bytes:
+        name_bytes = name.encode("utf-8")
+        rows = np.empty((0, dim), dtype=np.float32) if rows is None else np.asarray(rows, dtype=np.float32).reshape(-1, dim)
+        payload = name_bytes + rows.tobytes()
+        crc = zlib.crc32(payload, zlib.crc32(struct.pack("<BHI", op, len(name_bytes), len(rows))))
+        return RECORD_HEADER.pack(op, len(name_bytes), len(rows), crc) + payload
+
+    def append(self, op: int, name: str, rows=None) -> int:
+        """Append one record in O(1) and return the journal size after it"""
+        record = self._encode(op, name, rows, self.dim)
+        with self._lock:
+            self._open()
+            self._file.write(record)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.records += 1
+            return self._file.tell()
+
+    def replay(self) -> Iterator[Tuple[int, str, np.ndarray]]:
+        """Yield (op, name, rows) for every intact record
+
+        A torn or corrupt record ends the replay, and the journal is truncated
+        there so new records are not appended after garbage.
+        """
+        if not os.path.exists(self.path):
+            return
+        self.records = 0
+        good_end = FILE_HEADER.size
+        with open(self.path, 'rb') as f:
+            header = f.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size:
+                return
+            magic, version, dim = FILE_HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION or dim != self.dim:
+                raise ValueError(f"{self.path} is not a compatible face journal")
+
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                op, name_length, row_count, crc = RECORD_HEADER.unpack(header)
+                payload = f.read(name_length + row_count * self.dim * 4)
+                expected = zlib.crc32(payload, zlib.crc32(struct.pack("<BHI", op, name_length, row_count)))
+                if len(payload) < name_length + row_count * self.dim * 4 or crc != expected:
+                    print(f"⚠️  Ignoring corrupt face journal tail at byte {good_end}")
+                    break
+                good_end = f.tell()
+                self.records += 1
+                name = payload[:name_length].decode("utf-8")
+                rows = np.frombuffer(payload, dtype=np.float32, offset=name_length).reshape(row_count, self.dim)
+                yield op, name, rows
+
+        if good_end < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_end)
+
+    def checkpoint(self) -> Tuple[int, int]:
+        """Return (size, record count) to pass to truncate_before() after a snapshot"""
+        with self._lock:
+            size = self._file.tell() if self._file is not None else (
+                os.path.getsize(self.path) if os.path.exists(self.path) else 0)
+            return size, self.records
+
+    def truncate_before(self, checkpoint: Tuple[int, int]):
+        """Drop records captured by a snapshot taken at `checkpoint`, keeping any appended since"""
+        offset, captured = checkpoint
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            tail = b""
+            if os.path.exists(self.path):
+                with open(self.path, 'rb') as f:
+                    f.seek(max(offset, FILE_HEADER.size))
+                    tail = f.read()
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(FILE_HEADER.pack(MAGIC, VERSION, self.dim))
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.records -= captured
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Face Quality Gate for Face Pay
+Cheap checks that reject unusable face crops (tiny, clipped, badly lit,
+blurred or turned away) before the expensive encoding step
+"""
+
+import json
+import math
+import os
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+
+REASON_TOO_SMALL = "too small"
+REASON_CLIPPED = "clipped at frame edge"
+REASON_TOO_DARK = "too dark"
+REASON_TOO_BRIGHT = "too bright"
+REASON_BLURRED = "blurred"
+REASON_TURNED = "turned away"
+REASON_TILTED = "tilted"
+
+# What the customer can do about each rejection (shown on the scan screen)
+REASON_HINTS = {
+    REASON_TOO_SMALL: "Please move closer to the camera",
+    REASON_CLIPPED: "Please center your face in the frame",
+    REASON_TOO_DARK: "Too dark - please face the light",
+    REASON_TOO_BRIGHT: "Too bright - please step out of direct light",
+    REASON_BLURRED: "Please hold still",
+    REASON_TURNED: "Please look straight at the camera",
+    REASON_TILTED: "Please keep your head level",
+}
+
+# Side of the square the crop is resized to before measuring sharpness, so
+# the score does not depend on how large the face is in the frame
+SHARPNESS_SIZE = 64
+
+class FaceQualityGate:
+    def __init__(self, min_face_size: int = 60, edge_margin: int = 2,
+                 min_brightness: float = 40.0, max_brightness: float = 220.0,
+                 min_sharpness: float = 40.0, max_yaw: Optional[float] = 0.35,
+                 max_roll: Optional[float] = 20.0):
+        """Initialize the gate (every threshold can be set per deployment, see load())
+
+        min_face_size: smallest accepted box side in pixels
+        edge_margin: boxes closer than this to the frame border count as clipped
+        min_brightness/max_brightness: accepted mean grey level of the crop
+        min_sharpness: variance of the Laplacian of the crop, resized to
+            SHARPNESS_SIZE x SHARPNESS_SIZE; lower means blurrier
+        max_yaw: largest accepted nose offset from the eye midpoint, as a
+            fraction of the eye distance (needs landmarks; None disables)
+        max_roll: largest accepted eye-line angle in degrees (needs landmarks; None disables)
+        """
+        self.min_face_size = min_face_size
+        self.edge_margin = edge_margin
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_sharpness = min_sharpness
+        self.max_yaw = max_yaw
+        self.max_roll = max_roll
+        self.rejections = Counter()
+        self.last_rejection = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = "data/face_quality.json") -> Optional["FaceQualityGate"]:
+        """Gate with thresholds from a JSON file of constructor arguments
+
+        Returns None when the file is missing: the gate is opt-in per
+        deployment, so out of the box no face the detector finds is rejected.
+        An empty object ({}) enables it with the default thresholds.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                return cls(**json.load(f))
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable face quality settings {path}: {e}")
+            return cls()
+
+    def __getstate__(self):
+        # Sent to pipeline/enrolment worker processes: thresholds only
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def uses_landmarks(self) -> bool:
+        return self.max_yaw is not None or self.max_roll is not None
+
+    def check(self, frame, box: Tuple[int, int, int, int], rgb: bool = False) -> Optional[str]:
+        """Return why the face at box (x, y, w, h) is unusable, or None if it passes
+
+        frame may be grey or colour (BGR, or RGB when rgb is set); only the
+        crop is converted. Checks run cheapest first and stop at the first failure.
+        """
+        x, y, w, h = (int(v) for v in box)
+        height, width = frame.shape[:2]
+        if min(w, h) < self.min_face_size:
+            return REASON_TOO_SMALL
+        if (x < self.edge_margin or y < self.edge_margin
+                or x + w > width - self.edge_margin or y + h > height - self.edge_margin):
+            return REASON_CLIPPED
+
+        crop = frame[y:y+h, x:x+w]
+        if crop.ndim == 3:
+            crop = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY if rgb else cv2.COLOR_BGR2GRAY)
+        brightness = float(crop.mean())
+        if brightness < self.min_brightness:
+            return REASON_TOO_DARK
+        if brightness > self.max_brightness:
+            return REASON_TOO_BRIGHT
+
+        small = cv2.resize(crop, (SHARPNESS_SIZE, SHARPNESS_SIZE), interpolation=cv2.INTER_AREA)
+        if cv2.Laplacian(small, cv2.CV_64F).var() < self.min_sharpness:
+            return REASON_BLURRED
+        return None
+
+    def check_pose(self, landmarks: Dict[str, list]) -> Optional[str]:
+        """Return why the pose is unusable, or None, from 5-point landmarks
+
+        landmarks: face_recognition.face_landmarks(..., model="small") output
+            for one face (left_eye, right_eye, nose_tip)
+        """
+        left_eye = _mean_point(landmarks["left_eye"])
+        right_eye = _mean_point(landmarks["right_eye"])
+        nose = _mean_point(landmarks["nose_tip"])
+        dx, dy = right_eye[0] - left_eye[0], right_eye[1] - left_eye[1]
+        eye_distance = math.hypot(dx, dy)
+        if eye_distance == 0:
+            return REASON_TURNED
+        if self.max_roll is not None:
+            roll = abs(math.degrees(math.atan2(dy, dx)))
+            if min(roll, 180.0 - roll) > self.max_roll:
+                return REASON_TILTED
+        if self.max_yaw is not None:
+            # Distance of the nose from the eye midpoint along the eye line
+            mid_x, mid_y = (left_eye[0] + right_eye[0]) / 2, (left_eye[1] + right_eye[1]) / 2
+            offset = ((nose[0] - mid_x) * dx + (nose[1] - mid_y) * dy) / eye_distance
+            if abs(offset) / eye_distance > self.max_yaw:
+                return REASON_TURNED
+        return None
+
+    def record(self, reason: Optional[str]):
+        """Count a rejection (None for an accepted face) for the stats and the scan screen hint"""
+        self.last_rejection = reason
+        if reason is not None:
+            with self._lock:
+                self.rejections[reason] += 1
+
+    def hint(self) -> Optional[str]:
+        """Customer-facing hint for the most recent rejection, if the last face was rejected"""
+        return REASON_HINTS.get(self.last_rejection)
+
+def _mean_point(points) -> Tuple[float, float]:
+    return (sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
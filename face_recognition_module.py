@@ -4,69 +4,393 @@ Face Recognition Module for Face Pay
 Handles face registration, encoding, and recognition
 """
 
-import cv2
-import face_recognition
-import pickle
-import os
+import threading
+import time
 import numpy as np
 from typing import Dict, List, Tuple, Optional
+from face_gallery import FaceGallery, SampleBlocks, user_means
+from face_store import load_or_migrate, save_store
+from face_journal import FaceJournal, OP_ADD, OP_UPDATE, OP_DELETE
+from face_index import BruteForceIndex, IVFIndex, load_index
+from face_tracker import FaceTracker
+from recognition_pipeline import RecognitionPipeline
+import recognition
+from encoding_pool import EncodingPool
+from face_quality import FaceQualityGate, REASON_HINTS
+import lazy_imports
+
+# dlib and its models load on first use (or in warm_up), not when the app starts
+cv2 = lazy_imports.lazy_import("cv2")
+face_recognition = lazy_imports.lazy_import("face_recognition")
 
 class FaceRecognitionModule:
-    def __init__(self, faces_file: str = "data/faces.pkl"):
-        """Initialize the face recognition module"""
+    def __init__(self, faces_file: str = "data/faces.bin", tolerance: float = 0.6,
+                 index_file: str = "data/faces_index.npz", tracking: bool = False,
+                 detect_interval: int = 10, detection_scale: float = 1.0,
+                 detection_upsample: int = 1, convert_rgb: bool = True,
+                 camera_service=None, encoding_workers: int = 0,
+                 legacy_faces_file: str = "data/faces.pkl",
+                 journal_file: str = "data/faces.journal", compact_every: int = 1000,
+                 samples_per_user: int = 3, candidates: int = 5,
+                 quality_gate: Optional[FaceQualityGate] = None, check_quality: bool = True):
+        """Initialize the face recognition module
+        
+        detection_scale: resize factor for the frame the detector runs on; boxes
+            are mapped back so encoding still uses the full-resolution frame
+        detection_upsample: number_of_times_to_upsample passed to the detector
+        convert_rgb: convert camera BGR frames to the RGB face_recognition expects
+        camera_service: shared CameraService to read frames from instead of
+            opening the camera for every registration and recognition
+        encoding_workers: when > 0, frames with several faces are encoded in
+            parallel by a persistent pool of this many processes
+        legacy_faces_file: pickled gallery migrated into faces_file on first load
+        journal_file: append-only enrolment log replayed on top of faces_file
+        compact_every: journal records after which a background compaction
+            folds the journal into a new faces_file snapshot
+        samples_per_user: encodings captured per user by register_face
+        candidates: users kept by the centroid prefilter whose individual
+            samples are then compared
+        quality_gate: rejects unusable faces before encoding; defaults to
+            the deployment's data/face_quality.json, and is off when that file
+            does not exist (check_quality=False disables it either way)
+        """
         self.faces_file = faces_file
-        self.known_face_encodings = []
-        self.known_face_names = []
+        self.legacy_faces_file = legacy_faces_file
+        self.tolerance = tolerance
+        self.detection_scale = detection_scale
+        self.detection_upsample = detection_upsample
+        self.convert_rgb = convert_rgb
+        self.index_file = index_file
+        self.index = None
+        self.tracker = FaceTracker(detect_interval=detect_interval, rgb=convert_rgb) if tracking else None
+        self.samples_per_user = samples_per_user
+        self.candidates = candidates
+        self.quality_gate = (quality_gate or FaceQualityGate.load()) if check_quality else None
+        self.gallery = FaceGallery()
+        # Every user's samples, in gallery row order
+        self.samples = SampleBlocks(self.gallery.dim)
+        self.journal = FaceJournal(journal_file, self.gallery.dim)
+        self.compact_every = compact_every
+        self._journal_replayed = 0
+        self._lock = threading.RLock()
+        self._compaction_thread = None
+        self.camera_service = camera_service
         self.camera = None
+        self.pipeline = None
+        self.encoding_pool = EncodingPool(encoding_workers) if encoding_workers > 0 else None
+        # Rebuilds this module in pipeline worker processes, which only detect and match
+        # (no camera, encoding pool or registration quality gate there)
+        self.worker_kwargs = dict(
+            faces_file=faces_file, tolerance=tolerance, index_file=index_file, tracking=tracking,
+            detect_interval=detect_interval, detection_scale=detection_scale,
+            detection_upsample=detection_upsample, convert_rgb=convert_rgb,
+            legacy_faces_file=legacy_faces_file, journal_file=journal_file,
+            compact_every=compact_every, samples_per_user=samples_per_user, candidates=candidates,
+            check_quality=False)
         self.load_faces()
+        self.load_index()
+    
+    @property
+    def known_face_encodings(self) -> List[np.ndarray]:
+        """Per-user templates (sample centroids) as a list of rows (view of the gallery matrix)"""
+        return list(self.gallery.matrix)
+    
+    @property
+    def known_face_names(self) -> List[str]:
+        """Registered names, in gallery row order"""
+        return self.gallery.names
     
     def load_faces(self):
-        """Load registered faces from pickle file"""
+        """Load registered faces from the binary face store (memory-mapped)"""
         try:
-            if os.path.exists(self.faces_file):
-                with open(self.faces_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.known_face_encodings = data.get('encodings', [])
-                    self.known_face_names = data.get('names', [])
-                print(f"✅ Loaded {len(self.known_face_names)} registered faces")
+            data = load_or_migrate(self.faces_file, self.legacy_faces_file, self.gallery.dim)
+            if data is not None:
+                self._attach_store(data)
+            self._journal_replayed = self._replay_journal()
+            if len(self.gallery):
+                print(f"✅ Loaded {len(self.gallery)} registered faces")
             else:
                 print("ℹ️  No registered faces found. Please register users first.")
         except Exception as e:
             print(f"❌ Error loading faces: {e}")
-            self.known_face_encodings = []
-            self.known_face_names = []
+            self.gallery = FaceGallery()
+            self.samples = SampleBlocks(self.gallery.dim)
+    
+    def _attach_store(self, data):
+        """Install the stored samples and per-user centroids (both memory-mapped)"""
+        self.samples.attach(data.embeddings, data.user_starts)
+        if data.centroids is not None:
+            self.gallery.attach(data.names, data.centroids, data.centroid_sq_norms)
+            return
+        # Stores written before centroids were saved: derive them once (the next save stores them)
+        self.gallery.set(data.names, user_means(data.embeddings, data.user_starts))
+    
+    def _store_user_samples(self, name: str, encodings) -> Tuple[bool, np.ndarray]:
+        """Replace a user's samples and centroid; returns (is_new, sample rows)"""
+        rows = np.asarray(encodings, dtype=np.float32).reshape(-1, self.gallery.dim)
+        is_new = self.gallery.add(name, rows.mean(axis=0))
+        row = self.gallery.index_of(name)
+        self.samples.set(row, rows)
+        if self.index is not None:
+            self.index.add(self.gallery, row)
+        return is_new, rows
+    
+    def _remove_user_samples(self, name: str) -> bool:
+        """Drop a user's centroid and samples"""
+        row = self.gallery.index_of(name)
+        if row is None:
+            return False
+        self.gallery.remove(name)
+        self.samples.remove(row)
+        return True
+    
+    def _apply_enrolments(self, changes: Dict[str, Optional[np.ndarray]]) -> int:
+        """Apply many enrolment changes at once; returns how many users are new
+        
+        changes: name -> that user's new sample rows, or None to delete them.
+        Deletions are applied in one pass, so a batch costs O(users) once
+        rather than per change. The search index is not updated.
+        """
+        dim = self.gallery.dim
+        deleted = {name for name, rows in changes.items() if rows is None}
+        if deleted:
+            keep = np.array([name not in deleted for name in self.gallery.names], dtype=bool)
+            if not keep.all():
+                self.gallery.keep(keep)
+                self.samples.keep(keep)
+        new_users = 0
+        for name, rows in changes.items():
+            if rows is None:
+                continue
+            rows = np.asarray(rows, dtype=np.float32).reshape(-1, dim)
+            new_users += self.gallery.add(name, rows.mean(axis=0))
+            self.samples.set(self.gallery.index_of(name), rows)
+        return new_users
+    
+    def _replay_journal(self) -> int:
+        """Apply enrolment journal records on top of the loaded snapshot (as one batch)"""
+        applied = 0
+        changes = {}
+        for op, name, rows in self.journal.replay():
+            # Only the last record per user matters
+            changes.pop(name, None)
+            changes[name] = None if op == OP_DELETE else rows
+            applied += 1
+        if changes:
+            self._apply_enrolments(changes)
+        if applied:
+            print(f"✅ Replayed {applied} enrolment journal records")
+        return applied
+    
+    def load_index(self):
+        """Load the approximate search index built for this gallery, if any"""
+        try:
+            index = load_index(self.index_file)
+            if index is None:
+                return
+            if len(index.assignments) != len(self.gallery) or self._journal_replayed:
+                print("⚠️  Search index is out of date, rebuilding assignments")
+                index.rebuild(self.gallery)
+            self.index = index
+            print(f"✅ Loaded search index with {len(index.centroids)} cells")
+        except Exception as e:
+            print(f"❌ Error loading search index: {e}")
+            self.index = None
+    
+    def build_index(self, nlist: int = 256, nprobe: int = 8):
+        """Train an IVF index over the current gallery and persist it"""
+        index = IVFIndex(nlist=nlist, nprobe=nprobe)
+        index.train(self.gallery)
+        index.save(self.index_file)
+        self.index = index
+        print(f"✅ Built search index with {len(index.centroids)} cells for {len(self.gallery)} faces")
+    
+    def match(self, encodings) -> Tuple[np.ndarray, np.ndarray]:
+        """Match all face encodings of a frame against the gallery
+        
+        Returns (indices, distances): the best user (gallery row) per encoding
+        and the distance to that user's closest sample. The per-user centroids
+        select the `candidates` nearest users first (with the approximate index
+        when one is loaded, brute force otherwise), and only their samples are
+        compared, so the cost grows with the number of users, not samples.
+        """
+        if self.samples.one_per_user:
+            # One sample per user: the centroids are the samples
+            if self.index is not None:
+                indices, distances = self.index.search(self.gallery, encodings, k=1)
+                return indices[:, 0], distances[:, 0]
+            return self.gallery.match(encodings)
+        
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, self.gallery.dim)
+        searcher = self.index if self.index is not None else BruteForceIndex()
+        candidates, _ = searcher.search(self.gallery, queries, k=min(self.candidates, len(self.gallery)))
+        indices = np.full(len(queries), -1, dtype=np.intp)
+        distances = np.full(len(queries), np.inf, dtype=np.float32)
+        for i, users in enumerate(candidates):
+            users = users[users >= 0]
+            if not len(users):
+                continue
+            rows, owners = self.samples.rows_of(users)
+            sample_distances = np.linalg.norm(self.samples.take(rows) - queries[i], axis=1)
+            best = int(np.argmin(sample_distances))
+            indices[i], distances[i] = owners[best], sample_distances[best]
+        return indices, distances
     
     def save_faces(self):
-        """Save registered faces to pickle file"""
+        """Write a full snapshot to the face store and drop the journal records it captures"""
         try:
-            os.makedirs(os.path.dirname(self.faces_file), exist_ok=True)
-            data = {
-                'encodings': self.known_face_encodings,
-                'names': self.known_face_names
-            }
-            with open(self.faces_file, 'wb') as f:
-                pickle.dump(data, f)
-            print(f"✅ Saved {len(self.known_face_names)} faces to {self.faces_file}")
+            with self._lock:
+                checkpoint = self.journal.checkpoint()
+                # The store is replaced by rename, so stop mapping the old file first
+                self.gallery.detach()
+                self.samples.detach()
+                # Samples are updated in place, so write from a copy
+                names = list(self.gallery.names)
+                matrix, starts = self.samples.grouped()
+                centroids, centroid_sq_norms = self.gallery.matrix.copy(), self.gallery.sq_norms.copy()
+            user_ids = np.repeat(np.arange(len(names), dtype=np.uint32), np.diff(starts))
+            save_store(self.faces_file, names, user_ids, matrix,
+                       centroids=centroids, centroid_sq_norms=centroid_sq_norms)
+            if self.index is not None:
+                self.index.save(self.index_file)
+            self.journal.truncate_before(checkpoint)
+            print(f"✅ Saved {len(names)} faces ({len(matrix)} samples) to {self.faces_file}")
         except Exception as e:
             print(f"❌ Error saving faces: {e}")
     
+    def compact_async(self):
+        """Fold the journal into a new snapshot on a background thread"""
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self.save_faces, daemon=True)
+        self._compaction_thread.start()
+    
+    def _record_enrolment(self, op: int, name: str, encoding=None):
+        """Append one enrolment change to the journal (O(1)), compacting when it grows large"""
+        self.journal.append(op, name, encoding)
+        if self.journal.records >= self.compact_every:
+            self.compact_async()
+    
+    def enroll_many(self, encodings: Dict[str, List[np.ndarray]]) -> int:
+        """Register many users in one bulk commit (see bulk_enroll.py)
+        
+        encodings: name -> encodings from that user's images, all kept as samples
+        The gallery and index are updated once and written as a new snapshot
+        instead of one journal record per user. Returns the number enrolled.
+        """
+        if not encodings:
+            return 0
+        empty = [name for name, rows in encodings.items() if not len(rows)]
+        if empty:
+            raise ValueError(f"No encodings given for: {', '.join(empty)}")
+        with self._lock:
+            # Re-enrolled users have their samples replaced; the rest keep theirs
+            new_users = self._apply_enrolments(encodings)
+            if self.index is not None:
+                self.index.rebuild(self.gallery)
+        self.save_faces()
+        print(f"✅ Enrolled {len(encodings)} users ({new_users} new)")
+        return len(encodings)
+    
+    def remove_face(self, name: str) -> bool:
+        """Delete a registered face"""
+        with self._lock:
+            if not self._remove_user_samples(name):
+                print(f"❌ User '{name}' has no registered face")
+                return False
+            if self.index is not None:
+                self.index.rebuild(self.gallery)
+        self._record_enrolment(OP_DELETE, name)
+        print(f"✅ Removed face data for user: {name}")
+        return True
+    
+    def _to_rgb(self, frame) -> np.ndarray:
+        """Convert a camera BGR frame to the colour order used for detection and encoding"""
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if self.convert_rgb else frame
+    
+    def detect_faces(self, rgb_frame) -> List[Tuple[int, int, int, int]]:
+        """Run the detector on a downscaled copy and return full-resolution (top, right, bottom, left) boxes"""
+        scale = self.detection_scale
+        if scale == 1.0:
+            return face_recognition.face_locations(rgb_frame, number_of_times_to_upsample=self.detection_upsample)
+        
+        small = cv2.resize(rgb_frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        locations = face_recognition.face_locations(small, number_of_times_to_upsample=self.detection_upsample)
+        height, width = rgb_frame.shape[:2]
+        return [(max(0, int(round(top / scale))), min(width, int(round(right / scale))),
+                 min(height, int(round(bottom / scale))), max(0, int(round(left / scale))))
+                for (top, right, bottom, left) in locations]
+    
+    def _locate_faces(self, rgb_frame) -> List[Tuple[int, int, int, int]]:
+        """Find face locations (top, right, bottom, left), tracking between detections when enabled"""
+        if self.tracker is None:
+            return self.detect_faces(rgb_frame)
+        boxes = self.tracker.update(rgb_frame, self._detect_boxes)
+        return [(y, x + w, y + h, x) for (x, y, w, h) in boxes]
+    
+    def _detect_boxes(self, rgb_frame) -> List[Tuple[int, int, int, int]]:
+        """Run the detector and return (x, y, w, h) boxes for the tracker"""
+        return [(left, top, right - left, bottom - top)
+                for (top, right, bottom, left) in self.detect_faces(rgb_frame)]
+    
+    def encode_faces(self, rgb_frame, face_locations) -> List[np.ndarray]:
+        """Encode the faces at the given locations, in order, using the process pool if enabled"""
+        if self.encoding_pool is not None:
+            return self.encoding_pool.encode(rgb_frame, face_locations)
+        return face_recognition.face_encodings(rgb_frame, face_locations)
+    
+    def _open_camera(self):
+        """Return a frame source: the shared camera service if one is attached, else a fresh capture"""
+        if self.camera_service is not None:
+            if not self.camera_service.is_running:
+                self.camera_service.start()
+            return self.camera_service.reader()
+        return cv2.VideoCapture(0)
+    
+    def warm_up(self) -> bool:
+        """Open the camera, load the detector/encoder models and run one dummy inference
+        
+        Meant for a background thread while the first screen is showing, so the
+        model load and first-call overhead do not land on the first scan.
+        """
+        try:
+            if self.camera_service is not None and not self.camera_service.is_running:
+                self.camera_service.start()
+            cv2.load()
+            face_recognition.load()
+            start = time.perf_counter()
+            rgb_frame = np.zeros((240, 320, 3), dtype=np.uint8)
+            self.detect_faces(rgb_frame)
+            # A blank frame has no faces, so encode a fixed box to exercise the encoder too
+            self.encode_faces(rgb_frame, [(40, 200, 200, 40)])
+            lazy_imports.record_timing("first inference", time.perf_counter() - start)
+            if self.encoding_pool is not None:
+                # Single faces are encoded in-process, so the pool needs its own warm-up
+                start = time.perf_counter()
+                self.encoding_pool.warm_up()
+                lazy_imports.record_timing("encoding pool warm-up", time.perf_counter() - start)
+            return True
+        except Exception as e:
+            print(f"⚠️  Face model warm-up failed: {e}")
+            return False
+    
     def register_face(self, name: str) -> bool:
-        """Register a new face for the given name"""
+        """Register a new face for the given name (samples_per_user captures)"""
         print(f"📸 Registering face for: {name}")
         
         # Initialize camera
-        camera = cv2.VideoCapture(0)
+        camera = self._open_camera()
         if not camera.isOpened():
             print("❌ Could not open camera")
             return False
         
-        face_detected = False
-        face_encoding = None
+        samples_needed = self.samples_per_user
+        face_samples = []
         
-        print("👤 Please look at the camera and press 'R' to register your face...")
-        print("Press 'Q' to quit registration")
+        print(f"👤 Please look at the camera. We need {samples_needed} face samples.")
+        print("Press 'R' to capture each sample, 'Q' to quit")
         
-        while True:
+        while len(face_samples) < samples_needed:
             ret, frame = camera.read()
             if not ret:
                 print("❌ Failed to capture frame")
@@ -76,8 +400,9 @@ class FaceRecognitionModule:
             frame = cv2.flip(frame, 1)
             
             # Find faces in the frame
-            face_locations = face_recognition.face_locations(frame)
-            face_encodings = face_recognition.face_encodings(frame, face_locations)
+            rgb_frame = self._to_rgb(frame)
+            face_locations = self.detect_faces(rgb_frame)
+            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
             
             # Draw rectangle around detected faces
             for (top, right, bottom, left) in face_locations:
@@ -86,9 +411,11 @@ class FaceRecognitionModule:
                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
             
             # Show instructions
-            cv2.putText(frame, "Press 'R' to Register Face", (10, 30), 
+            cv2.putText(frame, f"Sample {len(face_samples) + 1}/{samples_needed}", (10, 30), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            cv2.putText(frame, "Press 'R' to Capture Sample", (10, 60), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            cv2.putText(frame, "Press 'Q' to Quit", (10, 60), 
+            cv2.putText(frame, "Press 'Q' to Quit", (10, 90), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
             
             cv2.imshow('Face Registration', frame)
@@ -98,128 +425,153 @@ class FaceRecognitionModule:
             if key == ord('q'):
                 break
             elif key == ord('r'):
-                if face_encodings:
-                    face_encoding = face_encodings[0]
-                    face_detected = True
-                    print("✅ Face captured successfully!")
-                    break
+                reason = self._quality_rejection(rgb_frame, face_locations[0]) if face_encodings else None
+                if reason is not None:
+                    print(f"❌ Sample rejected ({reason}). {REASON_HINTS[reason]}")
+                elif face_encodings:
+                    face_samples.append(face_encodings[0])
+                    print(f"✅ Captured sample {len(face_samples)}/{samples_needed}")
+                    
+                    # Add a small delay to avoid capturing the same frame
+                    time.sleep(0.5)
                 else:
                     print("❌ No face detected. Please position your face in the camera.")
         
         camera.release()
         cv2.destroyAllWindows()
         
-        if face_detected and face_encoding is not None:
-            # Check if name already exists
-            if name in self.known_face_names:
-                # Update existing face
-                idx = self.known_face_names.index(name)
-                self.known_face_encodings[idx] = face_encoding
-                print(f"🔄 Updated face for existing user: {name}")
+        if len(face_samples) == samples_needed:
+            # Re-registration replaces the user's samples
+            with self._lock:
+                is_new, rows = self._store_user_samples(name, face_samples)
+            if is_new:
+                print(f"✅ Registered new user: {name} with {len(rows)} samples")
             else:
-                # Add new face
-                self.known_face_encodings.append(face_encoding)
-                self.known_face_names.append(name)
-                print(f"✅ Registered new user: {name}")
+                print(f"🔄 Updated face for existing user: {name} with {len(rows)} samples")
             
-            self.save_faces()
+            self._record_enrolment(OP_ADD if is_new else OP_UPDATE, name, rows)
             return True
         else:
-            print("❌ Face registration failed")
+            print("❌ Face registration failed - not enough samples captured")
             return False
     
-    def start_recognition(self) -> Tuple[bool, Optional[str]]:
-        """Start face recognition and return (success, user_name)"""
+    def start_recognition(self, policy=None, show_preview: bool = True,
+                          timeout: Optional[float] = None, renderer=None) -> Tuple[bool, Optional[str]]:
+        """Start face recognition and return (success, user_name)
+        
+        With the preview, 'C' confirms; without it (headless), `policy`
+        confirms, by default after 3 consecutive consistent matches.
+        renderer: draw somewhere other than an OpenCV window (e.g. the Tk GUI)
+        """
         print("🔍 Starting face recognition...")
         
         # Initialize camera
-        self.camera = cv2.VideoCapture(0)
+        self.camera = self._open_camera()
         if not self.camera.isOpened():
             print("❌ Could not open camera")
             return False, None
         
-        if not self.known_face_encodings:
+        if not len(self.gallery):
             print("❌ No registered faces found")
             self.camera.release()
             return False, None
         
         print("👤 Please look at the camera for recognition...")
-        print("Press 'Q' to quit recognition")
+        if renderer is None and show_preview:
+            print("Press 'C' to confirm when recognized, or 'Q' to quit")
+            renderer = recognition.PreviewRenderer()
         
-        while True:
-            ret, frame = self.camera.read()
-            if not ret:
-                print("❌ Failed to capture frame")
-                break
-            
-            # Flip frame horizontally for mirror effect
-            frame = cv2.flip(frame, 1)
-            
-            # Find faces in the frame
-            face_locations = face_recognition.face_locations(frame)
-            face_encodings = face_recognition.face_encodings(frame, face_locations)
-            
-            # Check each face found in the frame
-            for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                # Compare with known faces
-                matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, tolerance=0.6)
-                face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                
-                if True in matches:
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index]:
-                        name = self.known_face_names[best_match_index]
-                        confidence = 1 - face_distances[best_match_index]
-                        
-                        # Draw rectangle and name
-                        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                        cv2.putText(frame, f"{name} ({confidence:.2f})", (left, top - 10), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                        
-                        # Show recognition message
-                        cv2.putText(frame, f"Recognized: {name}", (10, 30), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                        cv2.putText(frame, "Press 'C' to Confirm", (10, 60), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                        
-                        cv2.imshow('Face Recognition', frame)
-                        
-                        key = cv2.waitKey(1) & 0xFF
-                        if key == ord('c'):
-                            self.camera.release()
-                            cv2.destroyAllWindows()
-                            print(f"✅ Face recognized: {name}")
-                            return True, name
-                        elif key == ord('q'):
-                            self.camera.release()
-                            cv2.destroyAllWindows()
-                            return False, None
-                else:
-                    # Unknown face
-                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
-                    cv2.putText(frame, "Unknown", (left, top - 10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-            
-            # Show instructions
-            cv2.putText(frame, "Press 'Q' to Quit", (10, frame.shape[0] - 20), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            
-            cv2.imshow('Face Recognition', frame)
-            
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                break
-        
-        self.camera.release()
-        cv2.destroyAllWindows()
-        return False, None
+        try:
+            return self.recognize_stream(recognition.camera_frames(self.camera), policy, renderer, timeout)
+        finally:
+            self.camera.release()
+            if renderer is not None:
+                renderer.close()
+    
+    def recognize_frame(self, frame) -> List[Tuple[Tuple[int, int, int, int], Optional[str], float]]:
+        """Headless recognition of one BGR frame: [((x, y, w, h), name or None, confidence)]"""
+        rgb_frame = self._to_rgb(frame)
+        return self._identify(rgb_frame, self._locate_faces(rgb_frame))
+    
+    def recognize_stream(self, frames, policy=None, renderer=None,
+                         timeout: Optional[float] = None) -> Tuple[bool, Optional[str]]:
+        """Recognize frames until `policy` (or the renderer's confirm key) confirms a user"""
+        if self.tracker is not None:
+            self.tracker.reset()
+        return recognition.recognize_stream(self, frames, policy, renderer, timeout)
+    
+    def detect_frame(self, frame) -> List[Tuple[int, int, int, int]]:
+        """Pipeline detect stage: face locations (top, right, bottom, left) in a BGR frame"""
+        return self._locate_faces(self._to_rgb(frame))
+    
+    def identify_faces(self, frame, face_locations) -> List[Tuple[Tuple[int, int, int, int], Optional[str], float]]:
+        """Pipeline encode/match stage: [((x, y, w, h), name or None, confidence)] per face"""
+        return self._identify(self._to_rgb(frame), face_locations)
+    
+    def _quality_rejection(self, rgb_frame, location) -> Optional[str]:
+        """Why the face at (top, right, bottom, left) is not worth encoding, or None"""
+        gate = self.quality_gate
+        if gate is None:
+            return None
+        top, right, bottom, left = location
+        reason = gate.check(rgb_frame, (left, top, right - left, bottom - top), rgb=self.convert_rgb)
+        if reason is None and gate.uses_landmarks:
+            # The 5-point model costs a fraction of an encoding, and only runs on faces that passed so far
+            landmarks = face_recognition.face_landmarks(rgb_frame, [location], model="small")
+            reason = gate.check_pose(landmarks[0]) if landmarks else None
+        gate.record(reason)
+        return reason
+    
+    def _identify(self, rgb_frame, face_locations):
+        if not face_locations:
+            return []
+        usable = [self._quality_rejection(rgb_frame, location) is None for location in face_locations]
+        encoded = [location for location, ok in zip(face_locations, usable) if ok]
+        matches = iter(())
+        if encoded:
+            face_encodings = self.encode_faces(rgb_frame, encoded)
+            matches = zip(*self.match(face_encodings))
+        results = []
+        for (top, right, bottom, left), ok in zip(face_locations, usable):
+            box = (left, top, right - left, bottom - top)
+            if not ok:
+                # Rejected faces are still reported (as unknown) so the preview shows them
+                results.append((box, None, 0.0))
+                continue
+            best_match_index, distance = next(matches)
+            name = self.gallery.names[best_match_index] if distance <= self.tolerance else None
+            results.append((box, name, float(1 - distance)))
+        return results
+    
+    def start_pipelined_recognition(self, detect_workers: int = 1, identify_workers: int = 1,
+                                    use_processes: bool = False, policy=None,
+                                    show_preview: bool = True) -> Tuple[bool, Optional[str]]:
+        """Like start_recognition, but with capture, detection, encoding and display decoupled"""
+        if not len(self.gallery):
+            print("❌ No registered faces found")
+            return False, None
+        print("🔍 Starting pipelined face recognition...")
+        self.pipeline = RecognitionPipeline(self, detect_workers=detect_workers,
+                                            identify_workers=identify_workers,
+                                            use_processes=use_processes)
+        return self.pipeline.run(policy, show_preview)
     
     def stop_recognition(self):
         """Stop face recognition and release camera"""
+        if self.pipeline is not None:
+            self.pipeline.stop()
         if self.camera:
             self.camera.release()
         cv2.destroyAllWindows()
     
+    def close(self):
+        """Release background resources (encoding processes, journal)"""
+        if self.encoding_pool is not None:
+            self.encoding_pool.close()
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        self.journal.close()
+    
     def get_registered_users(self) -> List[str]:
         """Get list of registered user names"""
         return self.known_face_names.copy() 
\ No newline at end of file
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Face Store for Face Pay
+Versioned binary gallery format whose embedding block can be memory-mapped
+
+Layout (little-endian):
+    header      128 bytes: magic, version, dim, rows, users, offsets
+    embeddings  rows x dim float32, starting at byte 128
+    sq_norms    rows float32 (squared L2 norm of every embedding row)
+    user_ids    rows uint32 (owner of every embedding row, index into names)
+    user_starts (users + 1) uint64, 8-byte aligned: user u owns embedding
+                rows user_starts[u]:user_starts[u + 1]
+    centroids   optional users x dim float32 (mean embedding of every user),
+                then users float32 squared norms; offset 0 when absent
+    names       users x (uint32 length + UTF-8 bytes)
+
+Version 1 files (64-byte header, no user_starts or centroids) still load.
+"""
+
+import os
+import struct
+import pickle
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Optional
+
+MAGIC = b"FPAYFACE"
+VERSION = 2
+HEADER = struct.Struct("<8sIIQQQQQQQ")  # magic, version, dim, rows, users, norms/ids/names/starts/centroids offsets
+HEADER_SIZE = 128
+HEADER_V1 = struct.Struct("<8sIIQQQQQ")
+HEADER_SIZE_V1 = 64
+
+@dataclass
+class FaceStoreData:
+    """Contents of a face store file"""
+    dim: int
+    names: List[str]
+    user_ids: np.ndarray
+    embeddings: np.ndarray
+    sq_norms: np.ndarray
+    # Row offsets per user (users + 1); embeddings are grouped by user when set
+    user_starts: Optional[np.ndarray] = None
+    centroids: Optional[np.ndarray] = None
+    centroid_sq_norms: Optional[np.ndarray] = None
+
+def _group_by_user(user_ids: np.ndarray, users: int) -> np.ndarray:
+    """Row offsets of each user's block; user_ids must be sorted"""
+    return np.searchsorted(user_ids, np.arange(users + 1)).astype(np.uint64)
+
+def save_store(path: str, names: List[str], user_ids, embeddings, sq_norms=None,
+               centroids=None, centroid_sq_norms=None):
+    """Write a face store atomically (temp file + rename)
+
+    Embedding rows must be grouped by user (user_ids sorted). centroids, if
+    given, are stored per user so loading does not have to recompute them.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    rows, dim = embeddings.shape
+    user_ids = np.ascontiguousarray(user_ids, dtype=np.uint32)
+    if np.any(user_ids[1:] < user_ids[:-1]):
+        raise ValueError("embedding rows must be grouped by user")
+    if sq_norms is None:
+        sq_norms = np.einsum('ij,ij->i', embeddings, embeddings)
+    sq_norms = np.ascontiguousarray(sq_norms, dtype=np.float32)
+    user_starts = _group_by_user(user_ids, len(names))
+
+    norms_offset = HEADER_SIZE + embeddings.nbytes
+    ids_offset = norms_offset + sq_norms.nbytes
+    starts_offset = -(-(ids_offset + user_ids.nbytes) // 8) * 8
+    names_offset = starts_offset + user_starts.nbytes
+    centroids_offset = 0
+    if centroids is not None:
+        centroids = np.ascontiguousarray(centroids, dtype=np.float32).reshape(len(names), dim)
+        if centroid_sq_norms is None:
+            centroid_sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+        centroid_sq_norms = np.ascontiguousarray(centroid_sq_norms, dtype=np.float32)
+        centroids_offset = names_offset
+        names_offset += centroids.nbytes + centroid_sq_norms.nbytes
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        header = HEADER.pack(MAGIC, VERSION, dim, rows, len(names), norms_offset, ids_offset,
+                             names_offset, starts_offset, centroids_offset)
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(embeddings.tobytes())
+        f.write(sq_norms.tobytes())
+        f.write(user_ids.tobytes())
+        f.write(b"\0" * (starts_offset - ids_offset - user_ids.nbytes))
+        f.write(user_starts.tobytes())
+        if centroids is not None:
+            f.write(centroids.tobytes())
+            f.write(centroid_sq_norms.tobytes())
+        for name in names:
+            encoded = name.encode("utf-8")
+            f.write(struct.pack("<I", len(encoded)))
+            f.write(encoded)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def load_store(path: str, mmap: bool = True) -> FaceStoreData:
+    """Open a face store; with mmap the embedding and centroid blocks are mapped copy-on-write, not read"""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+        magic, version = struct.unpack_from("<8sI", header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a Face Pay face store")
+        if version == 1:
+            _, _, dim, rows, users, norms_offset, ids_offset, names_offset = HEADER_V1.unpack_from(header)
+            embeddings_offset, starts_offset, centroids_offset = HEADER_SIZE_V1, 0, 0
+        elif version == VERSION:
+            (_, _, dim, rows, users, norms_offset, ids_offset, names_offset,
+             starts_offset, centroids_offset) = HEADER.unpack_from(header)
+            embeddings_offset = HEADER_SIZE
+        else:
+            raise ValueError(f"Unsupported face store version {version}")
+
+        f.seek(names_offset)
+        names = []
+        for _ in range(users):
+            (length,) = struct.unpack("<I", f.read(4))
+            names.append(f.read(length).decode("utf-8"))
+        if starts_offset:
+            f.seek(starts_offset)
+            user_starts = np.fromfile(f, dtype=np.uint64, count=users + 1).astype(np.intp)
+
+    def read(offset: int, dtype, shape, mode='c'):
+        if mmap:
+            # Copy-on-write: in-place updates stay private to this process until saved
+            return np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=shape)
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+    if rows == 0:
+        embeddings = np.empty((0, dim), dtype=np.float32)
+        sq_norms = np.empty(0, dtype=np.float32)
+        user_ids = np.empty(0, dtype=np.uint32)
+    else:
+        embeddings = read(embeddings_offset, np.float32, (rows, dim))
+        sq_norms = read(norms_offset, np.float32, (rows,))
+        user_ids = read(ids_offset, np.uint32, (rows,), mode='r')
+
+    centroids = centroid_sq_norms = None
+    if starts_offset:
+        if centroids_offset and users:
+            centroids = read(centroids_offset, np.float32, (users, dim))
+            centroid_sq_norms = read(centroids_offset + users * dim * 4, np.float32, (users,))
+    else:
+        # Version 1 did not require grouped rows; group them once here
+        if np.any(user_ids[1:] < user_ids[:-1]):
+            order = np.argsort(user_ids, kind='stable')
+            embeddings, sq_norms, user_ids = embeddings[order], sq_norms[order], user_ids[order]
+        user_starts = _group_by_user(user_ids, users).astype(np.intp)
+
+    return FaceStoreData(dim=dim, names=names, user_ids=user_ids, embeddings=embeddings, sq_norms=sq_norms,
+                         user_starts=user_starts, centroids=centroids, centroid_sq_norms=centroid_sq_norms)
+
+def normalize_samples(samples) -> np.ndarray:
+    """Center and L2-normalize feature rows so a dot product is a Pearson correlation"""
+    samples = np.asarray(samples, dtype=np.float32)
+    samples = samples - samples.mean(axis=-1, keepdims=True)
+    norms = np.linalg.norm(samples, axis=-1, keepdims=True)
+    return samples / np.maximum(norms, 1e-12)
+
+def convert_pickle(data) -> Optional[FaceStoreData]:
+    """Convert either legacy faces.pkl layout into store contents
+
+    FaceRecognitionModule pickled {'encodings': [...], 'names': [...]} with one
+    encoding per user; SimpleFaceDetection pickled {name: [samples]}, which is
+    stored pre-normalized as its matcher expects.
+    """
+    if isinstance(data, dict) and set(data.keys()) <= {'encodings', 'names'} and 'names' in data:
+        names = list(data['names'])
+        embeddings = np.asarray(data.get('encodings', []), dtype=np.float32).reshape(len(names), -1)
+        if not names:
+            embeddings = np.empty((0, 128), dtype=np.float32)
+        user_ids = np.arange(len(names), dtype=np.uint32)
+    elif isinstance(data, dict):
+        names = [name for name, samples in data.items() if len(samples)]
+        rows = [sample for name in names for sample in data[name]]
+        user_ids = np.asarray([uid for uid, name in enumerate(names) for _ in data[name]], dtype=np.uint32)
+        embeddings = normalize_samples(np.stack(rows)) if rows else np.empty((0, 10000), dtype=np.float32)
+    else:
+        return None
+    sq_norms = np.einsum('ij,ij->i', embeddings, embeddings)
+    return FaceStoreData(dim=embeddings.shape[1], names=names, user_ids=user_ids,
+                         embeddings=embeddings, sq_norms=sq_norms)
+
+def migrate_pickle(pickle_path: str, store_path: str) -> bool:
+    """One-shot migration of a legacy faces.pkl into a face store file"""
+    try:
+        with open(pickle_path, 'rb') as f:
+            data = convert_pickle(pickle.load(f))
+        if data is None:
+            print(f"❌ Unrecognized face data layout in {pickle_path}")
+            return False
+        save_store(store_path, data.names, data.user_ids, data.embeddings, data.sq_norms)
+        print(f"✅ Migrated {len(data.names)} users ({len(data.user_ids)} embeddings) "
+              f"from {pickle_path} to {store_path}")
+        return True
+    except Exception as e:
+        print(f"❌ Error migrating {pickle_path}: {e}")
+        return False
+
+def load_or_migrate(store_path: str, legacy_path: Optional[str], dim: int) -> Optional[FaceStoreData]:
+    """Load a face store, migrating the legacy pickle first if only that exists
+
+    Returns None when there is no data, or when the legacy pickle holds the
+    other face module's layout (a different embedding size).
+    """
+    if os.path.exists(store_path):
+        data = load_store(store_path)
+        if data.dim != dim:
+            raise ValueError(f"{store_path} holds {data.dim}-dim embeddings, expected {dim}")
+        return data
+    if not legacy_path or not os.path.exists(legacy_path):
+        return None
+
+    with open(legacy_path, 'rb') as f:
+        data = convert_pickle(pickle.load(f))
+    if data is None or data.dim != dim:
+        return None
+    save_store(store_path, data.names, data.user_ids, data.embeddings, data.sq_norms)
+    print(f"✅ Migrated {len(data.names)} users from {legacy_path} to {store_path}")
+    return load_store(store_path)
+
+def main():
+    """Migrate a legacy pickle gallery from the command line"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Migrate data/faces.pkl to the binary face store")
+    parser.add_argument("pickle_path", nargs="?", default="data/faces.pkl")
+    parser.add_argument("store_path", nargs="?", default=None,
+                        help="defaults to data/faces.bin or data/faces_simple.bin by layout")
+    args = parser.parse_args()
+
+    store_path = args.store_path
+    if store_path is None:
+        with open(args.pickle_path, 'rb') as f:
+            data = pickle.load(f)
+        simple_layout = isinstance(data, dict) and 'names' not in data
+        store_path = "data/faces_simple.bin" if simple_layout else "data/faces.bin"
+    migrate_pickle(args.pickle_path, store_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Face Tracker for Face Pay
+Follows detected faces between frames so the full detector runs only occasionally
+"""
+
+import threading
+import numpy as np
+from typing import Callable, List, Tuple
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+
+Box = Tuple[int, int, int, int]  # (x, y, w, h)
+
+class FaceTracker:
+    def __init__(self, detect_interval: int = 10, min_confidence: float = 0.6, padding: float = 0.5,
+                 rgb: bool = False):
+        """Initialize the tracker
+
+        detect_interval: run the full detector at least every N frames
+        min_confidence: template-match score below which tracking is dropped
+        padding: search window margin around the last box, as a fraction of its size
+        rgb: colour frames arrive in RGB order (BGR otherwise, as from the camera)
+        """
+        self.detect_interval = detect_interval
+        self.min_confidence = min_confidence
+        self.padding = padding
+        self.rgb = rgb
+        # Pipeline detect workers share one tracker; boxes and templates must change together
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget all tracked faces so the next frame runs the detector"""
+        with self._lock:
+            self.boxes = []
+            self.templates = []
+            # Bumped per detector run so a slower, older detection cannot overwrite a newer one
+            self._generation = 0
+            self._stored_generation = 0
+            self.frames_since_detection = 0
+            self.last_confidence = 0.0
+            self.detections = 0
+            self.tracked_frames = 0
+
+    def update(self, frame: np.ndarray, detect: Callable[[np.ndarray], List[Box]]) -> List[Box]:
+        """Return face boxes for this frame, calling `detect` only when needed (thread-safe)
+
+        The lock covers the tracker state only; `detect` runs outside it so
+        pipeline workers can detect on different frames at the same time.
+        """
+        if frame.ndim == 2:
+            gray = frame
+        else:
+            gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY if self.rgb else cv2.COLOR_BGR2GRAY)
+
+        with self._lock:
+            if self.boxes and self.frames_since_detection < self.detect_interval:
+                tracked = self._track(gray)
+                if tracked is not None:
+                    self.boxes = tracked
+                    self.frames_since_detection += 1
+                    self.tracked_frames += 1
+                    return list(self.boxes)
+            self._generation += 1
+            generation = self._generation
+
+        boxes = [tuple(int(v) for v in box) for box in detect(frame)]
+        templates = [gray[y:y + h, x:x + w].copy() for (x, y, w, h) in boxes]
+
+        with self._lock:
+            self.detections += 1
+            if generation > self._stored_generation:
+                self._stored_generation = generation
+                self.boxes = boxes
+                self.templates = templates
+                self.frames_since_detection = 0
+                self.last_confidence = 1.0 if boxes else 0.0
+        return list(boxes)
+
+    def _track(self, gray: np.ndarray):
+        """Template-match every face inside a padded window around its last box"""
+        frame_h, frame_w = gray.shape[:2]
+        tracked = []
+        confidence = 1.0
+        for (x, y, w, h), template in zip(self.boxes, self.templates):
+            pad_x, pad_y = int(w * self.padding), int(h * self.padding)
+            x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+            x1, y1 = min(frame_w, x + w + pad_x), min(frame_h, y + h + pad_y)
+            window = gray[y0:y1, x0:x1]
+            if window.shape[0] < h or window.shape[1] < w:
+                return None
+
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+            if score < self.min_confidence:
+                return None
+            confidence = min(confidence, score)
+            tracked.append((x0 + dx, y0 + dy, w, h))
+
+        self.last_confidence = confidence
+        return tracked
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Group Commit Writer for Face Pay
+Moves persistence off the calling (GUI) thread and batches mutations so
+one write + fsync covers many of them
+"""
+
+import atexit
+import threading
+import time
+from typing import Callable, List, Optional
+
+DURABILITY_SYNC = "sync"      # commit inline; durable when the call returns
+DURABILITY_GROUP = "group"    # caller waits for the batch its mutation joined
+DURABILITY_ASYNC = "async"    # caller returns at once; committed within `interval`
+
+class CommitError(RuntimeError):
+    """Writes that were submitted could not be committed"""
+
+class _Batch:
+    """Outcome of one commit, shared by the callers whose items it holds"""
+    __slots__ = ("done", "error")
+
+    def __init__(self):
+        self.done = False
+        self.error = None
+
+class GroupCommitWriter:
+    def __init__(self, commit: Callable[[List], None], mode: str = DURABILITY_GROUP,
+                 interval: float = 0.01, max_batch: int = 256, name: str = "writer",
+                 on_error: Optional[Callable[[Exception, List], None]] = None):
+        """Initialize the writer
+
+        commit: called with a list of pending items; must persist them durably
+            and raise if it cannot. Sync and group callers then get a
+            CommitError; async failures are raised by the next flush() or close()
+        interval: in async mode, how long a batch stays open for more items; in
+            group mode batches form from whatever arrives while the previous
+            commit is in progress, so a lone caller never waits for a timer
+        max_batch: commit early once this many items are pending
+        on_error: called on the committing thread with (exception, batch) when
+            a batch fails, e.g. to alert the operator as soon as it happens
+        """
+        if mode not in (DURABILITY_SYNC, DURABILITY_GROUP, DURABILITY_ASYNC):
+            raise ValueError(f"Unknown durability mode: {mode}")
+        self.commit = commit
+        self.mode = mode
+        self.interval = interval
+        self.max_batch = max_batch
+        self.name = name
+        self.on_error = on_error
+        self._pending = []
+        # Outcome shared by the items queued since the last batch was taken
+        self._batch = None
+        # First async failure not yet raised by flush()
+        self._error = None
+        self._submitted = 0
+        self._committed = 0
+        self._flush_waiters = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._commit_lock = threading.Lock()
+        self._thread = None
+        if mode != DURABILITY_SYNC:
+            # Async mutations must still reach disk if the owner forgets to close()
+            atexit.register(self.close)
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, item):
+        """Queue one mutation according to the durability mode"""
+        if self.mode != DURABILITY_SYNC:
+            with self._cond:
+                if not self._closed:
+                    self._pending.append(item)
+                    self._submitted += 1
+                    if self._batch is None:
+                        self._batch = _Batch()
+                    batch = self._batch
+                    self._start()
+                    # Wakes the writer to open a batch, or to close it early once full
+                    self._cond.notify_all()
+                    if self.mode == DURABILITY_GROUP:
+                        while not batch.done:
+                            self._cond.wait()
+                        if batch.error is not None:
+                            raise CommitError(f"{self.name}: write failed: {batch.error}") from batch.error
+                    return
+        error = self._commit([item])
+        if error is not None:
+            raise CommitError(f"{self.name}: write failed: {error}") from error
+
+    def flush(self):
+        """Commit everything submitted so far and wait for it
+
+        Raises CommitError if an async batch failed since the last flush.
+        """
+        if self._thread is None:
+            return
+        with self._cond:
+            ticket = self._submitted
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            while self._committed < ticket:
+                self._cond.wait()
+            self._flush_waiters -= 1
+            error, self._error = self._error, None
+        if error is not None:
+            raise CommitError(f"{self.name}: queued writes were lost: {error}") from error
+
+    def close(self):
+        """Flush and stop the writer thread (idempotent; raises like flush())"""
+        try:
+            self.flush()
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            if self._thread is not None and self._thread is not threading.current_thread():
+                self._thread.join()
+
+    def _commit(self, batch: List) -> Optional[Exception]:
+        """Commit one batch; returns the exception if it failed"""
+        with self._commit_lock:
+            try:
+                self.commit(batch)
+                return None
+            except Exception as e:
+                print(f"❌ {self.name}: error committing {len(batch)} pending writes: {e}")
+                if self.on_error is not None:
+                    try:
+                        self.on_error(e, batch)
+                    except Exception as callback_error:
+                        print(f"❌ {self.name}: error reporting a failed commit: {callback_error}")
+                return e
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Hold an async batch open briefly so bursts of mutations share one commit
+                deadline = time.monotonic() + self.interval
+                while self.mode == DURABILITY_ASYNC and len(self._pending) < self.max_batch \
+                        and not self._flush_waiters and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+                outcome, self._batch = self._batch, None
+                ticket = self._submitted
+
+            error = self._commit(batch)
+
+            with self._cond:
+                self._committed = ticket
+                outcome.done, outcome.error = True, error
+                if error is not None and self.mode == DURABILITY_ASYNC and self._error is None:
+                    # Nobody waited for this batch, so the next flush() reports it
+                    self._error = error
+                self._cond.notify_all()
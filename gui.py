@@ -10,22 +10,41 @@ import threading
 import time
 from typing import Optional
 from transaction_manager import TransactionManager
+from transaction_ids import default_terminal_id
+from group_commit import CommitError, DURABILITY_ASYNC
+from recognition import ConsecutiveMatchPolicy, SharedFrameRenderer
+from recognition_pipeline import render_results
+import lazy_imports
+
+cv2 = lazy_imports.lazy_import("cv2")
+
+# Embedded camera preview size and refresh cap (independent of recognition speed)
+PREVIEW_WIDTH = 320
+PREVIEW_HEIGHT = 240
+PREVIEW_FPS = 15
 
 class FacePayGUI:
-    def __init__(self, face_module, pin_module):
+    def __init__(self, face_module, pin_module, transaction_manager=None):
         """Initialize the Face Pay GUI"""
         self.face_module = face_module
         self.pin_module = pin_module
-        self.transaction_manager = TransactionManager()
+        # Async durability: the Tk thread never waits for an fsync; on_closing flushes
+        self.transaction_manager = transaction_manager or TransactionManager(durability=DURABILITY_ASYNC)
+        # Failed PINs count against this terminal too, including ones for unknown users
+        self.terminal_id = default_terminal_id()
         self.current_user = None
         self.recognition_thread = None
         self.is_scanning = False
+        self.is_verifying = False
         self.current_frame = None
+        self.preview_renderer = None
+        self._preview_shown = None
+        self.warm_up_thread = None
         
         # Create main window
         self.root = tk.Tk()
         self.root.title("Face Pay - Facial Recognition Payment System")
-        self.root.geometry("700x600")
+        self.root.geometry("700x760")
         self.root.configure(bg='#2c3e50')
         
         # Center the window
@@ -37,8 +56,31 @@ class FacePayGUI:
         # Configure window close event
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
+        # Background writes nobody waits for report failures here
+        self.transaction_manager.writer.on_error = self._on_write_error
+        self.pin_module.writer.on_error = self._on_write_error
+        
         # Start with amount entry screen
         self.show_amount_entry()
+        
+        # Load the face models while the cashier types the amount
+        self.root.after(0, lazy_imports.mark, "first window")
+        self._start_warm_up()
+    
+    def _start_warm_up(self):
+        """Warm up the face module in the background (camera, models, first inference)"""
+        if not hasattr(self.face_module, "warm_up"):
+            return
+        self.warm_up_thread = threading.Thread(target=self._warm_up_worker, name="face-warm-up")
+        self.warm_up_thread.daemon = True
+        self.warm_up_thread.start()
+    
+    def _warm_up_worker(self):
+        """Worker thread for the face module warm-up"""
+        start = time.perf_counter()
+        if self.face_module.warm_up():
+            lazy_imports.record_timing("warm-up", time.perf_counter() - start)
+        print(lazy_imports.timing_report())
     
     def center_window(self):
         """Center the window on screen"""
@@ -197,6 +239,15 @@ class FacePayGUI:
         )
         self.status_label.pack()
         
+        # Live camera preview; one PhotoImage is reused for every frame
+        self.preview_image = tk.PhotoImage(width=PREVIEW_WIDTH, height=PREVIEW_HEIGHT)
+        self.preview_label = tk.Label(
+            self.face_scan_frame,
+            image=self.preview_image,
+            bg='#34495e'
+        )
+        self.preview_label.pack(pady=10)
+        
         # User info frame
         self.user_frame = tk.Frame(self.face_scan_frame, bg='#2c3e50')
         self.user_frame.pack(pady=10)
@@ -380,6 +431,7 @@ class FacePayGUI:
     
     def show_amount_entry(self):
         """Show the amount entry screen"""
+        self._cancel_face_scan()
         self.hide_all_frames()
         self.amount_frame.pack(expand=True, fill='both')
         self.current_frame = self.amount_frame
@@ -470,17 +522,70 @@ class FacePayGUI:
         
         self.is_scanning = True
         self.scan_button.config(text="Scanning...", state='disabled')
-        self.status_label.config(text="Scanning for face...")
+        if self.warm_up_thread is not None and self.warm_up_thread.is_alive():
+            self.status_label.config(text="Loading face models...")
+        else:
+            self.status_label.config(text="Scanning for face...")
         
-        # Start recognition in separate thread
-        self.recognition_thread = threading.Thread(target=self._face_recognition_worker)
+        # Start recognition in separate thread; it hands frames to the embedded preview
+        self.preview_renderer = SharedFrameRenderer()
+        self.recognition_thread = threading.Thread(target=self._face_recognition_worker,
+                                                   args=(self.preview_renderer,))
         self.recognition_thread.daemon = True
         self.recognition_thread.start()
+        self._update_preview()
+    
+    def _cancel_face_scan(self):
+        """Ask a running scan to stop (it finishes on its next frame)"""
+        if self.is_scanning and self.preview_renderer is not None:
+            self.preview_renderer.request("quit")
+    
+    def _update_preview(self):
+        """Redraw the embedded preview, at most PREVIEW_FPS times a second"""
+        if not self.is_scanning or self.preview_renderer is None:
+            return
+        self.root.after(1000 // PREVIEW_FPS, self._update_preview)
+        
+        frame, results, result_sequence = self.preview_renderer.latest()
+        frame_sequence = result_sequence
+        camera_service = getattr(self.face_module, "camera_service", None)
+        if camera_service is not None:
+            # Show the newest camera frame rather than waiting for recognition to finish one
+            ok, live_frame, frame_sequence = camera_service.latest_frame()
+            if ok:
+                frame = cv2.flip(live_frame, 1)
+        if frame is None or self._preview_shown == (frame_sequence, result_sequence):
+            return
+        self._preview_shown = (frame_sequence, result_sequence)
+        
+        # Tell the customer why their face is not being accepted yet
+        gate = getattr(self.face_module, "quality_gate", None)
+        hint = gate.hint() if gate is not None and results else None
+        self.status_label.config(text=hint or "Scanning for face...")
+        
+        # Scale down first so the overlay and conversion touch as few pixels as possible
+        height, width = frame.shape[:2]
+        scale = min(PREVIEW_WIDTH / width, PREVIEW_HEIGHT / height)
+        preview = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        scaled = [((int(x * scale), int(y * scale), int(w * scale), int(h * scale)), name, score)
+                  for (x, y, w, h), name, score in results]
+        render_results(preview, scaled)
+        
+        # Binary PPM is decoded by Tk itself, so no imaging library is needed
+        rgb = cv2.cvtColor(preview, cv2.COLOR_BGR2RGB)
+        header = f"P6 {rgb.shape[1]} {rgb.shape[0]} 255 ".encode()
+        self.preview_image.configure(data=header + rgb.tobytes(), format="PPM")
     
-    def _face_recognition_worker(self):
+    def _face_recognition_worker(self, renderer):
         """Worker thread for face recognition"""
         try:
-            success, username = self.face_module.start_recognition()
+            # A scan started before warm-up finished waits for it instead of loading twice
+            if self.warm_up_thread is not None:
+                self.warm_up_thread.join()
+            
+            # Auto-confirm replaces the 'C' key press of the OpenCV window
+            success, username = self.face_module.start_recognition(
+                policy=ConsecutiveMatchPolicy(), renderer=renderer)
             
             # Update GUI in main thread
             self.root.after(0, self._on_recognition_complete, success, username)
@@ -525,8 +630,27 @@ class FacePayGUI:
             messagebox.showerror("Error", "Please enter your PIN")
             return
         
-        # Verify PIN
-        if self.pin_module.verify_pin(self.current_user, pin):
+        if self.is_verifying:
+            return
+        self.is_verifying = True
+        
+        # The PIN KDF is deliberately slow, so verify off the GUI thread
+        threading.Thread(target=self._pin_verification_worker, args=(self.current_user, pin),
+                         daemon=True).start()
+    
+    def _pin_verification_worker(self, username, pin):
+        """Worker thread for PIN verification"""
+        try:
+            verified = self.pin_module.verify_pin(username, pin, terminal_id=self.terminal_id)
+        except Exception as e:
+            print(f"❌ Error verifying PIN: {e}")
+            verified = False
+        self.root.after(0, self._on_pin_verified, verified)
+    
+    def _on_pin_verified(self, verified):
+        """Handle the PIN verification result on the GUI thread"""
+        self.is_verifying = False
+        if verified:
             # Payment successful
             self.transaction_manager.verify_pin(True)
             current_amount = self.transaction_manager.get_current_amount()
@@ -537,11 +661,22 @@ class FacePayGUI:
             # Payment failed
             self.transaction_manager.verify_pin(False)
             error_message = "❌ Incorrect PIN. Payment Failed."
+            remaining = self.pin_module.lockout_remaining(self.current_user, self.terminal_id)
+            if remaining:
+                error_message = f"🔒 Too many incorrect PINs. Try again in {remaining:.0f}s."
             self.show_result(False, error_message)
             self.clear_pin_entry()
         
         # Complete and save transaction
-        self.transaction_manager.complete_transaction()
+        try:
+            self.transaction_manager.complete_transaction()
+        except CommitError as e:
+            messagebox.showerror("Save Failed", f"The transaction could not be saved: {e}")
+    
+    def _on_write_error(self, error, batch):
+        """Writer thread: a background save failed; alert the operator on the GUI thread"""
+        self.root.after(0, messagebox.showerror, "Save Failed",
+                        f"{len(batch)} change(s) could not be saved to disk: {error}")
     
     def new_transaction(self):
         """Start a new transaction"""
@@ -579,13 +714,30 @@ class FacePayGUI:
             # Get PIN
             pin = simpledialog.askstring("Set PIN", f"Enter a 4-6 digit PIN for {name}:", show='*')
             if pin:
-                if self.pin_module.set_pin(name, pin):
-                    messagebox.showinfo("Success", f"User '{name}' registered successfully!")
-                else:
-                    messagebox.showerror("Error", "Invalid PIN format. PIN must be 4-6 digits.")
+                # Hashing the PIN runs the slow KDF, so keep it off the GUI thread
+                threading.Thread(target=self._set_pin_worker, args=(name, pin), daemon=True).start()
         else:
             messagebox.showerror("Error", "Face registration failed")
     
+    def _set_pin_worker(self, name, pin):
+        """Worker thread for setting a new user's PIN"""
+        error = None
+        try:
+            stored = self.pin_module.set_pin(name, pin)
+        except Exception as e:
+            print(f"❌ Error setting PIN: {e}")
+            stored, error = False, e
+        self.root.after(0, self._on_pin_set, name, stored, error)
+    
+    def _on_pin_set(self, name, stored, error=None):
+        """Report the PIN registration result on the GUI thread"""
+        if stored:
+            messagebox.showinfo("Success", f"User '{name}' registered successfully!")
+        elif error is not None:
+            messagebox.showerror("Error", f"Could not save the PIN: {error}")
+        else:
+            messagebox.showerror("Error", "Invalid PIN format. PIN must be 4-6 digits.")
+    
     def clear_pin_entry(self):
         """Clear PIN entry field"""
         self.pin_entry.delete(0, tk.END)
@@ -593,7 +745,15 @@ class FacePayGUI:
     def on_closing(self):
         """Handle window closing"""
         if self.is_scanning:
+            self._cancel_face_scan()
             self.face_module.stop_recognition()
+        # Drain the background writers before the process exits
+        for module in (self.pin_module, self.transaction_manager):
+            try:
+                module.flush()
+            except CommitError as e:
+                # Already shown when it happened (see _on_write_error)
+                print(f"❌ {e}")
         self.root.destroy()
     
     def run(self):
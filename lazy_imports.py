@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Lazy Imports for Face Pay
+Defers heavy modules (face_recognition/dlib, OpenCV) until their first use
+so the window can appear before they load, and records how long loading
+and warm-up took
+"""
+
+import importlib
+import threading
+import time
+from typing import Dict
+
+# Reference point for startup milestones (this module is imported first by the app modules)
+STARTED = time.perf_counter()
+
+_timings: Dict[str, float] = {}
+_timings_lock = threading.Lock()
+
+def record_timing(label: str, seconds: float):
+    """Store a duration under `label` (first value wins, so warm-up beats later calls)"""
+    with _timings_lock:
+        _timings.setdefault(label, seconds)
+
+def mark(label: str):
+    """Record the time elapsed since startup, e.g. when the first window appears"""
+    record_timing(label, time.perf_counter() - STARTED)
+
+def timings() -> Dict[str, float]:
+    with _timings_lock:
+        return dict(_timings)
+
+def timing_report() -> str:
+    """Human-readable summary of import, startup and first-inference times"""
+    lines = ["⏱️  Startup timing:"]
+    for label, seconds in timings().items():
+        lines.append(f"   - {label}: {seconds * 1000:.0f} ms")
+    return "\n".join(lines)
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self):
+        """Import the module now (thread-safe) and return it"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    record_timing(f"import {self._name}", time.perf_counter() - start)
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attribute: str):
+        # Private names belong to the proxy itself (and keep copy/pickle probes from importing)
+        if attribute.startswith("_"):
+            raise AttributeError(attribute)
+        return getattr(self.load(), attribute)
+
+    def __repr__(self):
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+_modules: Dict[str, LazyModule] = {}
+
+def lazy_import(name: str) -> LazyModule:
+    """Shared proxy for `name`; every caller gets the same LazyModule"""
+    with _timings_lock:
+        if name not in _modules:
+            _modules[name] = LazyModule(name)
+        return _modules[name]
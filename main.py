@@ -9,6 +9,8 @@ import os
 from gui import FacePayGUI
 from face_recognition_module import FaceRecognitionModule
 from pin_verification import PINVerification
+from camera_service import CameraService, parse_source
+from group_commit import DURABILITY_ASYNC
 
 def main():
     """Main function to start the Face Pay application"""
@@ -16,12 +18,21 @@ def main():
     print("=" * 50)
     
     # Initialize modules
-    face_module = FaceRecognitionModule()
-    pin_module = PINVerification()
+    # Keep the camera open for the whole session (optional argument: camera index,
+    # video file or image directory); the GUI's background warm-up opens it
+    camera_service = CameraService(parse_source(sys.argv[1] if len(sys.argv) > 1 else None))
+    face_module = FaceRecognitionModule(camera_service=camera_service)
+    # PIN writes must not block the GUI thread; the GUI flushes them on exit
+    pin_module = PINVerification(durability=DURABILITY_ASYNC)
     
     # Start GUI
     app = FacePayGUI(face_module, pin_module)
-    app.run()
+    try:
+        app.run()
+    finally:
+        camera_service.stop()
+        face_module.close()
+        pin_module.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -9,7 +9,9 @@ import os
 from gui import FacePayGUI
 from simple_face_detection import SimpleFaceDetection
 from pin_verification import PINVerification
+from camera_service import CameraService, parse_source
 from transaction_manager import TransactionManager
+from group_commit import DURABILITY_ASYNC
 
 def main():
     """Main function to start the Face Pay application (simplified version)"""
@@ -21,9 +23,13 @@ def main():
     print("=" * 60)
     
     # Initialize modules
-    face_module = SimpleFaceDetection()
-    pin_module = PINVerification()
-    transaction_manager = TransactionManager()
+    # Keep the camera open for the whole session (optional argument: camera index,
+    # video file or image directory); the GUI's background warm-up opens it
+    camera_service = CameraService(parse_source(sys.argv[1] if len(sys.argv) > 1 else None))
+    face_module = SimpleFaceDetection(camera_service=camera_service)
+    # Writes must not block the GUI thread; the GUI flushes them on exit
+    pin_module = PINVerification(durability=DURABILITY_ASYNC)
+    transaction_manager = TransactionManager(durability=DURABILITY_ASYNC)
     
     # Show system status
     print(f"📊 System Status:")
@@ -37,8 +43,14 @@ def main():
     print("=" * 60)
     
     # Start GUI
-    app = FacePayGUI(face_module, pin_module)
-    app.run()
+    app = FacePayGUI(face_module, pin_module, transaction_manager)
+    try:
+        app.run()
+    finally:
+        camera_service.stop()
+        face_module.close()
+        pin_module.close()
+        transaction_manager.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
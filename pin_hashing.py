@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+PIN Hashing for Face Pay
+Salted, tunable key derivation (scrypt or PBKDF2 from hashlib)
+
+Stored format:  <kdf>$<name=value,...>$<salt hex>$<hash hex>
+Legacy records (bare SHA-256 hex with the old global salt) still verify
+and are reported as needing a rehash.
+"""
+
+import hashlib
+import hmac
+import secrets
+from typing import Dict, Optional
+
+KDF_SCRYPT = "scrypt"
+KDF_PBKDF2 = "pbkdf2_sha256"
+
+DEFAULT_KDF = KDF_SCRYPT
+DEFAULT_PARAMS = {
+    KDF_SCRYPT: {"n": 2 ** 14, "r": 8, "p": 1},
+    KDF_PBKDF2: {"iterations": 200000},
+}
+
+SALT_BYTES = 16
+HASH_BYTES = 32
+LEGACY_SALT = "face_pay_salt_2024"
+
+class MalformedHashError(ValueError):
+    """A stored PIN hash that cannot be parsed or used"""
+
+def _derive(pin: str, kdf: str, params: Dict[str, int], salt: bytes) -> bytes:
+    if kdf == KDF_SCRYPT:
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(pin.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + (1 << 20), dklen=HASH_BYTES)
+    if kdf == KDF_PBKDF2:
+        return hashlib.pbkdf2_hmac("sha256", pin.encode(), salt, params["iterations"], dklen=HASH_BYTES)
+    raise ValueError(f"Unknown KDF: {kdf}")
+
+def _parse(stored: str):
+    try:
+        kdf, param_text, salt_hex, hash_hex = stored.split("$")
+        params = {name: int(value) for name, value in
+                  (item.split("=") for item in param_text.split(",") if item)}
+        salt, digest = bytes.fromhex(salt_hex), bytes.fromhex(hash_hex)
+    except ValueError as e:
+        raise MalformedHashError(f"Malformed PIN hash: {e}") from None
+    if kdf not in DEFAULT_PARAMS or set(params) != set(DEFAULT_PARAMS[kdf]):
+        raise MalformedHashError(f"Malformed PIN hash: unknown KDF or parameters for {kdf!r}")
+    return kdf, params, salt, digest
+
+def _legacy_hash(pin: str) -> str:
+    return hashlib.sha256((pin + LEGACY_SALT).encode()).hexdigest()
+
+def hash_pin(pin: str, kdf: str = DEFAULT_KDF, params: Optional[Dict[str, int]] = None) -> str:
+    """Hash a PIN with a fresh per-user salt"""
+    params = dict(params or DEFAULT_PARAMS[kdf])
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _derive(pin, kdf, params, salt)
+    param_text = ",".join(f"{name}={value}" for name, value in sorted(params.items()))
+    return f"{kdf}${param_text}${salt.hex()}${digest.hex()}"
+
+def verify_pin(pin: str, stored: str) -> bool:
+    """Check a PIN against a stored hash in constant time
+
+    Raises MalformedHashError when the stored hash cannot be used.
+    """
+    if "$" not in stored:
+        return hmac.compare_digest(_legacy_hash(pin), stored)
+    kdf, params, salt, expected = _parse(stored)
+    try:
+        derived = _derive(pin, kdf, params, salt)
+    except ValueError as e:
+        # e.g. a scrypt cost that is not a power of two
+        raise MalformedHashError(f"Unusable PIN hash parameters: {e}") from None
+    return hmac.compare_digest(derived, expected)
+
+def needs_rehash(stored: str, kdf: str = DEFAULT_KDF, params: Optional[Dict[str, int]] = None) -> bool:
+    """Whether a stored hash uses a different KDF or cost than configured"""
+    if "$" not in stored:
+        return True
+    stored_kdf, stored_params, _, _ = _parse(stored)
+    return stored_kdf != kdf or stored_params != dict(params or DEFAULT_PARAMS[kdf])
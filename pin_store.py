@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+PIN Store for Face Pay
+Keyed SQLite (WAL mode) table of username -> PIN hash, updated one record
+at a time instead of rewriting a JSON file
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class PINStore:
+    def __init__(self, path: str = "data/pins.sqlite3"):
+        """Open (or create) the store; nothing is read until the first lookup"""
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS pins (username TEXT PRIMARY KEY, pin_hash TEXT NOT NULL)")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get(self, username: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT pin_hash FROM pins WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def users(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT username FROM pins ORDER BY username")]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pins").fetchone()[0]
+
+    def apply(self, changes: Iterable[Tuple[str, Optional[str]]]):
+        """Upsert (username, hash) pairs and delete (username, None) pairs in one transaction"""
+        with self._lock, self._conn:
+            for username, pin_hash in changes:
+                if pin_hash is None:
+                    self._conn.execute("DELETE FROM pins WHERE username = ?", (username,))
+                else:
+                    self._conn.execute("INSERT OR REPLACE INTO pins (username, pin_hash) VALUES (?, ?)",
+                                       (username, pin_hash))
+
+    def import_hashes(self, hashes: Dict[str, str]) -> int:
+        """Bulk-load already hashed PINs"""
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO pins (username, pin_hash) VALUES (?, ?)",
+                                   hashes.items())
+        return len(hashes)
+
+    def migrate_json(self, json_path: str) -> int:
+        """One-time import of the legacy pin_data.json, renamed to .migrated afterwards"""
+        with open(json_path, 'r') as f:
+            hashes = json.load(f)
+        count = self.import_hashes(hashes)
+        os.replace(json_path, json_path + ".migrated")
+        return count
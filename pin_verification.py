@@ -4,75 +4,228 @@ PIN Verification Module for Face Pay
 Handles PIN storage, validation, and security
 """
 
-import json
 import os
 import hashlib
+import hmac
 import secrets
+import threading
+import time
+from collections import OrderedDict
 from typing import Dict, Optional
+from group_commit import CommitError, GroupCommitWriter, DURABILITY_GROUP
+from pin_store import PINStore
+from rate_limiter import AttemptLimiter
+from transaction_ids import default_terminal_id
+import pin_hashing
 
 class PINVerification:
-    def __init__(self, pin_file: str = "data/pin_data.json"):
-        """Initialize the PIN verification module"""
+    def __init__(self, pin_file: str = "data/pin_data.json", store_file: str = "data/pins.sqlite3",
+                 durability: str = DURABILITY_GROUP,
+                 kdf: str = pin_hashing.DEFAULT_KDF, kdf_params: Optional[Dict[str, int]] = None,
+                 cache_ttl: float = 60.0, cache_size: int = 256,
+                 attempts_dir: Optional[str] = "data", terminal_id: Optional[str] = None):
+        """Initialize the PIN verification module
+        
+        pin_file: legacy JSON PIN file, imported into the store once
+        store_file: SQLite PIN store, read one record per lookup
+        durability: "sync", "group" or "async" (see group_commit); a PIN change
+            that cannot be written raises CommitError from set_pin/remove_user
+            (sync, group) or from flush()/close() (async)
+        kdf: "scrypt" or "pbkdf2_sha256"; kdf_params tunes its cost (see
+            `benchmark.py pin`). Stored hashes using other settings are
+            upgraded the next time their PIN verifies.
+        cache_ttl: seconds a successful verification is remembered, so a
+            repeat check of the same PIN skips the KDF; failures are never cached
+        attempts_dir: where failed-attempt state is persisted (None keeps it in memory)
+        terminal_id: terminal charged for failed attempts when a call does not
+            name one (defaults to FACEPAY_TERMINAL_ID or the host)
+        """
         self.pin_file = pin_file
-        self.pin_data = {}
+        self.store = PINStore(store_file)
+        # Changes queued for the writer, visible to lookups until they are committed
+        self._pending = {}
+        self.kdf = kdf
+        self.kdf_params = dict(kdf_params or pin_hashing.DEFAULT_PARAMS[kdf])
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._verified = OrderedDict()
+        # Cache keys are keyed hashes, so the cache never holds anything PIN-derivable
+        self._cache_key = secrets.token_bytes(32)
+        self._lock = threading.Lock()
+        self.writer = GroupCommitWriter(self._write_pins, mode=durability, name="pin-writer")
+        # 5 wrong PINs lock a user out, 20 lock a terminal; lockouts double on repeat
+        self.user_limiter = AttemptLimiter(
+            max_failures=5,
+            state_file=os.path.join(attempts_dir, "pin_attempts_users.json") if attempts_dir else None)
+        self.terminal_limiter = AttemptLimiter(
+            max_failures=20,
+            state_file=os.path.join(attempts_dir, "pin_attempts_terminals.json") if attempts_dir else None)
+        self.terminal_id = terminal_id or default_terminal_id()
         self.load_pins()
     
     def load_pins(self):
-        """Load PIN data from JSON file"""
+        """Open the PIN store, importing the legacy JSON file if needed (records load on lookup)"""
         try:
-            if os.path.exists(self.pin_file):
-                with open(self.pin_file, 'r') as f:
-                    self.pin_data = json.load(f)
-                print(f"✅ Loaded PIN data for {len(self.pin_data)} users")
-            else:
-                print("ℹ️  No PIN data found. Creating new PIN file.")
-                self.pin_data = {}
+            if os.path.exists(self.pin_file) and self.store.count() == 0:
+                count = self.store.migrate_json(self.pin_file)
+                print(f"✅ Imported PIN data for {count} users from {self.pin_file}")
+            elif self.store.count() == 0:
+                print("ℹ️  No PIN data found. Creating new PIN store.")
         except Exception as e:
             print(f"❌ Error loading PIN data: {e}")
-            self.pin_data = {}
+    
+    def _lookup(self, username: str) -> Optional[str]:
+        """Stored hash for a user, including changes not yet written"""
+        with self._lock:
+            if username in self._pending:
+                return self._pending[username]
+        return self.store.get(username)
+    
+    def _update(self, username: str, pin_hash: Optional[str]):
+        """Queue a single-record upsert (or delete when pin_hash is None)"""
+        with self._lock:
+            self._pending[username] = pin_hash
+        self.writer.submit((username, pin_hash))
     
     def save_pins(self):
-        """Save PIN data to JSON file"""
+        """Write pending PIN changes to disk"""
+        self.flush()
+    
+    def _write_pins(self, batch: list):
+        """Writer thread: apply every change in the batch in one SQLite transaction
+        
+        A failure reaches the writer, which raises it to the callers; the
+        batch is dropped from the pending view either way, so lookups then
+        match what is on disk.
+        """
         try:
-            os.makedirs(os.path.dirname(self.pin_file), exist_ok=True)
-            with open(self.pin_file, 'w') as f:
-                json.dump(self.pin_data, f, indent=2)
-            print(f"✅ Saved PIN data for {len(self.pin_data)} users")
-        except Exception as e:
-            print(f"❌ Error saving PIN data: {e}")
+            self.store.apply(batch)
+        finally:
+            with self._lock:
+                for username, pin_hash in batch:
+                    # Keep entries that were changed again after this batch was taken
+                    if self._pending.get(username, 0) == pin_hash:
+                        del self._pending[username]
+    
+    def import_pins(self, hashes: Dict[str, str]) -> int:
+        """Bulk-import already hashed PINs (legacy or KDF format; legacy ones upgrade on verify)"""
+        self.flush()
+        count = self.store.import_hashes(hashes)
+        print(f"✅ Imported PIN data for {count} users")
+        return count
+    
+    def flush(self):
+        """Write pending PIN changes to disk (call on shutdown)"""
+        self.writer.flush()
+    
+    def close(self):
+        self.writer.close()
+        self.store.close()
+        self.user_limiter.close()
+        self.terminal_limiter.close()
     
     def hash_pin(self, pin: str) -> str:
-        """Hash a PIN using SHA-256 with salt"""
-        # In a real system, you'd use a proper salt per user
-        # For this prototype, we'll use a simple hash
-        salt = "face_pay_salt_2024"
-        return hashlib.sha256((pin + salt).encode()).hexdigest()
+        """Hash a PIN with a per-user salt and the configured KDF"""
+        return pin_hashing.hash_pin(pin, self.kdf, self.kdf_params)
+    
+    def _cache_token(self, username: str, stored_hash: str, pin: str) -> bytes:
+        message = f"{username}\0{stored_hash}\0{pin}".encode()
+        return hmac.new(self._cache_key, message, hashlib.sha256).digest()
+    
+    def _check_pin(self, username: str, stored_hash: str, pin: str) -> bool:
+        """Verify against the stored hash, consulting the recent-success cache first"""
+        token = self._cache_token(username, stored_hash, pin)
+        now = time.monotonic()
+        with self._lock:
+            expires = self._verified.get(token)
+            if expires is not None and expires > now:
+                return True
+        
+        try:
+            if not pin_hashing.verify_pin(pin, stored_hash):
+                return False
+        except pin_hashing.MalformedHashError as e:
+            # Fail closed (and count the attempt); the PIN has to be set again
+            print(f"❌ Stored PIN hash for '{username}' is unusable ({e}); please reset the PIN")
+            return False
+        self._remember(token)
+        return True
+    
+    def _remember(self, token: bytes):
+        with self._lock:
+            self._verified[token] = time.monotonic() + self.cache_ttl
+            self._verified.move_to_end(token)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
     
     def set_pin(self, username: str, pin: str) -> bool:
         """Set PIN for a user"""
         if not self._validate_pin_format(pin):
             return False
         
-        hashed_pin = self.hash_pin(pin)
-        self.pin_data[username] = hashed_pin
-        self.save_pins()
+        self._update(username, self.hash_pin(pin))
         print(f"✅ PIN set for user: {username}")
         return True
     
-    def verify_pin(self, username: str, pin: str) -> bool:
-        """Verify PIN for a user"""
-        if username not in self.pin_data:
+    def lockout_remaining(self, username: str, terminal_id: Optional[str] = None) -> float:
+        """Seconds before this user or terminal may try a PIN again"""
+        remaining = self.user_limiter.retry_after(username)
+        return max(remaining, self.terminal_limiter.retry_after(terminal_id or self.terminal_id))
+    
+    def _reserve_attempt(self, username: str, terminal_id: str) -> float:
+        """Claim an attempt for the user and the terminal; returns seconds to wait (0 if claimed)"""
+        remaining = self.user_limiter.reserve(username)
+        if remaining:
+            return remaining
+        remaining = self.terminal_limiter.reserve(terminal_id)
+        if remaining:
+            self.user_limiter.release(username)
+        return remaining
+    
+    def _record_failure(self, username: str, terminal_id: str):
+        lockout = self.user_limiter.record_failure(username)
+        lockout = max(lockout, self.terminal_limiter.record_failure(terminal_id))
+        if lockout:
+            print(f"🔒 Too many failed PIN attempts; locked for {lockout:.0f}s")
+    
+    def verify_pin(self, username: str, pin: str, upgrade: bool = True,
+                   terminal_id: Optional[str] = None) -> bool:
+        """Verify PIN for a user (attempts are throttled per user and per terminal)"""
+        terminal_id = terminal_id or self.terminal_id
+        # Claimed before the KDF runs, so parallel guesses cannot outrun the lockout
+        remaining = self._reserve_attempt(username, terminal_id)
+        if remaining:
+            print(f"🔒 PIN entry locked for '{username}'. Try again in {remaining:.0f}s")
+            return False
+        try:
+            return self._verify_reserved(username, pin, upgrade, terminal_id)
+        finally:
+            self.user_limiter.release(username)
+            self.terminal_limiter.release(terminal_id)
+    
+    def _verify_reserved(self, username: str, pin: str, upgrade: bool, terminal_id: str) -> bool:
+        stored_hash = self._lookup(username)
+        if stored_hash is None:
             print(f"❌ User '{username}' not found in PIN database")
+            self.terminal_limiter.record_failure(terminal_id)
             return False
         
-        hashed_pin = self.hash_pin(pin)
-        stored_hash = self.pin_data[username]
-        
-        if hashed_pin == stored_hash:
+        if self._check_pin(username, stored_hash, pin):
+            self.user_limiter.record_success(username)
+            if upgrade and pin_hashing.needs_rehash(stored_hash, self.kdf, self.kdf_params):
+                # The PIN is known to be right, so upgrade the hash to the current settings
+                upgraded = self.hash_pin(pin)
+                try:
+                    self._update(username, upgraded)
+                    self._remember(self._cache_token(username, upgraded, pin))
+                except CommitError as e:
+                    # The old hash still verifies; the upgrade is retried next time
+                    print(f"⚠️  Could not store the upgraded PIN hash: {e}")
             print(f"✅ PIN verified for user: {username}")
             return True
         else:
             print(f"❌ Invalid PIN for user: {username}")
+            self._record_failure(username, terminal_id)
             return False
     
     def _validate_pin_format(self, pin: str) -> bool:
@@ -89,26 +242,34 @@ class PINVerification:
     
     def user_exists(self, username: str) -> bool:
         """Check if user exists in PIN database"""
-        return username in self.pin_data
+        return self._lookup(username) is not None
     
     def get_users(self) -> list:
         """Get list of users with PINs"""
-        return list(self.pin_data.keys())
+        users = set(self.store.users())
+        with self._lock:
+            for username, pin_hash in self._pending.items():
+                if pin_hash is None:
+                    users.discard(username)
+                else:
+                    users.add(username)
+        return sorted(users)
     
     def remove_user(self, username: str) -> bool:
         """Remove user from PIN database"""
-        if username in self.pin_data:
-            del self.pin_data[username]
-            self.save_pins()
+        if self.user_exists(username):
+            self._update(username, None)
             print(f"✅ Removed user: {username}")
             return True
         else:
             print(f"❌ User '{username}' not found")
             return False
     
-    def change_pin(self, username: str, old_pin: str, new_pin: str) -> bool:
+    def change_pin(self, username: str, old_pin: str, new_pin: str,
+                   terminal_id: Optional[str] = None) -> bool:
         """Change PIN for a user"""
-        if not self.verify_pin(username, old_pin):
+        # No rehash of the old PIN: it is replaced by a single write below
+        if not self.verify_pin(username, old_pin, upgrade=False, terminal_id=terminal_id):
             return False
         
         return self.set_pin(username, new_pin) 
\ No newline at end of file
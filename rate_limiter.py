@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Attempt Rate Limiter for Face Pay
+Per-key failure counting with exponential lockout, used to throttle PIN
+guessing per user and per terminal
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+class _Attempts:
+    """Failure state for one key (`reserved` counts attempts still in flight)"""
+    __slots__ = ("window_start", "failures", "locked_until", "strikes", "reserved")
+
+    def __init__(self, window_start: float = 0.0, failures: int = 0,
+                 locked_until: float = 0.0, strikes: int = 0):
+        self.window_start = window_start
+        self.failures = failures
+        self.locked_until = locked_until
+        self.strikes = strikes
+        self.reserved = 0
+
+class AttemptLimiter:
+    def __init__(self, max_failures: int = 5, window: float = 300.0, base_lockout: float = 30.0,
+                 max_lockout: float = 3600.0, state_file: Optional[str] = None,
+                 persist_interval: float = 30.0):
+        """Initialize the limiter
+
+        max_failures: failures allowed per key within `window` seconds
+        base_lockout: first lockout in seconds; each further lockout doubles
+            it, up to max_lockout, until the key succeeds or stays quiet for
+            max_lockout seconds
+        state_file: JSON file the state is saved to every persist_interval
+            seconds (from a background thread) and on close()
+        """
+        self.max_failures = max_failures
+        self.window = window
+        self.base_lockout = base_lockout
+        self.max_lockout = max_lockout
+        self.state_file = state_file
+        self.persist_interval = persist_interval
+        self._entries: Dict[str, _Attempts] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread = None
+        if state_file:
+            self.load()
+            self._thread = threading.Thread(target=self._persist_loop, name="limiter-persist", daemon=True)
+            self._thread.start()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def retry_after(self, key: str) -> float:
+        """Seconds until `key` may try again (0 when allowed); O(1)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0.0
+        return max(0.0, entry.locked_until - time.time())
+
+    def allowed(self, key: str) -> bool:
+        return self.retry_after(key) == 0.0
+
+    def _entry(self, key: str, now: float) -> _Attempts:
+        """Entry for `key` with an expired window reset (call with the lock held)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Attempts(now)
+        if now - entry.window_start > self.window:
+            entry.window_start, entry.failures = now, 0
+            if entry.strikes and now - entry.locked_until > self.max_lockout:
+                entry.strikes = 0
+        return entry
+
+    def reserve(self, key: str) -> float:
+        """Claim an attempt before checking it; returns seconds to wait (0 if claimed)
+
+        Attempts in flight count against the allowance, so concurrent guesses
+        cannot all pass the lockout check while a slow check is running.
+        Every claim must be followed by release().
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entry(key, now)
+            if entry.locked_until > now:
+                return entry.locked_until - now
+            if entry.failures + entry.reserved >= self.max_failures:
+                # The attempts in flight could use up the allowance; retry once they finish
+                return 1.0
+            entry.reserved += 1
+            return 0.0
+
+    def release(self, key: str):
+        """Return a claim taken by reserve() (after recording its outcome)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.reserved:
+                entry.reserved -= 1
+                if not (entry.reserved or entry.failures or entry.strikes):
+                    # Nothing left to remember (e.g. a claim for an unknown user)
+                    del self._entries[key]
+
+    def record_failure(self, key: str) -> float:
+        """Count a failed attempt; returns the lockout it triggered (0 if none)"""
+        now = time.time()
+        with self._lock:
+            entry = self._entry(key, now)
+            entry.failures += 1
+            self._dirty = True
+            if entry.failures < self.max_failures:
+                return 0.0
+            lockout = min(self.base_lockout * (2 ** entry.strikes), self.max_lockout)
+            entry.locked_until = now + lockout
+            entry.strikes += 1
+            entry.window_start, entry.failures = now, 0
+            return lockout
+
+    def record_success(self, key: str):
+        """Forget a key's failures and lockout history"""
+        if key in self._entries:
+            with self._lock:
+                self._entries.pop(key, None)
+                self._dirty = True
+
+    def prune(self):
+        """Drop keys whose window and lockout have both expired"""
+        now = time.time()
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if not entry.reserved and now - entry.window_start > self.window
+                     and now - entry.locked_until > (self.max_lockout if entry.strikes else 0)]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self._dirty = True
+
+    def load(self):
+        """Restore saved state (lockouts survive restarts)"""
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r') as f:
+                data = json.load(f)
+            with self._lock:
+                self._entries = {key: _Attempts(*values) for key, values in data.items()}
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable attempt limiter state: {e}")
+
+    def save(self):
+        """Write the state atomically if it changed"""
+        if not self.state_file or not self._dirty:
+            return
+        with self._lock:
+            data = {key: [e.window_start, e.failures, e.locked_until, e.strikes]
+                    for key, e in self._entries.items()}
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            tmp_file = self.state_file + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            self._dirty = True
+            print(f"❌ Error saving attempt limiter state: {e}")
+
+    def _persist_loop(self):
+        while not self._stop.wait(self.persist_interval):
+            self.prune()
+            self.save()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.save()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Headless Recognition for Face Pay
+Frame-in/results-out recognition loop with pluggable confirmation policies
+and an optional, separately attached preview window
+"""
+
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+Result = Tuple[Tuple[int, int, int, int], Optional[str], float]
+
+class ConsecutiveMatchPolicy:
+    """Confirm a user once they are the only recognized face in K consecutive frames"""
+
+    def __init__(self, frames: int = 3, min_score: float = 0.0):
+        self.frames = frames
+        self.min_score = min_score
+        self.reset()
+
+    def reset(self):
+        self.candidate = None
+        self.streak = 0
+
+    def update(self, results: List[Result]) -> Optional[str]:
+        """Feed one frame's results; returns the confirmed user name or None"""
+        names = {name for _, name, score in results if name and score >= self.min_score}
+        if len(names) != 1:
+            # Nobody, or several people at once: an ambiguous frame breaks the streak
+            self.reset()
+            return None
+        name = names.pop()
+        if name == self.candidate:
+            self.streak += 1
+        else:
+            self.candidate, self.streak = name, 1
+        return name if self.streak >= self.frames else None
+
+class PreviewRenderer:
+    """OpenCV preview window; 'C' confirms the recognized user, 'Q' quits"""
+
+    def __init__(self, title: str = "Face Recognition"):
+        self.title = title
+
+    def show(self, frame, results: List[Result]) -> Optional[str]:
+        """Draw and display a frame; returns "confirm", "quit" or None"""
+        import cv2
+        from recognition_pipeline import render_results
+        render_results(frame, results)
+        recognized = next((name for _, name, _ in results if name), None)
+        if recognized:
+            cv2.putText(frame, f"Recognized: {recognized}", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            cv2.putText(frame, "Press 'C' to Confirm", (10, 60),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        cv2.putText(frame, "Press 'Q' to Quit", (10, frame.shape[0] - 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        cv2.imshow(self.title, frame)
+
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('c') and recognized:
+            return "confirm"
+        if key == ord('q'):
+            return "quit"
+        return None
+
+    def close(self):
+        import cv2
+        cv2.destroyAllWindows()
+
+class SharedFrameRenderer:
+    """Hands frames and results to another thread (e.g. a Tk preview) instead of drawing them
+
+    The consumer polls latest() at its own frame rate and may call
+    request("confirm") or request("quit"), which the recognition loop
+    picks up on its next frame.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frame = None
+        self._results = []
+        self._sequence = 0
+        self._action = None
+
+    def show(self, frame, results: List[Result]) -> Optional[str]:
+        with self._lock:
+            self._frame, self._results = frame, results
+            self._sequence += 1
+            action, self._action = self._action, None
+        return action
+
+    def latest(self):
+        """Return (frame, results, sequence) of the newest recognized frame"""
+        with self._lock:
+            return self._frame, self._results, self._sequence
+
+    def request(self, action: str):
+        with self._lock:
+            self._action = action
+
+    def close(self):
+        pass
+
+def camera_frames(camera, mirror: bool = True) -> Iterator:
+    """Yield frames from a VideoCapture-like camera until it stops delivering"""
+    import cv2
+    while True:
+        ret, frame = camera.read()
+        if not ret:
+            print("❌ Failed to capture frame")
+            return
+        # Flip frame horizontally for mirror effect
+        yield cv2.flip(frame, 1) if mirror else frame
+
+def recognize_stream(face_module, frames: Iterable, policy=None, renderer=None,
+                     timeout: Optional[float] = None) -> Tuple[bool, Optional[str]]:
+    """Run recognize_frame over frames until a user is confirmed
+
+    policy: confirms a user from the per-frame results (e.g.
+        ConsecutiveMatchPolicy); optional when a renderer lets the operator
+        confirm with a key press
+    renderer: optional preview, e.g. PreviewRenderer
+    Returns (success, user_name).
+    """
+    if policy is None and renderer is None:
+        policy = ConsecutiveMatchPolicy()
+    if policy is not None:
+        policy.reset()
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    for frame in frames:
+        results = face_module.recognize_frame(frame)
+        confirmed = policy.update(results) if policy is not None else None
+
+        if renderer is not None:
+            action = renderer.show(frame, results)
+            if action == "quit":
+                return False, None
+            if action == "confirm" and confirmed is None:
+                confirmed = next((name for _, name, _ in results if name), None)
+
+        if confirmed:
+            print(f"✅ Face recognized: {confirmed}")
+            return True, confirmed
+        if deadline is not None and time.monotonic() > deadline:
+            print("⌛ Recognition timed out")
+            break
+    return False, None
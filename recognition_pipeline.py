@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Recognition Pipeline for Face Pay
+Runs capture, detection, encoding/matching and rendering as separate stages
+connected by bounded drop-oldest queues
+"""
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+from recognition import ConsecutiveMatchPolicy, PreviewRenderer
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+
+class DropOldestQueue:
+    """Bounded queue that discards the oldest item instead of blocking producers"""
+
+    def __init__(self, maxsize: int = 2):
+        self.maxsize = maxsize
+        self.items = deque()
+        self.dropped = 0
+        self.closed = False
+        self._condition = threading.Condition()
+
+    def put(self, item):
+        with self._condition:
+            if len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self._condition.notify()
+
+    def get(self, timeout: float = 0.5):
+        """Return the oldest queued item, or None on timeout or when closed"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.items or self.closed, timeout)
+            return self.items.popleft() if self.items else None
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+class PipelineStage:
+    """One stage: worker threads pull from an input queue and push to an output queue"""
+
+    def __init__(self, name: str, func: Callable, input_queue: DropOldestQueue,
+                 output: Callable, workers: int = 1, executor=None):
+        self.name = name
+        self.func = func
+        self.input_queue = input_queue
+        self.output = output
+        self.workers = workers
+        self.executor = executor
+        self.processed = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self, running: Callable[[], bool]):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(running,), name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self, timeout: float = 2.0):
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def _work(self, running: Callable[[], bool]):
+        while running():
+            item = self.input_queue.get()
+            if item is None:
+                continue
+            start = time.perf_counter()
+            try:
+                if self.executor is not None:
+                    result = self.executor.submit(self.func, item).result()
+                else:
+                    result = self.func(item)
+            except Exception as e:
+                print(f"❌ Error in {self.name} stage: {e}")
+                continue
+            latency = time.perf_counter() - start
+            with self._lock:
+                self.processed += 1
+                self.total_latency += latency
+                self.last_latency = latency
+            self.output(result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            average = self.total_latency / self.processed if self.processed else 0.0
+            return {
+                "queue_depth": len(self.input_queue),
+                "dropped": self.input_queue.dropped,
+                "processed": self.processed,
+                "avg_latency_ms": round(average * 1000, 2),
+                "last_latency_ms": round(self.last_latency * 1000, 2),
+            }
+
+# Worker-process state for process-pool stages: each process builds its own face module
+_worker_module = None
+
+def _init_worker(module_class, kwargs: dict, settings: dict):
+    global _worker_module
+    _worker_module = module_class(**kwargs)
+    for key, value in settings.items():
+        setattr(_worker_module, key, value)
+
+def _worker_detect(item):
+    sequence, frame = item
+    return sequence, frame, _worker_module.detect_frame(frame)
+
+def _worker_identify(item):
+    sequence, frame, boxes = item
+    return sequence, frame, _worker_module.identify_faces(frame, boxes)
+
+def render_results(frame, results: List[Tuple[Tuple[int, int, int, int], Optional[str], float]]):
+    """Draw boxes and names for identify_faces() results onto a frame"""
+    for (x, y, w, h), name, score in results:
+        color = (0, 255, 0) if name else (0, 0, 255)
+        label = f"{name} ({score:.2f})" if name else "Unknown"
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+        cv2.putText(frame, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+    return frame
+
+class RecognitionPipeline:
+    def __init__(self, face_module, queue_size: int = 2, detect_workers: int = 1,
+                 identify_workers: int = 1, use_processes: bool = False):
+        """Initialize the pipeline for a face module
+
+        The face module provides detect_frame(frame) -> boxes and
+        identify_faces(frame, boxes) -> [((x, y, w, h), name, score)].
+        With use_processes, detection and identification run in a process
+        pool whose workers load their own copy of the face module.
+        """
+        self.face_module = face_module
+        self.queue_size = queue_size
+        self.detect_workers = detect_workers
+        self.identify_workers = identify_workers
+        self.use_processes = use_processes
+        self.is_running = False
+        self.camera = None
+        self.executor = None
+        self.frames_captured = 0
+        self.detect_queue = DropOldestQueue(queue_size)
+        self.identify_queue = DropOldestQueue(queue_size)
+        self.stages = []
+        self._latest_frame = None
+        self._latest_results = (0, [])
+        self._lock = threading.Lock()
+        self._capture_thread = None
+
+    def start(self) -> bool:
+        """Open the camera and start all stages"""
+        self.camera = self.face_module._open_camera()
+        if not self.camera.isOpened():
+            print("❌ Could not open camera")
+            return False
+
+        detect, identify = self._stage_functions()
+        self.is_running = True
+        running = lambda: self.is_running
+        self.stages = [
+            PipelineStage("detect", detect, self.detect_queue, self.identify_queue.put,
+                          self.detect_workers, self.executor),
+            PipelineStage("identify", identify, self.identify_queue, self._publish_results,
+                          self.identify_workers, self.executor),
+        ]
+        for stage in self.stages:
+            stage.start(running)
+        self._capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._capture_thread.start()
+        return True
+
+    def stop(self):
+        """Stop all stages and release the camera"""
+        self.is_running = False
+        self.detect_queue.close()
+        self.identify_queue.close()
+        if self._capture_thread is not None:
+            self._capture_thread.join(timeout=2.0)
+            self._capture_thread = None
+        for stage in self.stages:
+            stage.join()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.camera is not None:
+            self.camera.release()
+            self.camera = None
+
+    def _stage_functions(self):
+        if not self.use_processes:
+            module = self.face_module
+            detect = lambda item: (item[0], item[1], module.detect_frame(item[1]))
+            identify = lambda item: (item[0], item[1], module.identify_faces(item[1], item[2]))
+            return detect, identify
+
+        settings = {key: value for key, value in vars(self.face_module).items()
+                    if isinstance(value, (bool, int, float, str))}
+        self.executor = ProcessPoolExecutor(
+            max_workers=max(self.detect_workers, self.identify_workers),
+            initializer=_init_worker,
+            initargs=(type(self.face_module), self.face_module.worker_kwargs, settings),
+        )
+        return _worker_detect, _worker_identify
+
+    def _capture_loop(self):
+        sequence = 0
+        while self.is_running:
+            ret, frame = self.camera.read()
+            if not ret:
+                print("❌ Failed to capture frame")
+                self.is_running = False
+                break
+            # Flip frame horizontally for mirror effect
+            frame = cv2.flip(frame, 1)
+            sequence += 1
+            with self._lock:
+                self._latest_frame = frame
+                self.frames_captured = sequence
+            self.detect_queue.put((sequence, frame))
+
+    def _publish_results(self, item):
+        sequence, _, results = item
+        with self._lock:
+            # Stages may finish out of order; never replace newer annotations with older ones
+            if sequence >= self._latest_results[0]:
+                self._latest_results = (sequence, results)
+
+    def latest(self):
+        """Return (latest frame, latest available results, age of results in frames)"""
+        with self._lock:
+            result_sequence, results = self._latest_results
+            frame = None if self._latest_frame is None else self._latest_frame.copy()
+            return frame, results, self.frames_captured - result_sequence
+
+    def stats(self) -> dict:
+        """Per-stage queue depth, drops and latency"""
+        stats = {stage.name: stage.stats() for stage in self.stages}
+        stats["capture"] = {"frames": self.frames_captured}
+        return stats
+
+    def run(self, policy=None, show_preview: bool = True) -> Tuple[bool, Optional[str]]:
+        """Run until a user is confirmed and return (success, user_name)
+
+        'C' confirms in the preview; `policy` (required without a preview)
+        confirms automatically from each new set of results.
+        """
+        if policy is None and not show_preview:
+            policy = ConsecutiveMatchPolicy()
+        if not self.start():
+            return False, None
+
+        print("👤 Please look at the camera for recognition...")
+        renderer = None
+        if show_preview:
+            print("Press 'C' to confirm when recognized, or 'Q' to quit")
+            renderer = PreviewRenderer()
+        last_sequence = 0
+        try:
+            while self.is_running:
+                confirmed = None
+                sequence, results = self._latest_results
+                if policy is not None and sequence != last_sequence:
+                    last_sequence = sequence
+                    confirmed = policy.update(results)
+
+                if renderer is not None:
+                    frame, results, _ = self.latest()
+                    if frame is None:
+                        time.sleep(0.005)
+                        continue
+                    action = renderer.show(frame, results)
+                    if action == "quit":
+                        break
+                    if action == "confirm" and confirmed is None:
+                        confirmed = next((name for _, name, _ in results if name), None)
+                else:
+                    time.sleep(0.005)
+
+                if confirmed:
+                    print(f"✅ Face recognized: {confirmed}")
+                    return True, confirmed
+            return False, None
+        finally:
+            self.stop()
+            if renderer is not None:
+                renderer.close()
@@ -10,6 +10,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from face_recognition_module import FaceRecognitionModule
 from pin_verification import PINVerification
+from transaction_ids import default_terminal_id
 
 def register_new_user():
     """Register a new user with face and PIN"""
@@ -63,7 +64,7 @@ def register_user(face_module, pin_module):
     
     # Register face
     print(f"\n📸 Registering face for: {name}")
-    print("Please look at the camera and press 'R' to register your face...")
+    print("Please look at the camera and press 'R' to capture each face sample...")
     print("Press 'Q' to quit registration")
     
     if face_module.register_face(name):
@@ -117,8 +118,9 @@ def remove_user(face_module, pin_module):
             user = users[choice]
             confirm = input(f"Are you sure you want to remove '{user}'? (y/n): ").strip().lower()
             if confirm == 'y':
-                # Remove from face module (would need to implement this)
-                print(f"⚠️  Face data removal not implemented yet")
+                # Remove from face module
+                if face_module.remove_face(user):
+                    print(f"✅ User '{user}' removed from face database")
                 # Remove from PIN module
                 if pin_module.remove_user(user):
                     print(f"✅ User '{user}' removed from PIN database")
@@ -147,7 +149,7 @@ def change_user_pin(pin_module):
             old_pin = input(f"Enter current PIN for {user}: ").strip()
             new_pin = input(f"Enter new PIN for {user}: ").strip()
             
-            if pin_module.change_pin(user, old_pin, new_pin):
+            if pin_module.change_pin(user, old_pin, new_pin, terminal_id=default_terminal_id()):
                 print(f"✅ PIN changed successfully for '{user}'")
             else:
                 print("❌ Failed to change PIN. Check your current PIN.")
@@ -4,47 +4,268 @@ Simple Face Detection Module for Face Pay
 Uses OpenCV for basic face detection (fallback when face_recognition is not available)
 """
 
-import cv2
-import pickle
-import os
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 import time
+import threading
+from face_tracker import FaceTracker
+from face_gallery import SampleBlocks, user_reduce
+from face_store import load_or_migrate, normalize_samples, save_store
+from face_journal import FaceJournal, OP_ADD, OP_UPDATE, OP_DELETE
+from recognition_pipeline import RecognitionPipeline
+import recognition
+import lazy_imports
+from face_quality import FaceQualityGate, REASON_HINTS
+
+cv2 = lazy_imports.lazy_import("cv2")
 
 class SimpleFaceDetection:
-    def __init__(self, faces_file: str = "data/faces.pkl"):
-        """Initialize the simple face detection module"""
+    FEATURE_DIM = 100 * 100
+    
+    def __init__(self, faces_file: str = "data/faces_simple.bin", tracking: bool = False,
+                 detect_interval: int = 10,
+                 camera_service=None, legacy_faces_file: str = "data/faces.pkl",
+                 journal_file: str = "data/faces_simple.journal", compact_every: int = 200,
+                 quality_gate: Optional[FaceQualityGate] = None, check_quality: bool = True):
+        """Initialize the simple face detection module
+        
+        quality_gate: rejects unusable faces before feature extraction; defaults
+            to the deployment's data/face_quality.json, and is off when that file
+            does not exist (check_quality=False disables it either way)
+        """
         self.faces_file = faces_file
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.known_faces = {}  # name -> list of face_data (multiple samples)
+        self.legacy_faces_file = legacy_faces_file
+        self.journal = FaceJournal(journal_file, self.FEATURE_DIM)
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._compaction_thread = None
+        self._face_cascade = None
+        self.sample_names = []
+        # name -> user id (position in sample_names), built on the first lookup
+        self._user_index = None
+        self.samples = SampleBlocks(self.FEATURE_DIM)
+        self.tracker = FaceTracker(detect_interval=detect_interval) if tracking else None
+        self.match_threshold = 0.6
+        self.quality_gate = (quality_gate or FaceQualityGate.load()) if check_quality else None
+        self.camera_service = camera_service
         self.camera = None
+        self.pipeline = None
+        # Rebuilds this module in pipeline worker processes, which only detect and match
+        # (no camera or registration quality gate there)
+        self.worker_kwargs = dict(
+            faces_file=faces_file, tracking=tracking, detect_interval=detect_interval,
+            legacy_faces_file=legacy_faces_file, journal_file=journal_file,
+            compact_every=compact_every, check_quality=False)
         self.load_faces()
     
+    @property
+    def face_cascade(self):
+        """Haar cascade, loaded on first use (or by warm_up)"""
+        if self._face_cascade is None:
+            self._face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        return self._face_cascade
+    
+    @property
+    def known_faces(self) -> Dict[str, List[np.ndarray]]:
+        """name -> list of normalized samples"""
+        return {name: list(self.samples.take(self.samples.rows_of([user_id])[0]))
+                for user_id, name in enumerate(self.sample_names)}
+    
     def load_faces(self):
-        """Load registered faces from pickle file"""
+        """Load registered faces from the binary face store (memory-mapped)"""
         try:
-            if os.path.exists(self.faces_file):
-                with open(self.faces_file, 'rb') as f:
-                    self.known_faces = pickle.load(f)
-                print(f"✅ Loaded {len(self.known_faces)} registered faces")
+            data = load_or_migrate(self.faces_file, self.legacy_faces_file, self.FEATURE_DIM)
+            if data is not None:
+                self._attach_samples(data.names, data.embeddings, data.user_starts)
+            self._replay_journal()
+            if self.sample_names:
+                print(f"✅ Loaded {len(self.sample_names)} registered faces")
             else:
                 print("ℹ️  No registered faces found. Please register users first.")
-                self.known_faces = {}
         except Exception as e:
             print(f"❌ Error loading faces: {e}")
-            self.known_faces = {}
+            self._attach_samples([], np.empty((0, self.FEATURE_DIM), dtype=np.float32), [0])
+    
+    def _replay_journal(self) -> int:
+        """Apply enrolment journal records on top of the loaded snapshot (as one batch)"""
+        applied = 0
+        changes = {}
+        for op, name, rows in self.journal.replay():
+            # Only the last record per user matters
+            changes.pop(name, None)
+            changes[name] = None if op == OP_DELETE else rows
+            applied += 1
+        if changes:
+            self._apply_enrolments(changes)
+        if applied:
+            print(f"✅ Replayed {applied} enrolment journal records")
+        return applied
+    
+    @staticmethod
+    def _normalize_features(features) -> np.ndarray:
+        """Center and L2-normalize feature rows so a dot product is a Pearson correlation"""
+        return normalize_samples(features)
+    
+    def _attach_samples(self, names: List[str], sample_matrix: np.ndarray, user_starts):
+        """Install a (total_samples x features) matrix of normalized samples grouped by user
+        
+        user_starts: (users + 1) row offsets, user u owning rows user_starts[u]:user_starts[u + 1]
+        """
+        self.sample_names = list(names)
+        self._user_index = None
+        self.samples.attach(sample_matrix, user_starts)
+    
+    def _user_id(self, name: str) -> Optional[int]:
+        if self._user_index is None:
+            self._user_index = {known: user_id for user_id, known in enumerate(self.sample_names)}
+        return self._user_index.get(name)
+    
+    def _remove_user_samples(self, name: str) -> bool:
+        """Drop a user and their samples"""
+        user_id = self._user_id(name)
+        if user_id is None:
+            return False
+        del self.sample_names[user_id]
+        self._user_index = None
+        self.samples.remove(user_id)
+        return True
+    
+    def _store_user_samples(self, name: str, samples, normalized: bool = False):
+        """Replace a user's samples (in place when they fit), normalizing them first"""
+        rows = np.asarray(samples, dtype=np.float32) if normalized else self._normalize_features(np.stack(samples))
+        user_id = self._user_id(name)
+        if user_id is None:
+            user_id = len(self.sample_names)
+            self.sample_names.append(name)
+            self._user_index[name] = user_id
+        self.samples.set(user_id, rows)
+        return rows
+    
+    def _apply_enrolments(self, changes: Dict[str, Optional[np.ndarray]]):
+        """Apply many enrolment changes at once
+        
+        changes: name -> that user's new normalized samples, or None to delete
+        them. Deletions are applied in one pass, so a batch costs O(users)
+        once rather than per change.
+        """
+        deleted = {name for name, rows in changes.items() if rows is None}
+        if deleted:
+            keep = np.array([name not in deleted for name in self.sample_names], dtype=bool)
+            if not keep.all():
+                self.sample_names = [name for name, kept in zip(self.sample_names, keep) if kept]
+                self._user_index = None
+                self.samples.keep(keep)
+        for name, rows in changes.items():
+            if rows is not None:
+                self._store_user_samples(name, rows, normalized=True)
+    
+    def match(self, features_list) -> Tuple[List[Optional[str]], np.ndarray]:
+        """Match feature vectors of all detected faces against every sample at once
+        
+        Returns (names, scores): the best-correlated user for each face (None when
+        below `match_threshold`) and that user's best sample correlation.
+        """
+        if not len(features_list) or not self.samples.rows:
+            return [None] * len(features_list), np.zeros(len(features_list), dtype=np.float32)
+        
+        queries = self._normalize_features(np.stack(features_list))
+        correlations = np.hstack([queries @ segment.T for segment in self.samples.segments()])
+        # Bring each user's rows together (skipping replaced ones) so one reduceat takes the per-user best
+        index, starts = self.samples.layout()
+        if index is not None:
+            correlations = correlations[:, index]
+        per_user = user_reduce(np.maximum, correlations, starts, empty=-np.inf, axis=1)
+        best_users = np.argmax(per_user, axis=1)
+        scores = per_user[np.arange(len(queries)), best_users]
+        names = [self.sample_names[u] if score > self.match_threshold else None
+                 for u, score in zip(best_users, scores)]
+        return names, scores
     
     def save_faces(self):
-        """Save registered faces to pickle file"""
+        """Write a full snapshot to the face store and drop the journal records it captures"""
         try:
-            os.makedirs(os.path.dirname(self.faces_file), exist_ok=True)
-            with open(self.faces_file, 'wb') as f:
-                pickle.dump(self.known_faces, f)
-            print(f"✅ Saved {len(self.known_faces)} faces to {self.faces_file}")
+            with self._lock:
+                checkpoint = self.journal.checkpoint()
+                # The store is replaced by rename, so stop mapping the old file first
+                self.samples.detach()
+                # Samples are updated in place, so write from a copy
+                names = list(self.sample_names)
+                matrix, starts = self.samples.grouped()
+            user_ids = np.repeat(np.arange(len(names), dtype=np.uint32), np.diff(starts))
+            save_store(self.faces_file, names, user_ids, matrix)
+            self.journal.truncate_before(checkpoint)
+            print(f"✅ Saved {len(names)} faces to {self.faces_file}")
         except Exception as e:
             print(f"❌ Error saving faces: {e}")
     
-    def extract_face_features(self, face_img):
+    def compact_async(self):
+        """Fold the journal into a new snapshot on a background thread"""
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self.save_faces, daemon=True)
+        self._compaction_thread.start()
+    
+    def _record_enrolment(self, op: int, name: str, rows=None):
+        """Append one enrolment change to the journal (O(1)), compacting when it grows large"""
+        self.journal.append(op, name, rows)
+        if self.journal.records >= self.compact_every:
+            self.compact_async()
+    
+    def enroll_many(self, samples: Dict[str, List[np.ndarray]]) -> int:
+        """Register many users in one bulk commit (see bulk_enroll.py)
+        
+        samples: name -> feature vectors from that user's images, all kept as samples
+        The samples are applied as one batch and written as a new snapshot
+        instead of one journal record per user. Returns the number enrolled.
+        """
+        if not samples:
+            return 0
+        empty = [name for name, features in samples.items() if not len(features)]
+        if empty:
+            raise ValueError(f"No samples given for: {', '.join(empty)}")
+        with self._lock:
+            # Re-enrolled users have their samples replaced; the rest keep theirs
+            self._apply_enrolments({name: self._normalize_features(np.stack(features))
+                                    for name, features in samples.items()})
+        self.save_faces()
+        print(f"✅ Enrolled {len(samples)} users")
+        return len(samples)
+    
+    def remove_face(self, name: str) -> bool:
+        """Delete a registered face and all its samples"""
+        with self._lock:
+            if not self._remove_user_samples(name):
+                print(f"❌ User '{name}' has no registered face")
+                return False
+        self._record_enrolment(OP_DELETE, name)
+        print(f"✅ Removed face data for user: {name}")
+        return True
+    
+    def close(self):
+        """Release background resources (journal)"""
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        self.journal.close()
+    
+    def warm_up(self) -> bool:
+        """Open the camera, load OpenCV and the cascade and run one dummy detection
+        
+        Meant for a background thread while the first screen is showing.
+        """
+        try:
+            if self.camera_service is not None and not self.camera_service.is_running:
+                self.camera_service.start()
+            cv2.load()
+            start = time.perf_counter()
+            self._detect_faces(np.zeros((240, 320), dtype=np.uint8))
+            lazy_imports.record_timing("first inference", time.perf_counter() - start)
+            return True
+        except Exception as e:
+            print(f"⚠️  Face detector warm-up failed: {e}")
+            return False
+    
+    @staticmethod
+    def extract_face_features(face_img):
         """Extract simple features from face image"""
         # Resize to standard size
         face_img = cv2.resize(face_img, (100, 100))
@@ -54,18 +275,48 @@ class SimpleFaceDetection:
         features = gray.flatten() / 255.0
         return features
     
+    def _quality_rejection(self, frame, box) -> Optional[str]:
+        """Why the face at (x, y, w, h) is not worth matching, or None
+        
+        No landmarks here, so pose is not checked; the frontal cascade already
+        misses strongly turned faces.
+        """
+        if self.quality_gate is None:
+            return None
+        reason = self.quality_gate.check(frame, box)
+        self.quality_gate.record(reason)
+        return reason
+    
+    def _detect_faces(self, gray):
+        """Run the Haar cascade over the full frame"""
+        return self.face_cascade.detectMultiScale(gray, 1.1, 3, minSize=(30, 30))
+    
+    def _locate_faces(self, gray):
+        """Find face boxes (x, y, w, h), tracking between detections when enabled"""
+        if self.tracker is None:
+            return self._detect_faces(gray)
+        return self.tracker.update(gray, self._detect_faces)
+    
     def compare_faces(self, features1, features2, threshold=0.6):
         """Compare two face feature vectors"""
         # Simple correlation-based comparison
         correlation = np.corrcoef(features1, features2)[0, 1]
         return correlation > threshold, correlation
     
+    def _open_camera(self):
+        """Return a frame source: the shared camera service if one is attached, else a fresh capture"""
+        if self.camera_service is not None:
+            if not self.camera_service.is_running:
+                self.camera_service.start()
+            return self.camera_service.reader()
+        return cv2.VideoCapture(0)
+    
     def register_face(self, name: str) -> bool:
         """Register a new face for the given name"""
         print(f"📸 Registering face for: {name}")
         
         # Initialize camera
-        camera = cv2.VideoCapture(0)
+        camera = self._open_camera()
         if not camera.isOpened():
             print("❌ Could not open camera")
             return False
@@ -113,7 +364,10 @@ class SimpleFaceDetection:
             if key == ord('q'):
                 break
             elif key == ord('r'):
-                if len(faces) > 0:
+                reason = self._quality_rejection(frame, faces[0]) if len(faces) > 0 else None
+                if reason is not None:
+                    print(f"❌ Sample rejected ({reason}). {REASON_HINTS[reason]}")
+                elif len(faces) > 0:
                     # Extract the first detected face
                     x, y, w, h = faces[0]
                     face_img = frame[y:y+h, x:x+w]
@@ -132,116 +386,104 @@ class SimpleFaceDetection:
         
         if len(face_samples) == samples_needed:
             # Store face features
-            self.known_faces[name] = face_samples
-            self.save_faces()
-            print(f"✅ Registered new user: {name} with {len(face_samples)} samples")
+            with self._lock:
+                is_new = self._user_id(name) is None
+                rows = self._store_user_samples(name, face_samples)
+            self._record_enrolment(OP_ADD if is_new else OP_UPDATE, name, rows)
+            if is_new:
+                print(f"✅ Registered new user: {name} with {len(face_samples)} samples")
+            else:
+                print(f"🔄 Updated face for existing user: {name} with {len(face_samples)} samples")
             return True
         else:
             print("❌ Face registration failed - not enough samples captured")
             return False
     
-    def start_recognition(self) -> Tuple[bool, Optional[str]]:
-        """Start face recognition and return (success, user_name)"""
+    def start_recognition(self, policy=None, show_preview: bool = True,
+                          timeout: Optional[float] = None, renderer=None) -> Tuple[bool, Optional[str]]:
+        """Start face recognition and return (success, user_name)
+        
+        With the preview, 'C' confirms; without it (headless), `policy`
+        confirms, by default after 3 consecutive consistent matches.
+        renderer: draw somewhere other than an OpenCV window (e.g. the Tk GUI)
+        """
         print("🔍 Starting face recognition...")
         
         # Initialize camera
-        self.camera = cv2.VideoCapture(0)
+        self.camera = self._open_camera()
         if not self.camera.isOpened():
             print("❌ Could not open camera")
             return False, None
         
-        if not self.known_faces:
+        if not self.sample_names:
             print("❌ No registered faces found")
             self.camera.release()
             return False, None
         
         print("👤 Please look at the camera for recognition...")
-        print("Press 'C' to confirm when recognized, or 'Q' to quit")
+        if renderer is None and show_preview:
+            print("Press 'C' to confirm when recognized, or 'Q' to quit")
+            renderer = recognition.PreviewRenderer()
         
-        while True:
-            ret, frame = self.camera.read()
-            if not ret:
-                print("❌ Failed to capture frame")
-                break
-            
-            # Flip frame horizontally for mirror effect
-            frame = cv2.flip(frame, 1)
-            
-            # Convert to grayscale for face detection
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Detect faces
-            faces = self.face_cascade.detectMultiScale(gray, 1.1, 3, minSize=(30, 30))
-            
-            # Check each detected face
-            for (x, y, w, h) in faces:
-                face_img = frame[y:y+h, x:x+w]
-                current_features = self.extract_face_features(face_img)
-                
-                # Compare with known faces
-                best_match = None
-                best_confidence = 0
-                
-                for name, known_features_list in self.known_faces.items():
-                    # Check against all samples for this user
-                    for known_feature in known_features_list:
-                        is_match, confidence = self.compare_faces(current_features, known_feature)
-                        if is_match and confidence > best_confidence:
-                            best_match = name
-                            best_confidence = confidence
-                
-                if best_match:
-                    # Draw rectangle and name
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                    cv2.putText(frame, f"{best_match} ({best_confidence:.2f})", (x, y-10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                    
-                    # Show recognition message
-                    cv2.putText(frame, f"Recognized: {best_match}", (10, 30), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    cv2.putText(frame, f"Confidence: {best_confidence:.2f}", (10, 60), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    cv2.putText(frame, "Press 'C' to Confirm", (10, 90), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-                    
-                    cv2.imshow('Face Recognition', frame)
-                    
-                    key = cv2.waitKey(1) & 0xFF
-                    if key == ord('c'):
-                        self.camera.release()
-                        cv2.destroyAllWindows()
-                        print(f"✅ Face recognized: {best_match}")
-                        return True, best_match
-                    elif key == ord('q'):
-                        self.camera.release()
-                        cv2.destroyAllWindows()
-                        return False, None
-                else:
-                    # Unknown face
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)
-                    cv2.putText(frame, "Unknown", (x, y-10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-            
-            # Show instructions
-            cv2.putText(frame, "Press 'Q' to Quit", (10, frame.shape[0] - 20), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            
-            cv2.imshow('Face Recognition', frame)
-            
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                break
-        
-        self.camera.release()
-        cv2.destroyAllWindows()
-        return False, None
+        try:
+            return self.recognize_stream(recognition.camera_frames(self.camera), policy, renderer, timeout)
+        finally:
+            self.camera.release()
+            if renderer is not None:
+                renderer.close()
+    
+    def recognize_frame(self, frame) -> List[Tuple[Tuple[int, int, int, int], Optional[str], float]]:
+        """Headless recognition of one BGR frame: [((x, y, w, h), name or None, confidence)]"""
+        return self.identify_faces(frame, self.detect_frame(frame))
+    
+    def recognize_stream(self, frames, policy=None, renderer=None,
+                         timeout: Optional[float] = None) -> Tuple[bool, Optional[str]]:
+        """Recognize frames until `policy` (or the renderer's confirm key) confirms a user"""
+        if self.tracker is not None:
+            self.tracker.reset()
+        return recognition.recognize_stream(self, frames, policy, renderer, timeout)
+    
+    def detect_frame(self, frame):
+        """Pipeline detect stage: face boxes (x, y, w, h) in a BGR frame"""
+        return self._locate_faces(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    
+    def identify_faces(self, frame, faces) -> List[Tuple[Tuple[int, int, int, int], Optional[str], float]]:
+        """Pipeline encode/match stage: [((x, y, w, h), name or None, confidence)] per face"""
+        if not len(faces):
+            return []
+        usable = [self._quality_rejection(frame, box) is None for box in faces]
+        face_features = [self.extract_face_features(frame[y:y+h, x:x+w])
+                         for (x, y, w, h), ok in zip(faces, usable) if ok]
+        best_matches, best_confidences = self.match(face_features)
+        matches = zip(best_matches, best_confidences)
+        results = []
+        for (x, y, w, h), ok in zip(faces, usable):
+            # Rejected faces are still reported (as unknown) so the preview shows them
+            name, confidence = next(matches) if ok else (None, 0.0)
+            results.append(((int(x), int(y), int(w), int(h)), name, float(confidence)))
+        return results
+    
+    def start_pipelined_recognition(self, detect_workers: int = 1, identify_workers: int = 1,
+                                    use_processes: bool = False, policy=None,
+                                    show_preview: bool = True) -> Tuple[bool, Optional[str]]:
+        """Like start_recognition, but with capture, detection, matching and display decoupled"""
+        if not self.sample_names:
+            print("❌ No registered faces found")
+            return False, None
+        print("🔍 Starting pipelined face recognition...")
+        self.pipeline = RecognitionPipeline(self, detect_workers=detect_workers,
+                                            identify_workers=identify_workers,
+                                            use_processes=use_processes)
+        return self.pipeline.run(policy, show_preview)
     
     def stop_recognition(self):
         """Stop face recognition and release camera"""
+        if self.pipeline is not None:
+            self.pipeline.stop()
         if self.camera:
             self.camera.release()
         cv2.destroyAllWindows()
     
     def get_registered_users(self) -> List[str]:
         """Get list of registered user names"""
-        return list(self.known_faces.keys()) 
\ No newline at end of file
+        return list(self.sample_names) 
\ No newline at end of file
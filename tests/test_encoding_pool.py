@@ -0,0 +1,40 @@
+"""Tests for the multi-process encoding pool"""
+
+import time
+from multiprocessing import shared_memory
+
+import pytest
+
+pytest.importorskip("face_recognition")
+
+import encoding_pool
+from encoding_pool import EncodingPool
+
+def _first_byte(name):
+    return encoding_pool._attach(name).buf[0]
+
+def test_warm_up_starts_every_worker():
+    pool = EncodingPool(workers=3)
+    try:
+        pool.warm_up()
+        assert len(pool.executor._processes) == 3
+    finally:
+        pool.close()
+
+def test_block_outlives_the_workers_that_attached_it():
+    pool = EncodingPool(workers=2)
+    try:
+        # Workers first, block second: the order in which a worker would start its own tracker
+        pool.warm_up()
+        pool._reserve(1024)
+        pool._shm.buf[0] = 7
+        assert [pool.executor.submit(_first_byte, pool._shm.name).result() for _ in range(4)] == [7] * 4
+
+        pool.executor.shutdown(wait=True)
+        pool.executor = None
+        time.sleep(0.2)
+        block = shared_memory.SharedMemory(name=pool._shm.name)
+        assert block.buf[0] == 7
+        block.close()
+    finally:
+        pool.close()
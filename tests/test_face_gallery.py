@@ -0,0 +1,31 @@
+"""Tests for per-user sample blocks"""
+
+import numpy as np
+
+from face_gallery import SampleBlocks, user_means, user_reduce
+
+def test_user_reduce_gives_empty_users_the_fill_value():
+    values = np.array([[1.0], [5.0], [2.0]])
+    starts = [0, 2, 2, 3]
+    assert user_reduce(np.maximum, values, starts, empty=-np.inf)[:, 0].tolist() == [5.0, -np.inf, 2.0]
+    assert user_means(values, starts)[:, 0].tolist() == [3.0, 0.0, 2.0]
+    assert user_reduce(np.add, values, [0, 0], empty=0.0).shape == (1, 1)
+
+def test_user_reduce_along_columns():
+    scores = np.array([[0.1, 0.9, 0.3], [0.8, 0.2, 0.4]])
+    per_user = user_reduce(np.maximum, scores, [0, 2, 2, 3], empty=-np.inf, axis=1)
+    assert per_user.tolist() == [[0.9, -np.inf, 0.3], [0.8, -np.inf, 0.4]]
+
+def test_one_per_user_tracks_the_layout():
+    blocks = SampleBlocks(2)
+    for user in range(3):
+        blocks.set(user, np.full((1, 2), user))
+    assert blocks.one_per_user
+
+    blocks.set(1, np.ones((2, 2)))
+    assert not blocks.one_per_user
+    blocks.set(1, np.ones((1, 2)))
+    # Back to one sample each, but the replaced rows are still stored
+    assert blocks.counts.tolist() == [1, 1, 1] and not blocks.one_per_user
+    blocks.compact()
+    assert blocks.one_per_user
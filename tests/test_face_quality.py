@@ -0,0 +1,28 @@
+"""Tests for the face quality gate"""
+
+import json
+
+import numpy as np
+
+from face_quality import FaceQualityGate, REASON_TOO_DARK
+
+def test_gate_is_off_without_a_deployment_config(tmp_path):
+    assert FaceQualityGate.load(str(tmp_path / "face_quality.json")) is None
+
+def test_config_enables_the_gate(tmp_path):
+    path = tmp_path / "face_quality.json"
+    path.write_text(json.dumps({"min_face_size": 30}))
+    gate = FaceQualityGate.load(str(path))
+    assert gate is not None and gate.min_face_size == 30
+
+def test_rgb_and_bgr_frames_are_judged_alike():
+    # Pure blue is dark (grey ~29), but would pass as red if the channels were swapped
+    rgb = np.zeros((200, 200, 3), dtype=np.uint8)
+    rgb[:, :, 2] = 255
+    bgr = np.ascontiguousarray(rgb[:, :, ::-1])
+    gate = FaceQualityGate(min_sharpness=0.0)
+    box = (50, 50, 100, 100)
+
+    assert gate.check(rgb, box, rgb=True) == REASON_TOO_DARK
+    assert gate.check(bgr, box) == REASON_TOO_DARK
+    assert gate.check(rgb, box) is None
@@ -0,0 +1,92 @@
+"""Tests for enrolment storage in the face recognition module (no camera or dlib needed)"""
+
+import numpy as np
+import pytest
+
+from face_journal import FaceJournal, OP_ADD, OP_DELETE, OP_UPDATE
+from face_recognition_module import FaceRecognitionModule
+from face_store import load_store, normalize_samples, save_store
+from simple_face_detection import SimpleFaceDetection
+
+def _module(tmp_path, **kwargs):
+    return FaceRecognitionModule(faces_file=str(tmp_path / "faces.bin"),
+                                 index_file=str(tmp_path / "faces_index.npz"),
+                                 legacy_faces_file=str(tmp_path / "faces.pkl"),
+                                 journal_file=str(tmp_path / "faces.journal"),
+                                 check_quality=False, **kwargs)
+
+def _samples(seed, count):
+    return list(np.random.default_rng(seed).random((count, 128)).astype(np.float32))
+
+def test_store_without_centroids_gets_user_means(tmp_path):
+    ann, bob = _samples(0, 3), _samples(1, 1)
+    save_store(str(tmp_path / "faces.bin"), ["ann", "bob"], [0, 0, 0, 1], np.stack(ann + bob))
+
+    module = _module(tmp_path)
+    assert np.allclose(module.gallery.matrix[0], np.mean(ann, axis=0))
+    assert np.allclose(module.gallery.matrix[1], bob[0])
+    indices, distances = module.match([ann[1]])
+    assert indices[0] == 0 and distances[0] < 1e-5
+
+    module.save_faces()
+    assert np.allclose(load_store(str(tmp_path / "faces.bin")).centroids, module.gallery.matrix)
+
+def test_journal_replays_on_top_of_the_snapshot(tmp_path):
+    module = _module(tmp_path)
+    module.enroll_many({"ann": _samples(0, 3), "bob": _samples(1, 3), "cat": _samples(2, 1)})
+
+    journal = FaceJournal(str(tmp_path / "faces.journal"), 128)
+    journal.append(OP_UPDATE, "ann", np.stack(_samples(3, 2)))
+    journal.append(OP_DELETE, "bob")
+    journal.append(OP_ADD, "dan", np.stack(_samples(4, 3)))
+    journal.append(OP_UPDATE, "dan", np.stack(_samples(5, 1)))
+    journal.close()
+
+    module = _module(tmp_path)
+    assert module.get_registered_users() == ["ann", "cat", "dan"]
+    for name, samples in (("ann", _samples(3, 2)), ("cat", _samples(2, 1)), ("dan", _samples(5, 1))):
+        row = module.gallery.index_of(name)
+        assert module.samples.counts[row] == len(samples)
+        assert np.allclose(module.gallery.matrix[row], np.mean(samples, axis=0))
+        indices, _ = module.match([samples[0]])
+        assert module.gallery.names[indices[0]] == name
+
+def test_store_user_without_samples(tmp_path):
+    # As many rows as users, yet ann has two samples and ghost none
+    ann = _samples(0, 2)
+    save_store(str(tmp_path / "faces.bin"), ["ann", "ghost"], [0, 0], np.stack(ann))
+
+    module = _module(tmp_path)
+    assert not module.samples.one_per_user
+    assert np.isfinite(module.gallery.matrix).all()
+    indices, distances = module.match([ann[1]])
+    assert module.gallery.names[indices[0]] == "ann" and distances[0] < 1e-5
+
+def test_one_sample_per_user_matches_the_centroids(tmp_path):
+    module = _module(tmp_path)
+    module.enroll_many({"ann": _samples(0, 1), "bob": _samples(1, 1)})
+    assert module.samples.one_per_user
+    indices, distances = module.match([_samples(1, 1)[0]])
+    assert module.gallery.names[indices[0]] == "bob" and distances[0] < 1e-5
+
+def test_enroll_many_rejects_users_without_samples(tmp_path):
+    module = _module(tmp_path)
+    with pytest.raises(ValueError):
+        module.enroll_many({"ann": _samples(0, 2), "x": []})
+    assert module.get_registered_users() == []
+
+    simple = SimpleFaceDetection(faces_file=str(tmp_path / "simple.bin"),
+                                 legacy_faces_file=str(tmp_path / "faces.pkl"),
+                                 journal_file=str(tmp_path / "simple.journal"), check_quality=False)
+    with pytest.raises(ValueError):
+        simple.enroll_many({"x": []})
+
+def test_simple_match_ignores_users_without_samples(tmp_path):
+    features = np.random.default_rng(0).random((2, SimpleFaceDetection.FEATURE_DIM))
+    save_store(str(tmp_path / "simple.bin"), ["ann", "ghost", "bob"], [0, 2],
+               normalize_samples(features))
+    simple = SimpleFaceDetection(faces_file=str(tmp_path / "simple.bin"),
+                                 legacy_faces_file=str(tmp_path / "faces.pkl"),
+                                 journal_file=str(tmp_path / "simple.journal"), check_quality=False)
+    names, scores = simple.match([features[1], features[0]])
+    assert names == ["bob", "ann"] and np.allclose(scores, 1.0)
@@ -0,0 +1,74 @@
+"""Tests for the binary face store and its migrations"""
+
+import pickle
+import struct
+
+import numpy as np
+
+from face_store import (HEADER_SIZE_V1, HEADER_V1, MAGIC, load_or_migrate, load_store,
+                        save_store)
+
+def _write_v1(path, names, user_ids, embeddings):
+    """A version 1 store, whose rows need not be grouped by user"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    user_ids = np.asarray(user_ids, dtype=np.uint32)
+    sq_norms = np.einsum('ij,ij->i', embeddings, embeddings)
+    norms_offset = HEADER_SIZE_V1 + embeddings.nbytes
+    ids_offset = norms_offset + sq_norms.nbytes
+    names_offset = ids_offset + user_ids.nbytes
+    with open(path, 'wb') as f:
+        header = HEADER_V1.pack(MAGIC, 1, embeddings.shape[1], len(embeddings), len(names),
+                                norms_offset, ids_offset, names_offset)
+        f.write(header.ljust(HEADER_SIZE_V1, b"\0"))
+        f.write(embeddings.tobytes())
+        f.write(sq_norms.tobytes())
+        f.write(user_ids.tobytes())
+        for name in names:
+            f.write(struct.pack("<I", len(name.encode())) + name.encode())
+
+def test_v2_round_trip_keeps_blocks_and_centroids(tmp_path):
+    path = str(tmp_path / "faces.bin")
+    embeddings = np.arange(5 * 4, dtype=np.float32).reshape(5, 4)
+    centroids = np.array([embeddings[:2].mean(0), embeddings[2:].mean(0)])
+    save_store(path, ["ann", "bob"], [0, 0, 1, 1, 1], embeddings, centroids=centroids)
+
+    data = load_store(path)
+    assert data.names == ["ann", "bob"]
+    assert list(data.user_starts) == [0, 2, 5]
+    assert np.array_equal(data.embeddings, embeddings)
+    assert np.allclose(data.centroids, centroids)
+    assert np.allclose(data.centroid_sq_norms, (centroids ** 2).sum(1))
+
+def test_v1_store_with_interleaved_rows_loads_grouped(tmp_path):
+    path = str(tmp_path / "faces.bin")
+    embeddings = np.array([[1, 0], [2, 0], [3, 0], [4, 0]], dtype=np.float32)
+    _write_v1(path, ["ann", "bob"], [1, 0, 1, 0], embeddings)
+
+    data = load_store(path)
+    assert list(data.user_starts) == [0, 2, 4]
+    assert data.embeddings[:2, 0].tolist() == [2, 4]
+    assert data.embeddings[2:, 0].tolist() == [1, 3]
+    assert data.centroids is None
+
+def test_recognition_pickle_migrates_to_a_store(tmp_path):
+    legacy = tmp_path / "faces.pkl"
+    encodings = np.random.default_rng(0).random((3, 128)).astype(np.float32)
+    legacy.write_bytes(pickle.dumps({"encodings": list(encodings), "names": ["a", "b", "c"]}))
+
+    data = load_or_migrate(str(tmp_path / "faces.bin"), str(legacy), 128)
+    assert data.names == ["a", "b", "c"]
+    assert list(data.user_starts) == [0, 1, 2, 3]
+    assert np.allclose(data.embeddings, encodings)
+    assert (tmp_path / "faces.bin").exists()
+
+def test_simple_pickle_keeps_every_sample_and_skips_empty_users(tmp_path):
+    legacy = tmp_path / "faces.pkl"
+    rng = np.random.default_rng(1)
+    legacy.write_bytes(pickle.dumps({"a": list(rng.random((2, 10000))), "empty": [],
+                                     "b": list(rng.random((3, 10000)))}))
+
+    data = load_or_migrate(str(tmp_path / "faces.bin"), str(legacy), 10000)
+    assert data.names == ["a", "b"]
+    assert list(data.user_starts) == [0, 2, 5]
+    # The other module's layout is left alone
+    assert load_or_migrate(str(tmp_path / "other.bin"), str(legacy), 128) is None
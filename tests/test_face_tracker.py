@@ -0,0 +1,56 @@
+"""Tests for the frame-to-frame face tracker"""
+
+import threading
+import time
+
+import numpy as np
+
+from face_tracker import FaceTracker
+
+def _frame(seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+
+def test_rgb_frames_give_the_same_templates_as_bgr():
+    bgr = _frame()
+    rgb = bgr[:, :, ::-1].copy()
+    detect = lambda frame: [(40, 30, 32, 32)]
+
+    bgr_tracker = FaceTracker()
+    rgb_tracker = FaceTracker(rgb=True)
+    bgr_tracker.update(bgr, detect)
+    rgb_tracker.update(rgb, detect)
+
+    assert np.array_equal(bgr_tracker.templates[0], rgb_tracker.templates[0])
+
+def test_tracking_follows_the_detected_face():
+    frame = _frame()
+    tracker = FaceTracker(rgb=True)
+    tracker.update(frame, lambda f: [(40, 30, 32, 32)])
+    shifted = np.roll(frame, (3, 5), axis=(0, 1))
+
+    assert tracker.update(shifted, lambda f: []) == [(45, 33, 32, 32)]
+    assert tracker.detections == 1 and tracker.tracked_frames == 1
+
+def test_detector_runs_outside_the_lock():
+    tracker = FaceTracker(detect_interval=0)
+    running = []
+    overlapped = threading.Event()
+
+    def slow_detect(frame):
+        running.append(1)
+        if len(running) > 1:
+            overlapped.set()
+        overlapped.wait(1.0)
+        time.sleep(0.01)
+        running.pop()
+        return []
+
+    threads = [threading.Thread(target=tracker.update, args=(_frame(i), slow_detect)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlapped.is_set()
+    assert tracker.detections == 2
@@ -0,0 +1,114 @@
+"""Tests for reporting failed commits back to the callers"""
+
+import threading
+
+import pytest
+
+from group_commit import (CommitError, GroupCommitWriter, DURABILITY_ASYNC, DURABILITY_GROUP,
+                          DURABILITY_SYNC)
+from pin_verification import PINVerification
+from transaction_ledger import FSYNC_NEVER
+from transaction_manager import TransactionManager
+
+class FlakyStore:
+    """Commit target that fails while `failing` is set"""
+
+    def __init__(self):
+        self.failing = False
+        self.items = []
+
+    def commit(self, batch):
+        if self.failing:
+            raise OSError("disk full")
+        self.items.extend(batch)
+
+@pytest.mark.parametrize("mode", [DURABILITY_SYNC, DURABILITY_GROUP])
+def test_waiting_callers_get_the_error(mode):
+    store = FlakyStore()
+    writer = GroupCommitWriter(store.commit, mode=mode)
+    store.failing = True
+    with pytest.raises(CommitError):
+        writer.submit(1)
+    store.failing = False
+    writer.submit(2)
+    writer.close()
+    assert store.items == [2]
+
+def test_every_caller_in_a_failed_group_batch_gets_the_error():
+    store = FlakyStore()
+    store.failing = True
+    writer = GroupCommitWriter(store.commit, mode=DURABILITY_GROUP)
+    errors = []
+
+    def submit(item):
+        try:
+            writer.submit(item)
+        except CommitError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 8
+    writer.close()
+
+def test_async_failure_is_raised_by_the_next_flush_and_reported_at_once():
+    store = FlakyStore()
+    reported = []
+    writer = GroupCommitWriter(store.commit, mode=DURABILITY_ASYNC,
+                               on_error=lambda error, batch: reported.append(list(batch)))
+    store.failing = True
+    writer.submit(1)
+    with pytest.raises(CommitError):
+        writer.flush()
+    assert reported == [[1]]
+
+    store.failing = False
+    writer.submit(2)
+    writer.flush()
+    writer.close()
+    assert store.items == [2]
+
+def test_close_raises_and_still_stops_the_writer():
+    store = FlakyStore()
+    writer = GroupCommitWriter(store.commit, mode=DURABILITY_ASYNC)
+    store.failing = True
+    writer.submit(1)
+    with pytest.raises(CommitError):
+        writer.close()
+    assert not writer._thread.is_alive()
+
+def test_failed_ledger_append_reaches_the_paying_lane(tmp_path, monkeypatch):
+    manager = TransactionManager(str(tmp_path / "transactions.json"), str(tmp_path / "ledger"),
+                                 fsync=FSYNC_NEVER, durability=DURABILITY_GROUP)
+    real_append_many = manager.ledger.append_many
+    monkeypatch.setattr(manager.ledger, "append_many",
+                        lambda records: (_ for _ in ()).throw(OSError("disk full")))
+    lost = manager.start_new_transaction("5.00")
+    manager.verify_pin(True)
+    with pytest.raises(CommitError):
+        manager.complete_transaction()
+    assert manager.get_transaction(lost) is None
+    assert not manager.transaction_history
+
+    monkeypatch.setattr(manager.ledger, "append_many", real_append_many)
+    saved = manager.start_new_transaction("6.00")
+    manager.verify_pin(True)
+    manager.complete_transaction()
+    manager.close()
+    assert [r["transaction_id"] for r in manager.ledger.iter_records()] == [saved]
+
+def test_failed_async_pin_write_is_raised_on_flush(tmp_path, monkeypatch):
+    pins = PINVerification(pin_file=str(tmp_path / "pin_data.json"),
+                           store_file=str(tmp_path / "pins.sqlite3"),
+                           durability=DURABILITY_ASYNC, kdf_params={"n": 1024, "r": 8, "p": 1},
+                           attempts_dir=None)
+    monkeypatch.setattr(pins.store, "apply", lambda batch: (_ for _ in ()).throw(OSError("disk full")))
+    assert pins.set_pin("alice", "1234")
+    with pytest.raises(CommitError):
+        pins.flush()
+    # Lookups match the disk again
+    assert not pins.user_exists("alice")
+    pins.close()
@@ -0,0 +1,82 @@
+"""Tests for PIN verification throttling"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pin_hashing
+from group_commit import DURABILITY_SYNC
+from pin_verification import PINVerification
+
+CHEAP_SCRYPT = {"n": 1024, "r": 8, "p": 1}
+
+def _pins(tmp_path, **kwargs):
+    pins = PINVerification(pin_file=str(tmp_path / "pin_data.json"),
+                           store_file=str(tmp_path / "pins.sqlite3"),
+                           durability=DURABILITY_SYNC, kdf_params=CHEAP_SCRYPT,
+                           attempts_dir=str(tmp_path), terminal_id="T1", **kwargs)
+    pins.set_pin("alice", "1234")
+    return pins
+
+def _slow_kdf(monkeypatch, delay=0.2):
+    """Make every KDF run slow and count how many actually ran"""
+    calls = []
+    lock = threading.Lock()
+    real_verify = pin_hashing.verify_pin
+
+    def slow_verify(pin, stored):
+        with lock:
+            calls.append(pin)
+        time.sleep(delay)
+        return real_verify(pin, stored)
+
+    monkeypatch.setattr(pin_hashing, "verify_pin", slow_verify)
+    return calls
+
+def test_lockout_after_max_failures(tmp_path):
+    pins = _pins(tmp_path)
+    for _ in range(pins.user_limiter.max_failures):
+        assert not pins.verify_pin("alice", "0000")
+    assert pins.lockout_remaining("alice") > 0
+    assert not pins.verify_pin("alice", "1234")
+    pins.close()
+
+def test_concurrent_guesses_cannot_outrun_the_lockout(tmp_path, monkeypatch):
+    pins = _pins(tmp_path)
+    calls = _slow_kdf(monkeypatch)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lambda pin: pins.verify_pin("alice", pin),
+                                    [f"{n:04d}" for n in range(16)]))
+
+    assert not any(results)
+    assert len(calls) <= pins.user_limiter.max_failures
+    assert pins.lockout_remaining("alice") > 0
+    pins.close()
+
+def test_success_clears_the_claim(tmp_path, monkeypatch):
+    pins = _pins(tmp_path)
+    _slow_kdf(monkeypatch, delay=0.0)
+    for _ in range(pins.user_limiter.max_failures - 1):
+        assert not pins.verify_pin("alice", "0000")
+    assert pins.verify_pin("alice", "1234")
+    assert pins.lockout_remaining("alice") == 0
+    assert "alice" not in pins.user_limiter._entries
+    pins.close()
+
+def test_unknown_user_leaves_no_user_entry(tmp_path):
+    pins = _pins(tmp_path)
+    assert not pins.verify_pin("mallory", "1234")
+    assert "mallory" not in pins.user_limiter._entries
+    assert pins.terminal_limiter._entries["T1"].failures == 1
+    pins.close()
+
+def test_malformed_stored_hash_fails_closed(tmp_path):
+    pins = _pins(tmp_path)
+    for stored in ("scrypt$n=1024", "scrypt$n=1024,r=8,p=1$zz$00", "bcrypt$cost=4$00$00",
+                   "scrypt$n=1000,r=8,p=1$00$00"):
+        pins.store.apply([("mallory", stored)])
+        assert not pins.verify_pin("mallory", "1234")
+    assert pins.user_limiter._entries["mallory"].failures == 4
+    assert pins.verify_pin("alice", "1234")
+    pins.close()
@@ -0,0 +1,60 @@
+"""Tests for transaction ID uniqueness and ordering"""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+import transaction_ids
+from transaction_ids import TransactionIdGenerator
+
+COUNT = 20000
+
+def _issue_ids(generator, count):
+    return [generator.next_id() for _ in range(count)]
+
+def test_ids_are_unique_across_threads():
+    generator = TransactionIdGenerator("TEST")
+    with ThreadPoolExecutor(8) as pool:
+        batches = list(pool.map(_issue_ids, [generator] * 8, [COUNT] * 8))
+    ids = [transaction_id for batch in batches for transaction_id in batch]
+    assert len(set(ids)) == len(ids)
+    # Each thread sees its own IDs in issue order
+    for batch in batches:
+        assert batch == sorted(batch)
+
+@pytest.mark.parametrize("method", [m for m in ("fork", "spawn")
+                                    if m in multiprocessing.get_all_start_methods()])
+def test_ids_are_unique_across_processes(method):
+    generator = TransactionIdGenerator("TEST")
+    ids = _issue_ids(generator, COUNT)
+    context = multiprocessing.get_context(method)
+    with ProcessPoolExecutor(4, mp_context=context) as pool:
+        for batch in pool.map(_issue_ids, [generator] * 4, [COUNT] * 4):
+            ids.extend(batch)
+    # A restarted terminal in the same process gets a fresh generator
+    ids.extend(_issue_ids(TransactionIdGenerator("TEST"), COUNT))
+    assert len(set(ids)) == len(ids)
+
+def test_ids_do_not_go_backwards_when_the_clock_steps_back(monkeypatch):
+    generator = TransactionIdGenerator("TEST")
+    now = [time.time_ns()]
+    monkeypatch.setattr(transaction_ids.time, "time_ns", lambda: now[0])
+    first = generator.next_id()
+    now[0] -= 3600 * 10**9
+    second = generator.next_id()
+    assert second > first
+
+def test_timestamp_is_utc(monkeypatch):
+    generator = TransactionIdGenerator("TEST", prefix="T")
+    # 2026-11-01 05:30:00.250 UTC: inside the US DST fall-back hour in local time
+    fixed = (1793511000 * 1000 + 250) * 1_000_000
+    monkeypatch.setattr(transaction_ids.time, "time_ns", lambda: fixed)
+    # Run on a fresh thread so the per-thread last millisecond starts clean
+    issued = []
+    thread = threading.Thread(target=lambda: issued.append(generator.next_id()))
+    thread.start()
+    thread.join()
+    assert issued[0].startswith("T20261101053000250TEST")
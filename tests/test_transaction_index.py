@@ -0,0 +1,77 @@
+"""Tests for keeping the transaction index in step with the ledger"""
+
+from transaction_ledger import FSYNC_NEVER
+from transaction_manager import TransactionManager
+from group_commit import DURABILITY_SYNC
+
+def _manager(tmp_path):
+    return TransactionManager(str(tmp_path / "transactions.json"), str(tmp_path / "ledger"),
+                              fsync=FSYNC_NEVER, durability=DURABILITY_SYNC)
+
+def _pay(manager, user):
+    transaction_id = manager.start_new_transaction("5.00")
+    manager.set_user(user)
+    manager.verify_pin(True)
+    manager.complete_transaction()
+    return transaction_id
+
+def _fail_once(monkeypatch, index):
+    real_add_many = index.add_many
+    calls = []
+
+    def flaky(records, position):
+        calls.append(position)
+        if len(calls) == 1:
+            list(records)
+            raise RuntimeError("disk full")
+        return real_add_many(records, position)
+
+    monkeypatch.setattr(index, "add_many", flaky)
+
+def test_index_catches_up_after_a_failed_batch(tmp_path, monkeypatch):
+    manager = _manager(tmp_path)
+    _fail_once(monkeypatch, manager.index)
+    lost = _pay(manager, "alice")
+    assert manager.get_transaction(lost) is None
+
+    later = _pay(manager, "bob")
+    assert manager.get_transaction(lost)["user_name"] == "alice"
+    assert manager.get_transaction(later)["user_name"] == "bob"
+    assert manager.index.position() == manager.ledger.position()
+    manager.close()
+
+def test_failed_batch_is_indexed_after_restart(tmp_path, monkeypatch):
+    manager = _manager(tmp_path)
+    _fail_once(monkeypatch, manager.index)
+    lost = _pay(manager, "alice")
+    _pay(manager, "bob")
+    manager.close()
+
+    manager = _manager(tmp_path)
+    assert manager.get_transaction(lost)["user_name"] == "alice"
+    manager.close()
+
+def test_records_appended_behind_the_index_are_indexed_on_start(tmp_path):
+    manager = _manager(tmp_path)
+    first = _pay(manager, "alice")
+    manager.close()
+
+    # Append straight to the ledger, as if the process died before indexing
+    manager = _manager(tmp_path)
+    manager.ledger.append({"transaction_id": "LATE", "user_name": "carol", "amount": "1.00",
+                           "status": "success"})
+    manager.close()
+
+    manager = _manager(tmp_path)
+    assert manager.get_transaction(first)["user_name"] == "alice"
+    assert manager.get_transaction("LATE")["user_name"] == "carol"
+    assert manager.query(user="carol")[0][0]["transaction_id"] == "LATE"
+    manager.close()
+
+def test_index_matches_ledger_after_restart(tmp_path):
+    manager = _manager(tmp_path)
+    ids = [_pay(manager, f"user{i}") for i in range(3)]
+    manager.close()
+    manager = _manager(tmp_path)
+    assert [manager.get_transaction(i)["transaction_id"] for i in ids] == ids
+    manager.close()
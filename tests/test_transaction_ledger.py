@@ -0,0 +1,63 @@
+"""Tests for the append-only transaction ledger"""
+
+import os
+
+from transaction_ledger import TransactionLedger, FSYNC_NEVER
+from transaction_manager import TransactionManager
+from group_commit import DURABILITY_SYNC
+
+def _write_torn_tail(ledger_dir):
+    """Simulate a crash mid-write: one good record, then half a line"""
+    ledger = TransactionLedger(ledger_dir, fsync=FSYNC_NEVER)
+    ledger.append({"transaction_id": "GOOD", "amount": "1"})
+    ledger.close()
+    path = ledger.segments()[-1]
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"transaction_id":"TORN","amo')
+    return path
+
+def test_append_after_torn_tail_starts_on_a_fresh_line(tmp_path):
+    ledger_dir = str(tmp_path / "ledger")
+    path = _write_torn_tail(ledger_dir)
+
+    ledger = TransactionLedger(ledger_dir, fsync=FSYNC_NEVER)
+    ledger.append({"transaction_id": "AFTER", "amount": "2"})
+    ledger.close()
+
+    assert [r["transaction_id"] for r in ledger.iter_records()] == ["GOOD", "AFTER"]
+    with open(path, 'rb') as f:
+        assert f.read().endswith(b"\n")
+
+def test_payment_after_crash_is_kept_and_indexed(tmp_path):
+    ledger_dir = str(tmp_path / "ledger")
+    _write_torn_tail(ledger_dir)
+
+    manager = TransactionManager(str(tmp_path / "transactions.json"), ledger_dir,
+                                 fsync=FSYNC_NEVER, durability=DURABILITY_SYNC)
+    transaction_id = manager.start_new_transaction("10.00")
+    manager.set_user("alice")
+    manager.verify_pin(True)
+    manager.complete_transaction()
+    manager.close()
+
+    ids = [r["transaction_id"] for r in manager.ledger.iter_records()]
+    assert ids == ["GOOD", transaction_id]
+
+    # A fresh start (which re-reads the ledger) still sees the payment
+    manager = TransactionManager(str(tmp_path / "transactions.json"), ledger_dir,
+                                 fsync=FSYNC_NEVER, durability=DURABILITY_SYNC)
+    assert manager.get_transaction(transaction_id)["user_name"] == "alice"
+    manager.close()
+
+def test_untouched_segment_is_not_truncated(tmp_path):
+    ledger_dir = str(tmp_path / "ledger")
+    ledger = TransactionLedger(ledger_dir, fsync=FSYNC_NEVER)
+    ledger.append({"transaction_id": "A"})
+    ledger.close()
+    size = os.path.getsize(ledger.segments()[-1])
+
+    ledger = TransactionLedger(ledger_dir, fsync=FSYNC_NEVER)
+    ledger.append({"transaction_id": "B"})
+    ledger.close()
+    assert os.path.getsize(ledger.segments()[-1]) > size
+    assert [r["transaction_id"] for r in ledger.iter_records()] == ["A", "B"]
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Transaction IDs for Face Pay
+Sortable, collision-free IDs: timestamp + terminal + process + sequence
+
+    TXN 20260117093012 345 <terminal> <process: pid + random byte> <sequence>
+
+The timestamp is UTC, so IDs keep sorting by the millisecond they were
+issued across DST changes. Issuing takes no lock: the shared sequence
+counter (atomic under the GIL) keeps IDs unique within a process, and the
+process part keeps concurrent processes and restarts apart. Each thread
+remembers the last millisecond it issued, so a wall clock stepped back
+(NTP, manual change) never makes a thread's IDs sort backwards.
+"""
+
+import itertools
+import os
+import re
+import secrets
+import socket
+import threading
+import time
+import zlib
+
+def _new_instance() -> str:
+    return f"{os.getpid() & 0xFFFFFF:06X}{secrets.randbits(8):02X}"
+
+# Per-process tag, re-drawn in forked children so they never share it with the parent
+_instance = _new_instance()
+# Shared by every generator in the process; next() is atomic under the GIL, so threads need no lock
+_sequence = itertools.count()
+# Per-thread last millisecond issued
+_local = threading.local()
+
+def _reset_instance():
+    global _instance
+    _instance = _new_instance()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_instance)
+
+def default_terminal_id() -> str:
+    """FACEPAY_TERMINAL_ID if set, otherwise a short hash of the host name"""
+    configured = os.environ.get("FACEPAY_TERMINAL_ID")
+    if configured:
+        return configured
+    return f"{zlib.crc32(socket.gethostname().encode('utf-8')) & 0xFFFFFF:06X}"
+
+class TransactionIdGenerator:
+    def __init__(self, terminal_id: str = None, prefix: str = "TXN"):
+        """Initialize the generator
+
+        terminal_id: identifies this terminal/lane; configure it explicitly
+            (or via FACEPAY_TERMINAL_ID) when several terminals share a ledger
+        """
+        terminal_id = terminal_id or default_terminal_id()
+        self.terminal_id = re.sub(r"[^A-Za-z0-9]", "", terminal_id).upper()
+        self.prefix = prefix
+        self._second = (None, "")
+
+    def next_id(self) -> str:
+        """Issue a new transaction ID"""
+        now = time.time_ns() // 1_000_000
+        last = getattr(_local, "last_ms", 0)
+        ms = _local.last_ms = now if now > last else last
+        sequence = next(_sequence)
+        second, stamp = self._second
+        if second != ms // 1000:
+            # Formatting the date once per second keeps the hot path to one f-string
+            second = ms // 1000
+            stamp = time.strftime("%Y%m%d%H%M%S", time.gmtime(second))
+            self._second = (second, stamp)
+        return f"{self.prefix}{stamp}{ms % 1000:03d}{self.terminal_id}{_instance}{sequence:08X}"
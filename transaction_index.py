@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Transaction Index for Face Pay
+SQLite (WAL mode) index over the transaction ledger for lookups by
+transaction ID, user, status and time range with keyset pagination
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple, Union
+
+from transaction_stats import to_paise
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    transaction_id TEXT,
+    user_name TEXT,
+    status TEXT,
+    amount_paise INTEGER,
+    timestamp TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_id ON transactions (transaction_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions (user_name, seq);
+CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions (status, seq);
+CREATE INDEX IF NOT EXISTS idx_transactions_time ON transactions (timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def _iso(value: Union[str, datetime, None]) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _row(record: dict) -> tuple:
+    return (record.get("transaction_id"), record.get("user_name"), record.get("status"),
+            to_paise(record.get("amount")), record.get("timestamp"),
+            json.dumps(record, separators=(',', ':')))
+
+class TransactionIndex:
+    def __init__(self, path: str = "data/ledger/index.sqlite3"):
+        """Open (or create) the index database
+
+        The ledger stays the source of truth; the index records the ledger
+        position it has caught up to and can be deleted and rebuilt.
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # The ledger is fsynced; after a crash the index just catches up from it
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def position(self) -> Optional[Tuple[str, int]]:
+        """Ledger position the index covers, or None if it is empty"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'position'").fetchone()
+        if row is None:
+            return None
+        segment, offset = json.loads(row[0])
+        return segment, offset
+
+    def _set_position(self, position: Tuple[str, int]):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('position', ?)",
+                           (json.dumps(list(position)),))
+
+    def add(self, record: dict, position: Tuple[str, int]):
+        """Index one appended record and advance the covered ledger position"""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO transactions (transaction_id, user_name, status, amount_paise, "
+                               "timestamp, record) VALUES (?, ?, ?, ?, ?, ?)", _row(record))
+            self._set_position(position)
+
+    def add_many(self, records: Iterable[dict], position: Tuple[str, int]) -> int:
+        """Bulk-index records (ledger catch-up) in a single SQLite transaction"""
+        with self._lock, self._conn:
+            cursor = self._conn.executemany("INSERT INTO transactions (transaction_id, user_name, status, "
+                                            "amount_paise, timestamp, record) VALUES (?, ?, ?, ?, ?, ?)",
+                                            (_row(record) for record in records))
+            self._set_position(position)
+            return cursor.rowcount
+
+    def clear(self):
+        """Drop every indexed record (before a rebuild)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM transactions")
+            self._conn.execute("DELETE FROM meta WHERE key = 'position'")
+
+    def get(self, transaction_id: str) -> Optional[dict]:
+        """Latest record with this transaction ID"""
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM transactions WHERE transaction_id = ? "
+                                     "ORDER BY seq DESC LIMIT 1", (transaction_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, user: Optional[str] = None, status: Optional[str] = None,
+              since: Union[str, datetime, None] = None, until: Union[str, datetime, None] = None,
+              limit: int = 50, cursor: Optional[int] = None) -> Tuple[List[dict], Optional[int]]:
+        """Return (records newest first, next cursor)
+
+        since/until bound the timestamp (inclusive/exclusive). Pass the
+        returned cursor back to fetch the next page; it is None on the last
+        page. Pages are keyset-paginated on the ledger sequence, so each one
+        costs the same however deep into the history it is.
+        """
+        clauses, params = [], []
+        if user is not None:
+            clauses.append("user_name = ?")
+            params.append(user)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(_iso(since))
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(_iso(until))
+        if cursor is not None:
+            clauses.append("seq < ?")
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT seq, record FROM transactions {where} ORDER BY seq DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [json.loads(record) for _, record in rows[:limit]], next_cursor
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Transaction Ledger for Face Pay
+Append-only JSON-Lines ledger split into size/day rotated segments
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+FSYNC_ALWAYS = "always"
+FSYNC_INTERVAL = "interval"
+FSYNC_NEVER = "never"
+
+class TransactionLedger:
+    def __init__(self, directory: str = "data/ledger", fsync: str = FSYNC_ALWAYS,
+                 fsync_interval: float = 1.0, max_segment_bytes: int = 16 * 1024 * 1024,
+                 rotate_daily: bool = True):
+        """Initialize the ledger
+
+        fsync: "always" (every append), "interval" (at most every fsync_interval
+            seconds) or "never" (leave it to the OS)
+        max_segment_bytes: start a new segment once the current one is this large
+        rotate_daily: start a new segment when the date changes
+        """
+        if fsync not in (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_segment_bytes = max_segment_bytes
+        self.rotate_daily = rotate_daily
+        self._file = None
+        self._path = None
+        self._segment_day = None
+        self._last_fsync = 0.0
+
+    def segments(self) -> List[str]:
+        """Segment paths in write order"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(f for f in os.listdir(self.directory)
+                       if f.startswith("ledger-") and f.endswith(".jsonl"))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _open_segment(self, day: str):
+        """Open the newest segment for today, or start a new one"""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self.segments()
+        sequence = 0
+        if segments:
+            last = os.path.basename(segments[-1])
+            _, last_day, last_sequence = last[:-len(".jsonl")].split("-")
+            sequence = int(last_sequence)
+            if (last_day == day or not self.rotate_daily) and \
+                    os.path.getsize(segments[-1]) < self.max_segment_bytes:
+                self._path = segments[-1]
+                self._truncate_torn_tail(self._path)
+                self._file = open(self._path, 'a', encoding='utf-8')
+                self._segment_day = day
+                return
+            sequence += 1
+        self._path = os.path.join(self.directory, f"ledger-{day}-{sequence:06d}.jsonl")
+        self._file = open(self._path, 'a', encoding='utf-8')
+        self._segment_day = day
+
+    @staticmethod
+    def _truncate_torn_tail(path: str):
+        """Cut a partial last line left by a crash so the next append starts on a fresh line"""
+        with open(path, 'r+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            good_end = end
+            while good_end > 0:
+                start = max(0, good_end - 4096)
+                f.seek(start)
+                chunk = f.read(good_end - start)
+                newline = chunk.rfind(b"\n")
+                if newline >= 0:
+                    good_end = start + newline + 1
+                    break
+                good_end = start
+            if good_end < end:
+                print(f"⚠️  Ignoring torn ledger tail at byte {good_end} of {path}")
+                f.truncate(good_end)
+
+    def _rotate_if_needed(self):
+        day = datetime.now().strftime("%Y%m%d")
+        if self._file is None:
+            self._open_segment(day)
+            return
+        if (self.rotate_daily and day != self._segment_day) or self._file.tell() >= self.max_segment_bytes:
+            self._sync(force=True)
+            self._file.close()
+            self._file = None
+            self._open_segment(day)
+
+    def append(self, record: dict):
+        """Append one record as a compact JSON line"""
+        self._rotate_if_needed()
+        self._file.write(json.dumps(record, separators=(',', ':')) + "\n")
+        self._file.flush()
+        self._sync()
+
+    def append_many(self, records) -> int:
+        """Append a batch of records with a single write and sync (group commit)"""
+        count = 0
+        self._rotate_if_needed()
+        for record in records:
+            self._file.write(json.dumps(record, separators=(',', ':')) + "\n")
+            count += 1
+            if self._file.tell() >= self.max_segment_bytes:
+                self._rotate_if_needed()
+        self._file.flush()
+        self._sync()
+        return count
+
+    def _sync(self, force: bool = False):
+        if self._file is None or (self.fsync == FSYNC_NEVER and not force):
+            return
+        now = time.monotonic()
+        if force or self.fsync == FSYNC_ALWAYS or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def flush(self):
+        """Force buffered records to disk regardless of the fsync policy"""
+        if self._file is not None:
+            self._file.flush()
+            self._sync(force=True)
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def position(self) -> Tuple[str, int]:
+        """(segment name, byte offset) just past the last appended record"""
+        if self._file is not None:
+            self._file.flush()
+            return os.path.basename(self._path), os.path.getsize(self._path)
+        segments = self.segments()
+        if not segments:
+            return "", 0
+        return os.path.basename(segments[-1]), os.path.getsize(segments[-1])
+
+    def covers(self, position: Tuple[str, int]) -> bool:
+        """Whether `position` still points into this ledger (it was not reset or truncated)"""
+        segment, offset = position
+        if not segment:
+            return True
+        path = os.path.join(self.directory, segment)
+        return os.path.exists(path) and os.path.getsize(path) >= offset
+
+    @staticmethod
+    def _read_segment(path: str, offset: int = 0) -> Iterator[dict]:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # A torn final line from a crash mid-write; earlier records are intact
+                    print(f"⚠️  Skipping unreadable ledger line in {path}")
+
+    def iter_records(self, since: Optional[Tuple[str, int]] = None) -> Iterator[dict]:
+        """Stream records oldest first, one segment at a time
+
+        since: a position() value; only records appended after it are returned
+        """
+        for path in self.segments():
+            name = os.path.basename(path)
+            if since is None or name > since[0]:
+                yield from self._read_segment(path)
+            elif name == since[0]:
+                yield from self._read_segment(path, since[1])
+
+    def tail(self, limit: int) -> List[dict]:
+        """Return the newest `limit` records, reading only the segments needed"""
+        if limit <= 0:
+            return []
+        records = []
+        for path in reversed(self.segments()):
+            records = list(self._read_segment(path)) + records
+            if len(records) >= limit:
+                break
+        return records[-limit:]
+
+    def import_records(self, records) -> int:
+        """Bulk-append records (e.g. from the legacy JSON file) with a single fsync"""
+        count = self.append_many(records)
+        self.flush()
+        return count
+
+    def is_empty(self) -> bool:
+        return not any(os.path.getsize(path) for path in self.segments())
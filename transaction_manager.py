@@ -5,10 +5,19 @@ Handles transaction state and data throughout the payment flow
 """
 
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Optional
 from datetime import datetime
+from collections import deque
 import json
 import os
+import threading
+from transaction_ledger import TransactionLedger, FSYNC_ALWAYS
+from transaction_stats import TransactionStats
+from transaction_index import TransactionIndex
+from transaction_ids import TransactionIdGenerator
+from group_commit import GroupCommitWriter, DURABILITY_GROUP
+
+DEFAULT_SESSION = "default"
 
 @dataclass
 class TransactionState:
@@ -21,45 +30,192 @@ class TransactionState:
     status: str = "pending"  # pending, success, failed
 
 class TransactionManager:
-    def __init__(self, transactions_file: str = "data/transactions.json"):
-        """Initialize the transaction manager"""
+    def __init__(self, transactions_file: str = "data/transactions.json",
+                 ledger_dir: str = "data/ledger", fsync: str = FSYNC_ALWAYS,
+                 recent_limit: int = 100, stats_checkpoint_every: int = 100,
+                 terminal_id: Optional[str] = None, durability: str = DURABILITY_GROUP,
+                 on_error: Optional[Callable[[Exception, list], None]] = None):
+        """Initialize the transaction manager
+        
+        transactions_file: legacy JSON history, imported into the ledger once
+        ledger_dir: directory of append-only JSON-Lines ledger segments
+        fsync: ledger durability policy ("always", "interval" or "never")
+        recent_limit: number of recent transactions kept in memory
+        stats_checkpoint_every: snapshot the running statistics after this many transactions
+        terminal_id: embedded in transaction IDs (defaults to FACEPAY_TERMINAL_ID or the host)
+        durability: "sync" (write on the calling thread), "group" (background writer,
+            caller waits for its batch) or "async" (caller does not wait; call flush())
+            A transaction that cannot be written raises CommitError from
+            complete_transaction (sync, group) or from flush()/close() (async)
+        on_error: called on the writer thread with (exception, records) when
+            transactions could not be written
+        """
         self.transactions_file = transactions_file
-        self.current_transaction = TransactionState()
-        self.transaction_history = []
+        self.ledger = TransactionLedger(ledger_dir, fsync=fsync)
+        self.stats_file = os.path.join(ledger_dir, "stats.json")
+        self.stats_checkpoint_every = stats_checkpoint_every
+        self.stats = TransactionStats()
+        self._stats_pending = 0
+        self.id_generator = TransactionIdGenerator(terminal_id)
+        self.index = TransactionIndex(os.path.join(ledger_dir, "index.sqlite3"))
+        # Set when indexing a batch failed: the index position stays behind the
+        # missing records, and later batches catch up from the ledger instead
+        self._index_behind = False
+        self.writer = GroupCommitWriter(self._commit_batch, mode=durability, name="transaction-writer",
+                                        on_error=on_error)
+        self.sessions = {}
+        self._lock = threading.RLock()
+        self.transaction_history = deque(maxlen=recent_limit)
         self.load_transactions()
     
     def load_transactions(self):
-        """Load transaction history from file"""
+        """Load recent transactions from the ledger, importing the legacy JSON file if needed"""
         try:
-            if os.path.exists(self.transactions_file):
-                with open(self.transactions_file, 'r') as f:
-                    self.transaction_history = json.load(f)
-                print(f"✅ Loaded {len(self.transaction_history)} transaction records")
+            if self.ledger.is_empty() and os.path.exists(self.transactions_file):
+                self._import_legacy_history()
+            self.transaction_history.clear()
+            self.transaction_history.extend(self.ledger.tail(self.transaction_history.maxlen))
+            self._load_stats()
+            self._sync_index()
+            if self.transaction_history:
+                print(f"✅ Loaded {len(self.transaction_history)} recent transaction records")
             else:
-                print("ℹ️  No transaction history found. Creating new file.")
-                self.transaction_history = []
+                print("ℹ️  No transaction history found. Creating new ledger.")
         except Exception as e:
             print(f"❌ Error loading transactions: {e}")
-            self.transaction_history = []
+            self.transaction_history.clear()
     
-    def save_transactions(self):
-        """Save transaction history to file"""
+    def _import_legacy_history(self):
+        """One-time import of the old transactions.json into the ledger"""
+        with open(self.transactions_file, 'r') as f:
+            history = json.load(f)
+        count = self.ledger.import_records(history)
+        os.replace(self.transactions_file, self.transactions_file + ".migrated")
+        print(f"✅ Imported {count} transaction records from {self.transactions_file}")
+    
+    def _load_stats(self):
+        """Load the statistics snapshot and fold in records appended after it"""
         try:
-            os.makedirs(os.path.dirname(self.transactions_file), exist_ok=True)
-            with open(self.transactions_file, 'w') as f:
-                json.dump(self.transaction_history, f, indent=2)
-            print(f"✅ Saved {len(self.transaction_history)} transaction records")
+            self.stats, position = TransactionStats.load(self.stats_file)
         except Exception as e:
-            print(f"❌ Error saving transactions: {e}")
+            print(f"⚠️  Ignoring unreadable statistics snapshot: {e}")
+            self.stats, position = TransactionStats(), None
+        
+        if position is not None and not self.ledger.covers(position):
+            # The ledger no longer matches the snapshot; rebuild from scratch
+            self.stats, position = TransactionStats(), None
+        
+        replayed = 0
+        for record in self.ledger.iter_records(since=position):
+            self.stats.add(record)
+            replayed += 1
+        if replayed or position is None:
+            self._stats_pending = replayed
+            self._save_stats()
     
-    def start_new_transaction(self, amount: str) -> str:
-        """Start a new transaction"""
+    def _sync_index(self):
+        """Index ledger records appended since the index was last updated"""
+        position = self.index.position()
+        if position is not None and not self.ledger.covers(position):
+            self.index.clear()
+            position = None
+        indexed = self.index.add_many(self.ledger.iter_records(since=position), self.ledger.position())
+        if indexed > 0:
+            print(f"✅ Indexed {indexed} transaction records")
+    
+    def _save_stats(self):
+        """Snapshot the statistics together with the ledger position they cover"""
+        try:
+            self.stats.save(self.stats_file, self.ledger.position())
+            self._stats_pending = 0
+        except Exception as e:
+            print(f"❌ Error saving transaction statistics: {e}")
+    
+    def _commit_batch(self, records: list):
+        """Writer thread: append a batch to the ledger, then index and count it"""
+        with self._lock:
+            # Not caught: the writer reports a failed append to the callers
+            self.ledger.append_many(records)
+            try:
+                if self._index_behind:
+                    self._sync_index()
+                else:
+                    self.index.add_many(records, self.ledger.position())
+                self._index_behind = False
+            except Exception as e:
+                # add_many rolls back, so the index position stays before these
+                # records; the next batch (or the next start) re-reads them from the ledger
+                self._index_behind = True
+                print(f"⚠️  Error indexing transactions (will catch up from the ledger): {e}")
+            for record in records:
+                self.stats.add(record)
+            self._stats_pending += len(records)
+            if self._stats_pending >= self.stats_checkpoint_every:
+                self._save_stats()
+    
+    def flush(self):
+        """Write every pending transaction and the statistics snapshot to disk
+        
+        Raises CommitError if queued transactions could not be written.
+        """
+        try:
+            self.writer.flush()
+        finally:
+            with self._lock:
+                try:
+                    self.ledger.flush()
+                except Exception as e:
+                    print(f"❌ Error saving transactions: {e}")
+                if self._stats_pending:
+                    self._save_stats()
+    
+    def save_transactions(self):
+        """Flush the ledger to disk (records are appended as they complete)"""
+        self.flush()
+    
+    def close(self):
+        """Flush and close the ledger (raises like flush())"""
+        try:
+            self.writer.close()
+        finally:
+            with self._lock:
+                self.flush()
+                self.ledger.close()
+                self.index.close()
+    
+    def _session(self, session_id: str) -> TransactionState:
+        """State of a lane's transaction, created empty on first use"""
+        state = self.sessions.get(session_id)
+        if state is None:
+            state = self.sessions.setdefault(session_id, TransactionState())
+        return state
+    
+    @property
+    def current_transaction(self) -> TransactionState:
+        """Transaction of the default lane"""
+        return self._session(DEFAULT_SESSION)
+    
+    @current_transaction.setter
+    def current_transaction(self, state: TransactionState):
+        self.sessions[DEFAULT_SESSION] = state
+    
+    def active_sessions(self) -> list:
+        """Lanes with a transaction in flight"""
+        return [session_id for session_id, state in list(self.sessions.items())
+                if state.transaction_id and state.status == "pending"]
+    
+    def end_session(self, session_id: str = DEFAULT_SESSION):
+        """Forget a lane's transaction state"""
+        self.sessions.pop(session_id, None)
+    
+    def start_new_transaction(self, amount: str, session_id: str = DEFAULT_SESSION) -> str:
+        """Start a new transaction on a lane (replacing the lane's previous one)"""
         # Generate transaction ID
         timestamp = datetime.now()
-        transaction_id = f"TXN{timestamp.strftime('%Y%m%d%H%M%S')}"
+        transaction_id = self.id_generator.next_id()
         
         # Create new transaction state
-        self.current_transaction = TransactionState(
+        self.sessions[session_id] = TransactionState(
             amount=amount,
             transaction_id=transaction_id,
             timestamp=timestamp.isoformat(),
@@ -69,82 +225,95 @@ class TransactionManager:
         print(f"🔄 Started new transaction: {transaction_id} for ₹{amount}")
         return transaction_id
     
-    def set_user(self, user_name: str):
-        """Set the user for the current transaction"""
-        self.current_transaction.user_name = user_name
+    def set_user(self, user_name: str, session_id: str = DEFAULT_SESSION):
+        """Set the user for a lane's current transaction"""
+        self._session(session_id).user_name = user_name
         print(f"👤 User set for transaction: {user_name}")
     
-    def verify_pin(self, success: bool):
+    def verify_pin(self, success: bool, session_id: str = DEFAULT_SESSION):
         """Mark PIN verification result"""
-        self.current_transaction.pin_verified = success
+        state = self._session(session_id)
+        state.pin_verified = success
         if success:
-            self.current_transaction.status = "success"
+            state.status = "success"
             print(f"✅ PIN verified successfully")
         else:
-            self.current_transaction.status = "failed"
+            state.status = "failed"
             print(f"❌ PIN verification failed")
     
-    def complete_transaction(self):
-        """Complete the current transaction and save to history"""
-        if self.current_transaction.transaction_id:
+    def complete_transaction(self, session_id: str = DEFAULT_SESSION):
+        """Complete a lane's current transaction and save to history"""
+        state = self._session(session_id)
+        if state.transaction_id:
             # Convert to dictionary for JSON serialization
             transaction_data = {
-                "transaction_id": self.current_transaction.transaction_id,
-                "amount": self.current_transaction.amount,
-                "user_name": self.current_transaction.user_name,
-                "timestamp": self.current_transaction.timestamp,
-                "status": self.current_transaction.status,
-                "pin_verified": self.current_transaction.pin_verified
+                "transaction_id": state.transaction_id,
+                "amount": state.amount,
+                "user_name": state.user_name,
+                "timestamp": state.timestamp,
+                "status": state.status,
+                "pin_verified": state.pin_verified
             }
             
+            # Lanes complete concurrently; the writer serializes ledger, index and stats updates.
+            # A failed write raises here (sync/group) and the record stays out of the history
+            self.writer.submit(transaction_data)
             self.transaction_history.append(transaction_data)
-            self.save_transactions()
             
-            print(f"💾 Transaction completed and saved: {self.current_transaction.transaction_id}")
+            print(f"💾 Transaction completed and saved: {state.transaction_id}")
     
-    def reset_transaction(self):
-        """Reset the current transaction"""
-        self.current_transaction = TransactionState()
+    def reset_transaction(self, session_id: str = DEFAULT_SESSION):
+        """Reset a lane's current transaction"""
+        self.sessions[session_id] = TransactionState()
         print("🔄 Transaction reset")
     
-    def get_current_amount(self) -> Optional[str]:
+    def get_current_amount(self, session_id: str = DEFAULT_SESSION) -> Optional[str]:
         """Get the current transaction amount"""
-        return self.current_transaction.amount
+        return self._session(session_id).amount
     
-    def get_current_user(self) -> Optional[str]:
+    def get_current_user(self, session_id: str = DEFAULT_SESSION) -> Optional[str]:
         """Get the current transaction user"""
-        return self.current_transaction.user_name
+        return self._session(session_id).user_name
     
-    def get_transaction_summary(self) -> str:
-        """Get a summary of the current transaction"""
-        if not self.current_transaction.transaction_id:
+    def get_transaction_summary(self, session_id: str = DEFAULT_SESSION) -> str:
+        """Get a summary of a lane's current transaction"""
+        state = self._session(session_id)
+        if not state.transaction_id:
             return "No active transaction"
         
-        summary = f"Transaction ID: {self.current_transaction.transaction_id}\n"
-        summary += f"Amount: ₹{self.current_transaction.amount}\n"
-        summary += f"User: {self.current_transaction.user_name or 'Not set'}\n"
-        summary += f"Status: {self.current_transaction.status}\n"
-        summary += f"PIN Verified: {self.current_transaction.pin_verified}"
+        summary = f"Transaction ID: {state.transaction_id}\n"
+        summary += f"Amount: ₹{state.amount}\n"
+        summary += f"User: {state.user_name or 'Not set'}\n"
+        summary += f"Status: {state.status}\n"
+        summary += f"PIN Verified: {state.pin_verified}"
         
         return summary
     
     def get_recent_transactions(self, limit: int = 10) -> list:
         """Get recent transactions"""
-        return self.transaction_history[-limit:] if self.transaction_history else []
+        if limit > self.transaction_history.maxlen:
+            records, _ = self.index.query(limit=limit)
+            return records[::-1]
+        return list(self.transaction_history)[-limit:] if self.transaction_history else []
     
     def get_transaction_stats(self) -> dict:
-        """Get transaction statistics"""
-        if not self.transaction_history:
-            return {"total": 0, "successful": 0, "failed": 0, "total_amount": 0}
-        
-        total = len(self.transaction_history)
-        successful = sum(1 for t in self.transaction_history if t["status"] == "success")
-        failed = sum(1 for t in self.transaction_history if t["status"] == "failed")
-        total_amount = sum(float(t["amount"]) for t in self.transaction_history if t["status"] == "success")
-        
-        return {
-            "total": total,
-            "successful": successful,
-            "failed": failed,
-            "total_amount": round(total_amount, 2)
-        } 
\ No newline at end of file
+        """Get transaction statistics (maintained incrementally)"""
+        return self.stats.summary()
+    
+    def get_daily_stats(self, day: Optional[str] = None) -> dict:
+        """Get statistics for one day ("YYYY-MM-DD", default today)"""
+        return self.stats.day(day or datetime.now().strftime("%Y-%m-%d"))
+    
+    def get_user_stats(self, user_name: str) -> dict:
+        """Get statistics for one user"""
+        return self.stats.user(user_name)
+    
+    def get_transaction(self, transaction_id: str) -> Optional[dict]:
+        """Look up a transaction by ID"""
+        return self.index.get(transaction_id)
+    
+    def query(self, user: Optional[str] = None, status: Optional[str] = None,
+              since=None, until=None, limit: int = 50, cursor: Optional[int] = None):
+        """Query the transaction history; see TransactionIndex.query for paging"""
+        return self.index.query(user=user, status=status, since=since, until=until,
+                                limit=limit, cursor=cursor)
\ No newline at end of file
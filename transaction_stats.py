@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Transaction Statistics for Face Pay
+Running totals with per-day and per-user rollups, kept up to date as
+transactions complete and snapshotted alongside a ledger position
+"""
+
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from typing import Optional, Tuple
+
+def to_paise(amount) -> int:
+    """Convert an amount string such as "125.50" to integer paise"""
+    try:
+        return int((Decimal(str(amount)) * 100).to_integral_value())
+    except (InvalidOperation, ValueError):
+        return 0
+
+def _empty_bucket() -> dict:
+    return {"total": 0, "successful": 0, "failed": 0, "amount_paise": 0}
+
+def _add_to_bucket(bucket: dict, status: str, paise: int):
+    bucket["total"] += 1
+    if status == "success":
+        bucket["successful"] += 1
+        bucket["amount_paise"] += paise
+    elif status == "failed":
+        bucket["failed"] += 1
+
+def _public(bucket: dict) -> dict:
+    return {
+        "total": bucket["total"],
+        "successful": bucket["successful"],
+        "failed": bucket["failed"],
+        "total_amount": bucket["amount_paise"] / 100
+    }
+
+class TransactionStats:
+    def __init__(self):
+        """Empty aggregates"""
+        self.totals = _empty_bucket()
+        self.by_day = {}
+        self.by_user = {}
+
+    def add(self, record: dict):
+        """Fold one completed transaction into every aggregate in O(1)"""
+        status = record.get("status")
+        paise = to_paise(record.get("amount")) if status == "success" else 0
+        day = (record.get("timestamp") or "")[:10] or "unknown"
+        user = record.get("user_name") or "unknown"
+
+        _add_to_bucket(self.totals, status, paise)
+        _add_to_bucket(self.by_day.setdefault(day, _empty_bucket()), status, paise)
+        _add_to_bucket(self.by_user.setdefault(user, _empty_bucket()), status, paise)
+
+    def summary(self) -> dict:
+        return _public(self.totals)
+
+    def day(self, day: str) -> dict:
+        """Aggregates for one day ("YYYY-MM-DD")"""
+        return _public(self.by_day.get(day, _empty_bucket()))
+
+    def user(self, user_name: str) -> dict:
+        return _public(self.by_user.get(user_name, _empty_bucket()))
+
+    def save(self, path: str, position: Tuple[str, int]):
+        """Write the aggregates and the ledger position they cover, atomically"""
+        data = {
+            "position": list(position),
+            "totals": self.totals,
+            "by_day": self.by_day,
+            "by_user": self.by_user
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["TransactionStats", Optional[Tuple[str, int]]]:
+        """Return (stats, ledger position) from a snapshot, or empty stats and None"""
+        stats = cls()
+        if not os.path.exists(path):
+            return stats, None
+        with open(path, 'r') as f:
+            data = json.load(f)
+        stats.totals = data["totals"]
+        stats.by_day = data["by_day"]
+        stats.by_user = data["by_user"]
+        segment, offset = data["position"]
+        return stats, (segment, offset)